@@ -0,0 +1,13 @@
+from fastapi import FastAPI
+
+app = FastAPI()
+
+
+@app.get("/ping")
+async def ping():
+    return {"message": "pong"}
+
+
+@app.get("/sync-ping")
+def sync_ping():
+    return {"message": "pong"}
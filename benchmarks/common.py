@@ -0,0 +1,60 @@
+"""Helpers shared by the benchmark scripts"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List
+
+import aiohttp
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def wait_until_healthy(url: str, timeout: float, path: str = '/healthz') -> float:
+    start = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() - start < timeout:
+            try:
+                async with session.get(f'{url}{path}') as r:
+                    if r.status == 200:
+                        return time.perf_counter() - start
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.02)
+    raise TimeoutError(f'{url} not healthy after {timeout} s')
+
+
+async def load(url: str, requests: int, concurrency: int, path: str = '/ping') -> Dict:
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def _worker(session: aiohttp.ClientSession):
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                async with session.get(f'{url}{path}') as r:
+                    await r.read()
+                    if r.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*[_worker(session) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    return {
+        'rps': requests / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'errors': errors,
+    }
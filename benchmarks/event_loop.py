@@ -0,0 +1,85 @@
+"""Compare gateway throughput on a nest_asyncio-patched loop, plain asyncio and uvloop.
+
+`nest_asyncio.apply()` swaps the C implementations of `asyncio.Task` & `asyncio.Future`
+for the pure-Python ones and replaces the loop's run loop, which is what the gateway used
+to run on when `fastapi_serve.helper` applied it at import time.
+
+    python benchmarks/event_loop.py --requests 10000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+from typing import Dict
+
+from common import HERE, load, wait_until_healthy
+
+LOOPS = ['nest_asyncio', 'asyncio', 'uvloop']
+
+
+def serve(loop_kind: str, port: int):
+    sys.path.insert(0, os.path.dirname(HERE))
+    from uvicorn import Config, Server
+
+    from app import app
+    from fastapi_serve.gateway.workers import new_event_loop
+
+    if loop_kind == 'nest_asyncio':
+        import nest_asyncio
+
+        loop = asyncio.new_event_loop()
+        nest_asyncio.apply(loop)
+    else:
+        loop = new_event_loop(loop_kind)
+
+    asyncio.set_event_loop(loop)
+    config = Config(app=app, port=port, log_level='error', access_log=False)
+    loop.run_until_complete(Server(config).serve())
+
+
+def run_loop(loop_kind: str, port: int, args) -> Dict:
+    proc = subprocess.Popen(
+        [sys.executable, __file__, '--serve', loop_kind, '--port', str(port)],
+        cwd=HERE,
+    )
+    url = f'http://localhost:{port}'
+    try:
+        asyncio.run(wait_until_healthy(url, args.timeout, path='/ping'))
+        asyncio.run(load(url, min(1000, args.requests), args.concurrency))
+        return asyncio.run(load(url, args.requests, args.concurrency))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--port', type=int, default=18180)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--serve', choices=LOOPS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve, args.port)
+
+    results = {
+        loop_kind: run_loop(loop_kind, args.port + i, args)
+        for i, loop_kind in enumerate(LOOPS)
+    }
+    baseline = results['nest_asyncio']['rps']
+
+    print('| loop | req/s | vs nest_asyncio | p50 (ms) | p99 (ms) | errors |')
+    print('| --- | ---: | ---: | ---: | ---: | ---: |')
+    for loop_kind, r in results.items():
+        print(
+            f"| {loop_kind} | {r['rps']:.0f} | {r['rps'] / baseline:.2f}x "
+            f"| {r['p50_ms']:.2f} | {r['p99_ms']:.2f} | {r['errors']} |"
+        )
+
+
+if __name__ == '__main__':
+    main()
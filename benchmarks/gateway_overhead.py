@@ -0,0 +1,67 @@
+"""Compare `fastapi-serve deploy local` with and without `--direct`.
+
+For each mode, the app in `benchmarks/app.py` is started in a subprocess and we measure
+the time until `/healthz` responds, followed by a fixed-concurrency load on `/ping`.
+
+    python benchmarks/gateway_overhead.py --requests 5000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import subprocess
+import sys
+from typing import Dict
+
+from common import HERE, load, wait_until_healthy
+
+
+def run_mode(direct: bool, port: int, args) -> Dict:
+    cmd = [
+        sys.executable,
+        '-m',
+        'fastapi_serve',
+        'deploy',
+        'local',
+        'app:app',
+        '--port',
+        str(port),
+    ] + (['--direct'] if direct else [])
+    proc = subprocess.Popen(
+        cmd, cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f'http://localhost:{port}'
+    try:
+        startup = asyncio.run(wait_until_healthy(url, args.timeout))
+        # warm up connections & code paths
+        asyncio.run(load(url, min(500, args.requests), args.concurrency))
+        result = asyncio.run(load(url, args.requests, args.concurrency))
+        return {'startup_s': startup, **result}
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+
+    results = {
+        'gateway': run_mode(direct=False, port=args.port, args=args),
+        'direct': run_mode(direct=True, port=args.port + 1, args=args),
+    }
+
+    print('| mode | startup (s) | req/s | p50 (ms) | p99 (ms) | errors |')
+    print('| --- | ---: | ---: | ---: | ---: | ---: |')
+    for mode, r in results.items():
+        print(
+            f"| {mode} | {r['startup_s']:.2f} | {r['rps']:.0f} | {r['p50_ms']:.2f} "
+            f"| {r['p99_ms']:.2f} | {r['errors']} |"
+        )
+
+
+if __name__ == '__main__':
+    main()
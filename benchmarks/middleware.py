@@ -0,0 +1,428 @@
+"""Measure the per-request cost of each middleware layer, in-process.
+
+Every layer is added on its own to a FastAPI app, and the app is called directly as an
+ASGI callable (no sockets, no server) for HTTP, streaming and WebSocket requests. We
+report the time per request (best of `--repeat` runs) and the peak memory allocated
+while serving one request, against the same app without middleware.
+
+Baselines live in `middleware_baselines.json`. `--check` fails when a layer got slower
+or allocates more than its baseline, both relative to the bare app measured in the same
+run, so that baselines recorded on another machine, Python or starlette still apply.
+
+    python benchmarks/middleware.py --check
+    python benchmarks/middleware.py --update-baselines
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINES = os.path.join(HERE, 'middleware_baselines.json')
+
+SCOPES = ['http', 'stream', 'websocket']
+PATHS = {'http': '/json', 'stream': '/stream', 'websocket': '/ws'}
+HEADERS = [
+    (b'host', b'localhost:8080'),
+    (b'origin', b'http://example.com'),
+    (b'authorization', b'Bearer token'),
+    (b'x-forwarded-for', b'10.0.0.1, 10.0.0.2'),
+]
+CHUNKS = 8
+
+# slack for a few small objects, e.g. a dict growing one resize further
+ALLOC_SLACK_BYTES = 512
+
+
+def _logger() -> logging.Logger:
+    # formats & writes every record, like the gateway's logger, to nowhere
+    logger = logging.getLogger('fastapi-serve-bench')
+    if not logger.handlers:
+        handler = logging.StreamHandler(open(os.devnull, 'w'))
+        handler.setFormatter(
+            logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+        )
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def _noop_meter():
+    from opentelemetry.metrics import NoOpMeter
+
+    return NoOpMeter('fastapi_serve')
+
+
+def _sdk_providers():
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+    from opentelemetry.sdk.trace import TracerProvider
+
+    return MeterProvider(metric_readers=[InMemoryMetricReader()]), TracerProvider()
+
+
+def _cors(app):
+    from fastapi_serve.gateway.helper import configure_cors
+
+    configure_cors(app, _logger())
+
+
+def _metrics(app):
+    from fastapi_serve.gateway.helper import setup_metrics_middleware
+
+    # the middleware's own work, instruments are no-ops without an SDK
+    setup_metrics_middleware(app, _noop_meter())
+
+
+def _metrics_sdk(app):
+    from fastapi_serve.gateway.helper import setup_metrics_middleware
+
+    meter_provider, _ = _sdk_providers()
+    setup_metrics_middleware(app, meter_provider.get_meter('fastapi_serve'))
+
+
+def _logging(app):
+    from fastapi_serve.gateway.helper import LoggingMiddleware
+
+    app.add_middleware(LoggingMiddleware, logger=_logger())
+
+
+def _drain(app):
+    from fastapi_serve.gateway.helper import setup_drain_middleware
+
+    setup_drain_middleware(app)
+
+
+def _auth(app):
+    import fastapi_serve.utils.auth as auth
+    from fastapi_serve.utils import JinaAuthMiddleware
+
+    async def _authorize_async(token: str) -> bool:
+        return True
+
+    # the Hubble round trip is cached per token, what's left is the middleware
+    auth.authorize_async = _authorize_async
+    app.add_middleware(JinaAuthMiddleware)
+
+
+def _otel(app):
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+    meter_provider, tracer_provider = _sdk_providers()
+    FastAPIInstrumentor.instrument_app(
+        app, meter_provider=meter_provider, tracer_provider=tracer_provider
+    )
+
+
+def _stack(app):
+    from fastapi_serve.gateway.helper import register_healthz, setup_drain_middleware
+
+    # what `build_direct_app` adds, without an OpenTelemetry SDK configured
+    _cors(app)
+    register_healthz(app, drainer=setup_drain_middleware(app))
+    _metrics(app)
+    _logging(app)
+
+
+LAYERS: Dict[str, Optional[Callable]] = {
+    'none': None,
+    'cors': _cors,
+    'metrics': _metrics,
+    'metrics+sdk': _metrics_sdk,
+    'logging': _logging,
+    'drain': _drain,
+    'auth': _auth,
+    'otel': _otel,
+    'stack': _stack,
+}
+
+
+def build_app(layer: str):
+    from fastapi import FastAPI, WebSocket
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI()
+
+    @app.get('/json')
+    async def _json():
+        return {'message': 'pong'}
+
+    @app.get('/stream')
+    async def _stream():
+        async def _chunks():
+            for _ in range(CHUNKS):
+                yield b'x' * 1024
+
+        return StreamingResponse(_chunks())
+
+    @app.websocket('/ws')
+    async def _ws(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_text(await websocket.receive_text())
+        await websocket.close()
+
+    if LAYERS[layer] is not None:
+        LAYERS[layer](app)
+    return app
+
+
+def _scope(kind: str) -> Dict:
+    path = PATHS[kind]
+    scope = {
+        'type': 'websocket' if kind == 'websocket' else 'http',
+        'asgi': {'version': '3.0', 'spec_version': '2.3'},
+        'http_version': '1.1',
+        'scheme': 'ws' if kind == 'websocket' else 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': b'',
+        'headers': HEADERS,
+        'client': ('127.0.0.1', 50000),
+        'server': ('127.0.0.1', 8080),
+        'state': {},
+    }
+    if kind == 'websocket':
+        scope['subprotocols'] = []
+    else:
+        scope['method'] = 'GET'
+    return scope
+
+
+async def _http(app, kind: str):
+    received = False
+    disconnected = asyncio.Event()
+    status, chunks = None, 0
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # the client stays connected until the response is sent
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status, chunks
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body' and message.get('body'):
+            chunks += 1
+
+    await app(dict(_scope(kind), headers=list(HEADERS)), receive, send)
+    disconnected.set()
+    assert status == 200, f'{kind}: HTTP {status}'
+    assert chunks == (CHUNKS if kind == 'stream' else 1), f'{kind}: {chunks} chunks'
+
+
+async def _websocket(app, kind: str):
+    incoming = iter(
+        [
+            {'type': 'websocket.connect'},
+            {'type': 'websocket.receive', 'text': 'ping'},
+        ]
+    )
+    sent = []
+
+    async def receive():
+        return next(incoming, {'type': 'websocket.disconnect', 'code': 1000})
+
+    async def send(message):
+        sent.append(message['type'])
+
+    await app(dict(_scope(kind), headers=list(HEADERS)), receive, send)
+    assert sent == ['websocket.accept', 'websocket.send', 'websocket.close'], sent
+
+
+def _timed(app, kind: str, n: int) -> int:
+    request = _websocket if kind == 'websocket' else _http
+
+    async def _run() -> int:
+        start = time.perf_counter_ns()
+        for _ in range(n):
+            await request(app, kind)
+        return time.perf_counter_ns() - start
+
+    return _run()
+
+
+def _peak_bytes(app, kind: str) -> int:
+    request = _websocket if kind == 'websocket' else _http
+
+    async def _run() -> int:
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        await request(app, kind)
+        return tracemalloc.get_traced_memory()[1] - current
+
+    return _run()
+
+
+def measure(layers: List[str], kind: str, requests: int, repeat: int) -> Dict:
+    """ns per request (best of `repeat`), its ratio to the bare app's (median of
+    `repeat`) & median peak bytes allocated per request"""
+    apps = {layer: build_app(layer) for layer in layers}
+    bare = apps.get('none') or build_app('none')
+    ns = {layer: float('inf') for layer in layers}
+    ratios = {layer: [1.0] for layer in layers}
+    loop = asyncio.new_event_loop()
+    try:
+        for app in [bare, *apps.values()]:
+            # builds the middleware stack & warms up caches
+            loop.run_until_complete(_timed(app, kind, min(requests, 200)))
+
+        # round-robin, so that the machine getting slower or faster hits every layer
+        gc.disable()
+        try:
+            for _ in range(repeat):
+                for layer, app in apps.items():
+                    if app is bare:
+                        elapsed = loop.run_until_complete(_timed(app, kind, requests))
+                        ns[layer] = min(ns[layer], elapsed // requests)
+                        continue
+                    # right after the bare app, which it's compared to
+                    base = loop.run_until_complete(_timed(bare, kind, requests))
+                    elapsed = loop.run_until_complete(_timed(app, kind, requests))
+                    ns[layer] = min(ns[layer], elapsed // requests)
+                    ratios[layer].append(elapsed / base)
+        finally:
+            gc.enable()
+
+        peaks = {}
+        tracemalloc.start()
+        try:
+            for layer, app in apps.items():
+                peaks[layer] = statistics.median(
+                    loop.run_until_complete(_peak_bytes(app, kind)) for _ in range(25)
+                )
+        finally:
+            tracemalloc.stop()
+    finally:
+        loop.close()
+
+    return {
+        layer: {
+            'ns': ns[layer],
+            'ratio': round(statistics.median(ratios[layer][1:] or [1.0]), 3),
+            'peak_bytes': int(peaks[layer]),
+        }
+        for layer in layers
+    }
+
+
+def available(layer: str) -> bool:
+    try:
+        build_app(layer)
+    except ModuleNotFoundError as e:
+        print(f'Skipping {layer}: {e}', file=sys.stderr)
+        return False
+    return True
+
+
+def run(layers: List[str], requests: int, repeat: int) -> Dict:
+    layers = ['none'] + [
+        layer for layer in layers if layer != 'none' and available(layer)
+    ]
+    results = {}
+    for kind in SCOPES:
+        results[kind] = measure(layers, kind, requests, repeat)
+        bare = results[kind]['none']['peak_bytes']
+        for result in results[kind].values():
+            result['extra_bytes'] = result['peak_bytes'] - bare
+    return results
+
+
+def environment() -> Dict:
+    import starlette
+
+    return {
+        'python': '.'.join(platform.python_version_tuple()[:2]),
+        'starlette': starlette.__version__,
+    }
+
+
+def check(
+    results: Dict, baselines: Dict, time_tolerance: float, alloc_tolerance: float
+):
+    """Regressions of `results` against `baselines`, as messages. Only the overhead
+    over the bare app is compared, the environment the baselines were recorded on is
+    informative"""
+    regressions = []
+    for kind, layers in results.items():
+        for layer, r in layers.items():
+            base = baselines.get('results', {}).get(kind, {}).get(layer)
+            if base is None or layer == 'none':
+                continue
+            if r['ratio'] > base['ratio'] * (1 + time_tolerance):
+                regressions.append(
+                    f'{kind}/{layer}: {r["ratio"]:.2f}x the bare app, '
+                    f'baseline {base["ratio"]:.2f}x'
+                )
+            max_bytes = base['extra_bytes'] * (1 + alloc_tolerance) + ALLOC_SLACK_BYTES
+            if r['extra_bytes'] > max(max_bytes, ALLOC_SLACK_BYTES):
+                regressions.append(
+                    f'{kind}/{layer}: {r["extra_bytes"]} bytes allocated over the '
+                    f'bare app, baseline {base["extra_bytes"]}'
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--layer', action='append', choices=list(LAYERS))
+    parser.add_argument('--baselines', default=BASELINES)
+    parser.add_argument('--check', action='store_true')
+    parser.add_argument('--update-baselines', action='store_true')
+    parser.add_argument('--time-tolerance', type=float, default=0.3)
+    parser.add_argument('--alloc-tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(HERE))
+    results = run(args.layer or list(LAYERS), args.requests, args.repeat)
+
+    print(
+        '| scope | layer | ns/request | overhead (ns) | vs none | peak alloc (B) '
+        '| overhead (B) |'
+    )
+    print('| --- | --- | ---: | ---: | ---: | ---: | ---: |')
+    for kind, layers in results.items():
+        bare = layers['none']['ns']
+        for layer, r in layers.items():
+            print(
+                f"| {kind} | {layer} | {r['ns']} | {r['ns'] - bare} "
+                f"| {r['ratio']:.2f}x | {r['peak_bytes']} | {r['extra_bytes']} |"
+            )
+
+    if args.update_baselines:
+        with open(args.baselines, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2)
+            f.write('\n')
+        print(f'Baselines written to {args.baselines}')
+
+    if args.check:
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+        regressions = check(
+            results, baselines, args.time_tolerance, args.alloc_tolerance
+        )
+        for regression in regressions:
+            print(f'Regression: {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,9 +15,28 @@ __version__ = '0.0.7'
 
 _ignore_warnings()
 
-from .utils import (
-    JinaAPIKeyHeader,
-    JinaAuthDependency,
-    JinaAuthMiddleware,
-    JinaBlobStorage,
-)
+# SDK exports are imported on first access, so that the CLI doesn't pay for importing
+# fastapi, starlette & hubble on every command
+_LAZY_IMPORTS = {
+    'Batcher': '.utils',
+    'Bulkhead': '.utils',
+    'JinaAPIKeyHeader': '.utils',
+    'JinaAuthDependency': '.utils',
+    'JinaAuthMiddleware': '.utils',
+    'JinaBlobStorage': '.utils',
+    'ProcessPool': '.utils',
+    'cache_response': '.utils',
+    'offload': '.utils',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        import importlib
+
+        return getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_IMPORTS))
@@ -1,20 +1,18 @@
 import click
 
 from fastapi_serve import __version__
-from fastapi_serve.cloud import (
-    export_app,
+from fastapi_serve.cloud.options import (
+    batch_deploy_options,
+    bench_options,
     export_options,
-    get_app_status_on_jcloud,
-    get_jinaai_uri,
     hubble_push_options,
     jcloud_deploy_options,
     jcloud_list_options,
-    list_apps_on_jcloud,
+    jcloud_status_options,
     local_deploy_options,
-    push_app_to_hubble,
-    remove_app_on_jcloud,
-    serve_locally,
-    serve_on_jcloud,
+    recommend_options,
+    simulate_options,
+    verify_upgrade_options,
 )
 from fastapi_serve.helper import syncify
 
@@ -31,6 +29,8 @@ def serve():
 @hubble_push_options
 @click.help_option("-h", "--help")
 def push(app, app_dir, image_name, image_tag, platform, version, verbose, public):
+    from fastapi_serve.cloud.build import get_jinaai_uri, push_app_to_hubble
+
     _gateway_id = push_app_to_hubble(
         app=app,
         app_dir=app_dir,
@@ -54,8 +54,51 @@ def deploy():
 
 @deploy.command(help="Deploy the app locally")
 @local_deploy_options
-def local(app, port, env):
-    serve_locally(app=app, port=port, env=env)
+def local(
+    app,
+    port,
+    env,
+    workers,
+    replicas,
+    direct,
+    server_preset,
+    loop,
+    http,
+    backlog,
+    timeout_keep_alive,
+    limit_concurrency,
+    h11_max_incomplete_event_size,
+    thread_pool_size,
+    drain_timeout,
+    drain_delay,
+    adaptive_concurrency,
+    max_concurrency,
+):
+    from fastapi_serve.cloud.config import ServerConfig
+    from fastapi_serve.cloud.deploy import serve_locally
+
+    serve_locally(
+        app=app,
+        port=port,
+        env=env,
+        workers=workers,
+        replicas=replicas,
+        direct=direct,
+        server_config=ServerConfig(
+            preset=server_preset,
+            loop=loop,
+            http=http,
+            backlog=backlog,
+            timeout_keep_alive=timeout_keep_alive,
+            limit_concurrency=limit_concurrency,
+            h11_max_incomplete_event_size=h11_max_incomplete_event_size,
+            thread_pool_size=thread_pool_size,
+            drain_timeout=drain_timeout,
+            drain_delay=drain_delay,
+            adaptive_concurrency=adaptive_concurrency,
+            max_concurrency=max_concurrency,
+        ),
+    )
 
 
 @deploy.command(help="Deploy the app to Jina AI Cloud")
@@ -73,9 +116,12 @@ async def jcloud(
     cors,
     env,
     secret,
+    timings,
     verbose,
     public,
 ):
+    from fastapi_serve.cloud.deploy import serve_on_jcloud
+
     await serve_on_jcloud(
         app=app,
         app_dir=app_dir,
@@ -90,7 +136,27 @@ async def jcloud(
         secret=secret,
         verbose=verbose,
         public=public,
+        timings=timings,
+    )
+
+
+@deploy.command(help="Deploy all the apps of a manifest to Jina AI Cloud")
+@batch_deploy_options
+@syncify
+async def batch(manifest, parallel, timings, verbose):
+    from fastapi_serve.cloud.batch import deploy_batch_on_jcloud
+
+    progress = await deploy_batch_on_jcloud(
+        manifest=manifest,
+        parallel=parallel,
+        verbose=verbose,
+        timings=timings,
     )
+    failed = [p for p in progress if p.failed]
+    if failed:
+        raise click.ClickException(
+            f'{len(failed)} of {len(progress)} apps failed to deploy'
+        )
 
 
 @serve.command(help='Export the app to Kubernetes/docker-compose YAML files.')
@@ -106,9 +172,15 @@ async def export(
     platform,
     cors,
     env,
+    config,
     verbose,
     public,
+    replicas,
+    static_paths,
+    with_observability,
 ):
+    from fastapi_serve.cloud.export import export_app
+
     await export_app(
         app=app,
         kind=kind,
@@ -119,24 +191,212 @@ async def export(
         platform=platform,
         cors=cors,
         env=env,
+        config=config,
         verbose=verbose,
         public=public,
+        replicas=replicas,
+        static_paths=static_paths,
+        with_observability=with_observability,
+    )
+
+
+@serve.command(help='Simulate autoscaling, latency and cost of jcloud configs.')
+@simulate_options
+def simulate(
+    configs,
+    capacity,
+    trace,
+    pattern,
+    rps,
+    base_rps,
+    duration,
+    service_time_ms,
+    cold_start,
+    output,
+):
+    from fastapi_serve.cloud.simulate import simulate as _simulate
+
+    _simulate(
+        configs=configs,
+        capacity=capacity,
+        trace=trace,
+        pattern=pattern,
+        rps=rps,
+        base_rps=base_rps,
+        duration=duration,
+        service_time_ms=service_time_ms,
+        cold_start=cold_start,
+        output=output,
+    )
+
+
+@serve.command(help='Load test an HTTP or WebSocket (ws://) endpoint.')
+@bench_options
+def bench(
+    url,
+    concurrency,
+    rate,
+    duration,
+    warmup,
+    method,
+    headers,
+    data,
+    timeout,
+    max_inflight,
+    output,
+    baseline,
+):
+    from fastapi_serve.bench import bench as _bench
+
+    _bench(
+        url,
+        concurrency=concurrency,
+        rate=rate,
+        duration=duration,
+        warmup=warmup,
+        method=method,
+        headers=headers,
+        data=data,
+        timeout=timeout,
+        max_inflight=max_inflight,
+        output=output,
+        baseline=baseline,
+    )
+
+
+@serve.command(
+    'verify-upgrade',
+    help='Probe an app concurrently while it is upgraded, reporting failed & slow requests.',
+)
+@verify_upgrade_options
+def verify_upgrade(
+    app,
+    url,
+    to,
+    command,
+    path,
+    version_field,
+    streams,
+    interval,
+    timeout,
+    slow_ms,
+    warmup,
+    settle,
+    duration,
+    replicas,
+    workers,
+    direct,
+    env,
+    output,
+):
+    from fastapi_serve.upgrade import verify_upgrade as _verify_upgrade
+
+    if (app is None) == (url is None):
+        raise click.UsageError('Pass either APP (local replicas) or --url')
+
+    report = _verify_upgrade(
+        app=app,
+        url=url,
+        to=to,
+        command=command,
+        path=path,
+        version_field=version_field,
+        streams=streams,
+        interval=interval,
+        timeout=timeout,
+        slow_ms=slow_ms,
+        warmup=warmup,
+        settle=settle,
+        duration=duration,
+        replicas=replicas,
+        workers=workers,
+        direct=direct,
+        env=env,
+        output=output,
+    )
+    if report.failures:
+        raise click.ClickException(
+            f'{len(report.failures)} of {len(report.probes)} probes failed'
+        )
+
+
+@serve.command(help='Load test the app locally and write a sized jcloud.yml.')
+@recommend_options
+def recommend(
+    app,
+    path,
+    slo_ms,
+    percentile,
+    metric,
+    utilization,
+    peak_rps,
+    max_concurrency,
+    step_duration,
+    method,
+    headers,
+    data,
+    env,
+    direct,
+    output,
+):
+    from fastapi_serve.cloud.recommend import recommend as _recommend
+
+    config = _recommend(
+        app,
+        path=path,
+        slo_ms=slo_ms,
+        percentile=percentile,
+        metric=metric,
+        utilization=utilization,
+        peak_rps=peak_rps,
+        max_concurrency=max_concurrency,
+        step_duration=step_duration,
+        method=method,
+        headers=headers,
+        data=data,
+        env=env,
+        direct=direct,
+        output=output,
+    )
+    if config is None:
+        raise click.ClickException(
+            f'No instance meets a p{percentile:g} latency of {slo_ms:g} ms, even for a single request at a time'
+        )
+
+    autoscale = config['autoscale']
+    click.echo(
+        f'Wrote {output}: instance {config["instance"]} with {config["workers"]} worker(s), '
+        f'autoscaling on {autoscale["metric"]} with a target of {autoscale["target"]} per replica'
     )
 
 
 @serve.command(help='List all deployed apps.')
 @jcloud_list_options
 @syncify
-async def list(phase, name):
-    await list_apps_on_jcloud(phase=phase, name=name)
+async def list(phase, name, watch, interval, max_interval):
+    from fastapi_serve.cloud.deploy import list_apps_on_jcloud
 
+    await list_apps_on_jcloud(
+        phase=phase,
+        name=name,
+        watch=watch,
+        interval=interval,
+        max_interval=max_interval,
+    )
 
-@serve.command(help='Get status of a deployed app.')
-@click.argument('app-id')
-@click.help_option('-h', '--help')
+
+@serve.command(help='Get status of one or more deployed apps.')
+@jcloud_status_options
 @syncify
-async def status(app_id):
-    await get_app_status_on_jcloud(app_id)
+async def status(app_ids, watch, interval, max_interval):
+    from fastapi_serve.cloud.deploy import get_apps_status_on_jcloud
+
+    await get_apps_status_on_jcloud(
+        app_ids=app_ids,
+        watch=watch,
+        interval=interval,
+        max_interval=max_interval,
+    )
 
 
 @serve.command(help='Remove an app.')
@@ -144,6 +404,8 @@ async def status(app_id):
 @click.help_option('-h', '--help')
 @syncify
 async def remove(app_id):
+    from fastapi_serve.cloud.deploy import remove_app_on_jcloud
+
     await remove_app_on_jcloud(app_id)
 
 
@@ -0,0 +1,434 @@
+"""HTTP & WebSocket load generator for apps served locally or remotely.
+
+Two modes are supported:
+
+- closed-loop: `concurrency` clients each send a request as soon as the previous one
+  returned. Throughput adapts to the server, which hides queueing: a stalled server
+  also stops the clients from sending ("coordinated omission").
+- open-loop: requests are sent at a fixed `rate`, no matter how many are in flight,
+  like independent users would.
+
+Latencies are kept in log-linear histograms. The corrected histogram accounts for
+coordinated omission: in open-loop mode, latency is measured from the time a request
+was scheduled to be sent. In closed-loop mode, the samples that a stalled server kept
+the client from sending are back-filled, like HdrHistogram does.
+"""
+
+import asyncio
+import json
+import math
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import aiohttp
+
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+class LatencyHistogram:
+    """Log-linear histogram of latencies (in seconds), within `precision` (relative)"""
+
+    def __init__(self, precision: float = 0.01, lowest: float = 1e-6):
+        self.precision = precision
+        self.lowest = lowest
+        self._log_base = math.log1p(precision)
+        self.buckets: Counter = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _bucket(self, value: float) -> int:
+        return max(
+            int(math.log(max(value, self.lowest) / self.lowest) / self._log_base), 0
+        )
+
+    def _value(self, bucket: int) -> float:
+        # middle of the bucket
+        return self.lowest * math.exp((bucket + 0.5) * self._log_base)
+
+    def record(self, value: float, count: int = 1):
+        self.buckets[self._bucket(value)] += count
+        self.count += count
+        self.total += value * count
+        self.max = max(self.max, value)
+
+    def record_corrected(self, value: float, expected_interval: float):
+        """Record `value`, plus the samples a request taking `value` kept from being
+        sent every `expected_interval`"""
+        self.record(value)
+        if expected_interval <= 0:
+            return
+        missing = value - expected_interval
+        while missing >= expected_interval:
+            self.record(missing)
+            missing -= expected_interval
+
+    def merge(self, other: 'LatencyHistogram'):
+        self.buckets.update(other.buckets)
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * q / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self._value(bucket), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict:
+        """Summary in ms, with the raw buckets (upper bound in ms -> count)"""
+        return {
+            'count': self.count,
+            'mean_ms': self.mean * 1000,
+            'max_ms': self.max * 1000,
+            **{f'p{q:g}_ms': self.percentile(q) * 1000 for q in PERCENTILES},
+            'buckets': {
+                f'{self.lowest * math.exp((b + 1) * self._log_base) * 1000:.4g}': n
+                for b, n in sorted(self.buckets.items())
+            },
+        }
+
+
+@dataclass
+class BenchResult:
+    url: str
+    mode: str
+    duration: float = 0.0
+    concurrency: Optional[int] = None
+    rate: Optional[float] = None
+    successes: int = 0
+    errors: Counter = field(default_factory=Counter)
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    corrected: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    @property
+    def requests(self) -> int:
+        return self.successes + sum(self.errors.values())
+
+    @property
+    def throughput(self) -> float:
+        """Successful requests per second"""
+        return self.successes / self.duration if self.duration else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'url': self.url,
+            'mode': self.mode,
+            'concurrency': self.concurrency,
+            'rate': self.rate,
+            'duration': self.duration,
+            'requests': self.requests,
+            'successes': self.successes,
+            'throughput': self.throughput,
+            'errors': dict(self.errors),
+            'latency': self.latency.to_dict(),
+            'corrected_latency': self.corrected.to_dict(),
+        }
+
+
+def _error_key(e: BaseException) -> str:
+    if isinstance(e, asyncio.TimeoutError):
+        return 'timeout'
+    return type(e).__name__
+
+
+class _Target:
+    """Sends one request (or WebSocket message round-trip) to `url`"""
+
+    def __init__(
+        self,
+        url: str,
+        method: str = 'GET',
+        headers: Dict[str, str] = None,
+        body: bytes = None,
+        timeout: float = 30,
+    ):
+        self.url = url
+        self.method = method
+        self.headers = headers or {}
+        self.body = body
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.websocket = url.startswith(('ws://', 'wss://'))
+
+    async def send(
+        self,
+        session: aiohttp.ClientSession,
+        ws: Optional[aiohttp.ClientWebSocketResponse],
+    ) -> Optional[str]:
+        """`None` on success, else the kind of error"""
+        if ws is not None:
+            await ws.send_bytes(self.body or b'')
+            msg = await ws.receive(timeout=self.timeout.total)
+            if msg.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                return None
+            return f'WebSocket {msg.type.name}'
+
+        async with session.request(
+            self.method,
+            self.url,
+            headers=self.headers,
+            data=self.body,
+            timeout=self.timeout,
+        ) as r:
+            await r.read()
+            return None if r.status < 400 else f'HTTP {r.status}'
+
+    async def connect(self, session: aiohttp.ClientSession):
+        if not self.websocket:
+            return None
+        return await session.ws_connect(self.url, headers=self.headers)
+
+
+async def _record(
+    target: _Target,
+    session: aiohttp.ClientSession,
+    ws,
+    result: BenchResult,
+    scheduled: float,
+    recording: bool,
+):
+    sent = time.perf_counter()
+    try:
+        error = await target.send(session, ws)
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+        error = _error_key(e)
+    done = time.perf_counter()
+    if not recording:
+        return
+    if error is None:
+        result.successes += 1
+    else:
+        result.errors[error] += 1
+    result.latency.record(done - sent)
+    if result.mode == 'open-loop':
+        result.corrected.record(done - scheduled)
+    return done - sent
+
+
+async def _closed_loop(
+    target: _Target, result: BenchResult, duration: float, warmup: float
+):
+    samples: List[float] = []
+    start = time.perf_counter()
+    recording_from, end = start + warmup, start + warmup + duration
+
+    async def _client(session: aiohttp.ClientSession):
+        try:
+            ws = await target.connect(session)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            result.errors[_error_key(e)] += 1
+            return
+        try:
+            while True:
+                now = time.perf_counter()
+                if now >= end:
+                    return
+                latency = await _record(
+                    target, session, ws, result, now, now >= recording_from
+                )
+                if latency is not None:
+                    samples.append(latency)
+        finally:
+            if ws is not None:
+                await ws.close()
+
+    connector = aiohttp.TCPConnector(limit=result.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(_client(session) for _ in range(result.concurrency)))
+
+    # Without a target rate, the expected interval between two requests of a client
+    # is taken as the typical (median) latency
+    samples.sort()
+    expected = samples[len(samples) // 2] if samples else 0
+    for s in samples:
+        result.corrected.record_corrected(s, expected)
+
+
+async def _open_loop(
+    target: _Target,
+    result: BenchResult,
+    duration: float,
+    warmup: float,
+    max_inflight: int,
+    connections: int,
+):
+    interval = 1 / result.rate
+    total = int((warmup + duration) * result.rate)
+    warmup_requests = int(warmup * result.rate)
+    connector = aiohttp.TCPConnector(limit=max_inflight)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # for WebSockets, each message waits for an idle connection
+        pool: Optional[asyncio.Queue] = None
+        if target.websocket:
+            pool = asyncio.Queue()
+            for ws in await asyncio.gather(
+                *(target.connect(session) for _ in range(connections))
+            ):
+                pool.put_nowait(ws)
+
+        async def _request(scheduled: float, recording: bool):
+            ws = await pool.get() if pool is not None else None
+            try:
+                await _record(target, session, ws, result, scheduled, recording)
+            finally:
+                if ws is not None:
+                    pool.put_nowait(ws)
+
+        tasks = []
+        start = time.perf_counter()
+        i = 0
+        while i < total:
+            now = time.perf_counter()
+            # launch everything that is due, sleeping is too coarse for high rates
+            while i < total and start + i * interval <= now:
+                tasks.append(
+                    asyncio.create_task(
+                        _request(start + i * interval, i >= warmup_requests)
+                    )
+                )
+                i += 1
+            if i < total:
+                await asyncio.sleep(max(start + i * interval - time.perf_counter(), 0))
+        await asyncio.gather(*tasks)
+
+        if pool is not None:
+            while not pool.empty():
+                await pool.get_nowait().close()
+
+
+async def run_bench(
+    url: str,
+    concurrency: int = 10,
+    rate: Optional[float] = None,
+    duration: float = 10,
+    warmup: float = 0,
+    method: str = 'GET',
+    headers: Dict[str, str] = None,
+    body: bytes = None,
+    timeout: float = 30,
+    max_inflight: int = 1000,
+) -> BenchResult:
+    """Load `url` for `duration` seconds (after `warmup` seconds), open-loop at `rate`
+    requests per second if set, else closed-loop with `concurrency` clients. Open-loop
+    WebSocket messages are sent over `concurrency` connections"""
+    target = _Target(url, method=method, headers=headers, body=body, timeout=timeout)
+    if rate:
+        result = BenchResult(url=url, mode='open-loop', rate=rate)
+        start = time.perf_counter()
+        await _open_loop(
+            target, result, duration, warmup, max_inflight, connections=concurrency
+        )
+    else:
+        result = BenchResult(url=url, mode='closed-loop', concurrency=concurrency)
+        start = time.perf_counter()
+        await _closed_loop(target, result, duration, warmup)
+    # in open-loop mode, stragglers extend the run
+    result.duration = max(time.perf_counter() - start - warmup, duration)
+    return result
+
+
+def _delta(value: float, baseline: float) -> str:
+    if not baseline:
+        return ''
+    return f' ({(value - baseline) / baseline:+.1%})'
+
+
+def print_result(result: BenchResult, baseline: Dict = None):
+    from rich import box
+    from rich.console import Console
+    from rich.table import Table
+
+    summary = result.to_dict()
+    _t = Table(
+        '',
+        'Latency',
+        'Corrected latency',
+        box=box.ROUNDED,
+        highlight=True,
+        title=f'{result.url} ({result.mode})',
+    )
+    for key in [f'p{q:g}_ms' for q in PERCENTILES] + ['mean_ms', 'max_ms']:
+        cells = []
+        for kind in ('latency', 'corrected_latency'):
+            value = summary[kind][key]
+            cells.append(
+                f'{value:.2f} ms'
+                + (_delta(value, baseline[kind][key]) if baseline else '')
+            )
+        _t.add_row(key[:-3], *cells)
+    _t.add_section()
+    _t.add_row(
+        'Throughput',
+        f'{result.throughput:.1f} req/s'
+        + (_delta(result.throughput, baseline['throughput']) if baseline else ''),
+        '',
+    )
+    _t.add_row('Requests', str(result.requests), '')
+    for error, n in result.errors.most_common():
+        _t.add_row(f'[red]{error}[/red]', str(n), '')
+    Console().print(_t)
+
+
+def bench(
+    url: str,
+    concurrency: int = 10,
+    rate: Optional[float] = None,
+    duration: float = 10,
+    warmup: float = 0,
+    method: str = 'GET',
+    headers: List[str] = (),
+    data: str = None,
+    timeout: float = 30,
+    max_inflight: int = 1000,
+    output: str = None,
+    baseline: str = None,
+) -> BenchResult:
+    _headers = {}
+    for header in headers:
+        key, _, value = header.partition(':')
+        _headers[key.strip()] = value.strip()
+
+    body = None
+    if data is not None:
+        if data.startswith('@'):
+            with open(data[1:], 'rb') as f:
+                body = f.read()
+        else:
+            body = data.encode()
+
+    result = asyncio.run(
+        run_bench(
+            url,
+            concurrency=concurrency,
+            rate=rate,
+            duration=duration,
+            warmup=warmup,
+            method=method,
+            headers=_headers,
+            body=body,
+            timeout=timeout,
+            max_inflight=max_inflight,
+        )
+    )
+
+    _baseline = None
+    if baseline is not None:
+        with open(baseline) as f:
+            _baseline = json.load(f)
+    print_result(result, baseline=_baseline)
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(result.to_dict(), f, indent=2)
+    return result
@@ -0,0 +1,240 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+HUBBLE_API = os.environ.get('JINA_HUBBLE_REGISTRY', 'https://api.hubble.jina.ai')
+
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+# safe to send twice, requests with other methods are retried only if asked to
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+class HTTPRequestError(Exception):
+    def __init__(self, method: str, url: str, reason: str):
+        super().__init__(f'{method} {url} failed: {reason}')
+        self.method = method
+        self.url = url
+        self.reason = reason
+
+
+@dataclass
+class HTTPResponse:
+    status: int
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: bytes = b''
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    @property
+    def text(self) -> str:
+        return self.body.decode('utf-8', errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.body) if self.body else None
+
+
+class TTLCache:
+    """A small LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class HTTPClient:
+    """A pooled HTTP client with timeouts and jittered retries for control-plane calls.
+
+    The aiohttp session lives on an event loop in a daemon thread, so that one
+    connection pool is shared by sync callers (CLI helpers, threads) and async callers
+    running on any event loop, for the lifetime of the process.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 30,
+        connect_timeout: float = 10,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 8,
+        pool_size: int = 20,
+    ):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session = None
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever,
+                    name='fastapi-serve-http',
+                    daemon=True,
+                ).start()
+            return self._loop
+
+    def _reset(self):
+        # After a fork, the loop thread doesn't exist in the child anymore
+        self._lock = threading.Lock()
+        self._loop = None
+        self._session = None
+
+    async def _get_session(self):
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(
+                    total=self.timeout, connect=self.connect_timeout
+                ),
+            )
+        return self._session
+
+    async def _request(
+        self, method: str, url: str, retry: Optional[bool] = None, **kwargs
+    ) -> HTTPResponse:
+        """`retry` defaults to whether `method` is idempotent, e.g. a `POST` that only
+        reads can set it"""
+        import aiohttp
+
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT_METHODS
+        retries = self.retries if retry else 0
+        session = await self._get_session()
+        reason = ''
+        for attempt in range(retries + 1):
+            retry_after = None
+            try:
+                async with session.request(method, url, **kwargs) as r:
+                    response = HTTPResponse(
+                        status=r.status, headers=dict(r.headers), body=await r.read()
+                    )
+                if response.status not in RETRY_STATUSES:
+                    return response
+
+                reason = f'status {response.status}'
+                retry_after = response.headers.get('Retry-After')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                reason = repr(e)
+
+            if attempt == retries:
+                break
+
+            delay = backoff_delay(attempt, self.backoff, self.max_backoff)
+            if retry_after is not None and retry_after.isdigit():
+                delay = min(max(delay, float(retry_after)), self.max_backoff)
+            await asyncio.sleep(delay)
+
+        raise HTTPRequestError(method, url, reason)
+
+    def _submit(self, coro: Awaitable):
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+
+    async def request(self, method: str, url: str, **kwargs) -> HTTPResponse:
+        return await asyncio.wrap_future(
+            self._submit(self._request(method, url, **kwargs))
+        )
+
+    def request_sync(self, method: str, url: str, **kwargs) -> HTTPResponse:
+        return self._submit(self._request(method, url, **kwargs)).result()
+
+    async def get(self, url: str, **kwargs) -> HTTPResponse:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> HTTPResponse:
+        return await self.request('POST', url, **kwargs)
+
+    def get_sync(self, url: str, **kwargs) -> HTTPResponse:
+        return self.request_sync('GET', url, **kwargs)
+
+    def post_sync(self, url: str, **kwargs) -> HTTPResponse:
+        return self.request_sync('POST', url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            loop, session = self._loop, self._session
+            self._loop, self._session = None, None
+
+        if loop is None:
+            return
+        if session is not None:
+            asyncio.run_coroutine_threadsafe(session.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+async def run_with_retries(
+    func: Callable[[], Any],
+    retries: int = 3,
+    backoff: float = 0.5,
+    max_backoff: float = 8,
+) -> Any:
+    """Run a blocking call off the event loop, retrying on failure with jittered backoff"""
+    loop = asyncio.get_running_loop()
+    for attempt in range(retries + 1):
+        try:
+            return await loop.run_in_executor(None, func)
+        except Exception:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(backoff_delay(attempt, backoff, max_backoff))
+
+
+_client: Optional[HTTPClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HTTPClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HTTPClient()
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=_client._reset)
+        return _client
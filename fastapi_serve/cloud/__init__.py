@@ -1,16 +1,32 @@
-from .build import get_jinaai_uri, push_app_to_hubble
-from .deploy import (
-    get_app_status_on_jcloud,
-    list_apps_on_jcloud,
-    remove_app_on_jcloud,
-    serve_locally,
-    serve_on_jcloud,
-)
-from .export import export_app
-from .options import (
-    export_options,
-    hubble_push_options,
-    jcloud_deploy_options,
-    jcloud_list_options,
-    local_deploy_options,
-)
+# Each CLI command imports only the module it needs, see `fastapi_serve.__main__`
+_LAZY_IMPORTS = {
+    'deploy_batch_on_jcloud': '.batch',
+    'get_jinaai_uri': '.build',
+    'push_app_to_hubble': '.build',
+    'get_app_status_on_jcloud': '.deploy',
+    'get_apps_status_on_jcloud': '.deploy',
+    'list_apps_on_jcloud': '.deploy',
+    'remove_app_on_jcloud': '.deploy',
+    'serve_locally': '.deploy',
+    'serve_on_jcloud': '.deploy',
+    'export_app': '.export',
+    'batch_deploy_options': '.options',
+    'export_options': '.options',
+    'hubble_push_options': '.options',
+    'jcloud_deploy_options': '.options',
+    'jcloud_list_options': '.options',
+    'jcloud_status_options': '.options',
+    'local_deploy_options': '.options',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        import importlib
+
+        return getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_IMPORTS))
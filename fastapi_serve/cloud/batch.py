@@ -0,0 +1,286 @@
+import asyncio
+import hashlib
+import os
+import sys
+import time
+from dataclasses import dataclass, field, fields
+from functools import partial
+from typing import Dict, List, Optional
+
+import yaml
+
+from fastapi_serve.cloud.config import APP_NAME
+from fastapi_serve.cloud.errors import InvalidManifestError
+from fastapi_serve.cloud.helper import (
+    PhaseTimer,
+    any_websocket_route_in_app,
+    load_fastapi_app,
+)
+
+DEFAULT_PARALLEL = 4
+
+# Not part of the app, ignored when hashing the app directory
+IGNORED_DIRS = {'__pycache__', '.git'}
+
+
+@dataclass
+class ManifestApp:
+    app: str
+    app_dir: Optional[str] = None
+    name: str = APP_NAME
+    app_id: Optional[str] = None
+    uses: Optional[str] = None
+    config: Optional[str] = None
+    env: Optional[str] = None
+    secret: Optional[str] = None
+    cors: bool = True
+    version: str = 'latest'
+    platform: Optional[str] = None
+    public: bool = False
+
+    @classmethod
+    def from_dict(cls, config: Dict, base_dir: str) -> 'ManifestApp':
+        if not isinstance(config, dict) or 'app' not in config:
+            raise InvalidManifestError(f'each app needs an `app` key, got {config}')
+
+        unknown = set(config) - {f.name for f in fields(cls)}
+        if unknown:
+            raise InvalidManifestError(
+                f'unknown keys {sorted(unknown)} for app {config["app"]}'
+            )
+
+        spec = cls(**config)
+        # paths are relative to the manifest
+        spec.app_dir = os.path.abspath(os.path.join(base_dir, spec.app_dir or '.'))
+        for key in ('config', 'env', 'secret'):
+            path = getattr(spec, key)
+            if path is not None:
+                path = os.path.abspath(os.path.join(base_dir, path))
+                if not os.path.exists(path):
+                    raise InvalidManifestError(
+                        f'{key} file {path} for app {spec.app} does not exist'
+                    )
+                setattr(spec, key, path)
+        return spec
+
+
+@dataclass
+class Manifest:
+    apps: List[ManifestApp] = field(default_factory=list)
+    parallel: int = DEFAULT_PARALLEL
+
+    @classmethod
+    def from_file(cls, path: str) -> 'Manifest':
+        with open(path) as f:
+            config = yaml.safe_load(f) or {}
+
+        if not isinstance(config, dict) or not config.get('apps'):
+            raise InvalidManifestError(f'no `apps` found in {path}')
+
+        parallel = config.get('parallel', DEFAULT_PARALLEL)
+        if not isinstance(parallel, int) or parallel < 1:
+            raise InvalidManifestError(f'parallel: {parallel}')
+
+        base_dir = os.path.dirname(os.path.abspath(path))
+        return cls(
+            apps=[ManifestApp.from_dict(app, base_dir) for app in config['apps']],
+            parallel=parallel,
+        )
+
+
+def get_build_key(app_dir: str, version: str, platform: str, public: bool) -> str:
+    """Content hash of everything that goes into the app image"""
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(app_dir):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_DIRS)
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            h.update(os.path.relpath(path, app_dir).encode() + b'\0')
+            with open(path, 'rb') as f:
+                for chunk in iter(partial(f.read, 1 << 20), b''):
+                    h.update(chunk)
+    h.update(f'{version}|{platform}|{public}'.encode())
+    return h.hexdigest()
+
+
+def inspect_app(app: str, app_dir: str) -> bool:
+    """Import an app from its own directory, returns whether it has websocket routes"""
+    # apps of a manifest often share module names (`main:app`), drop the one
+    # imported from another directory
+    modname = app.partition(':')[0].split('.')[0]
+    for name in [m for m in sys.modules if m == modname or m.startswith(modname + '.')]:
+        del sys.modules[name]
+
+    sys.path.insert(0, app_dir)
+    try:
+        fastapi_app, _ = load_fastapi_app(app)
+    finally:
+        sys.path.remove(app_dir)
+    return any_websocket_route_in_app(fastapi_app)
+
+
+@dataclass
+class AppProgress:
+    spec: ManifestApp
+    build_key: Optional[str] = None
+    is_websocket: bool = False
+    timer: PhaseTimer = field(default_factory=PhaseTimer)
+    state: str = 'Queued'
+    app_id: Optional[str] = None
+    error: Optional[str] = None
+    start: Optional[float] = None
+    end: Optional[float] = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    @property
+    def duration(self) -> str:
+        if self.start is None:
+            return ''
+        return f'{(self.end or time.perf_counter()) - self.start:.1f}s'
+
+
+def _render(progress: List[AppProgress]):
+    from rich import box
+    from rich.table import Table
+
+    _t = Table('App', 'Name', 'Build', 'State', 'App ID', 'Time', box=box.ROUNDED)
+    for p in progress:
+        if p.failed:
+            state = f'[red]Failed: {p.error}'
+        elif p.state == 'Deployed':
+            state = f'[green]{p.state}'
+        else:
+            state = p.state
+        _t.add_row(
+            p.spec.app,
+            p.spec.name,
+            p.build_key[:8] if p.build_key else p.spec.uses or '',
+            state,
+            p.app_id or '',
+            p.duration,
+        )
+    return _t
+
+
+async def deploy_batch_on_jcloud(
+    manifest: str,
+    parallel: int = None,
+    verbose: bool = False,
+    timings: bool = False,
+) -> List[AppProgress]:
+    from rich.console import Console
+    from rich.live import Live
+
+    from fastapi_serve.cloud.build import push_app_dir_to_hubble
+    from fastapi_serve.cloud.config import get_jcloud_config, resolve_jcloud_config
+    from fastapi_serve.cloud.deploy import deploy_built_app_on_jcloud
+    from fastapi_serve.helper import get_random_tag
+    from fastapi_serve.utils.helper import get_jina_userid
+
+    _manifest = Manifest.from_file(manifest)
+    loop = asyncio.get_running_loop()
+    console = Console()
+
+    def _in_thread(func, **kwargs):
+        return loop.run_in_executor(None, partial(func, **kwargs))
+
+    # Fail fast on broken apps & configs, before anything is built
+    progress: List[AppProgress] = []
+    with console.status('[bold]Loading apps'):
+        for spec in _manifest.apps:
+            spec.config = resolve_jcloud_config(
+                config=spec.config, app_dir=spec.app_dir
+            )
+            get_jcloud_config(config_path=spec.config)
+            progress.append(
+                AppProgress(
+                    spec=spec,
+                    is_websocket=inspect_app(spec.app, spec.app_dir),
+                    build_key=(
+                        None
+                        if spec.uses
+                        else get_build_key(
+                            spec.app_dir, spec.version, spec.platform, spec.public
+                        )
+                    ),
+                )
+            )
+
+    # One lookup & one build per distinct image, shared by all the apps using it
+    user_id = asyncio.ensure_future(_in_thread(get_jina_userid))
+    builds: Dict[str, asyncio.Future] = {}
+
+    def _build(p: AppProgress) -> asyncio.Future:
+        if p.build_key not in builds:
+            builds[p.build_key] = asyncio.ensure_future(
+                _in_thread(
+                    push_app_dir_to_hubble,
+                    app_dir=p.spec.app_dir,
+                    tag=get_random_tag(),
+                    version=p.spec.version,
+                    platform=p.spec.platform,
+                    verbose=verbose,
+                    public=p.spec.public,
+                )
+            )
+        return builds[p.build_key]
+
+    async def _gateway_id(p: AppProgress) -> str:
+        if p.spec.uses is not None:
+            return p.spec.uses
+
+        p.state = 'Building image'
+        gateway_id = await _build(p)
+        p.state = 'Deploying'
+        return gateway_id
+
+    semaphore = asyncio.Semaphore(parallel or _manifest.parallel)
+
+    async def _deploy(p: AppProgress):
+        async with semaphore:
+            p.start = time.perf_counter()
+            p.state = 'Deploying'
+            p.timer = PhaseTimer()
+            try:
+                p.app_id = await deploy_built_app_on_jcloud(
+                    app=p.spec.app,
+                    gateway_id=_gateway_id(p),
+                    user_id=user_id,
+                    timer=p.timer,
+                    is_websocket=p.is_websocket,
+                    name=p.spec.name,
+                    app_id=p.spec.app_id,
+                    config=p.spec.config,
+                    cors=p.spec.cors,
+                    env=p.spec.env,
+                    secret=p.spec.secret,
+                    verbose=verbose,
+                )
+                p.state = 'Deployed'
+            except Exception as e:
+                p.error = str(e) or repr(e)
+            finally:
+                p.end = time.perf_counter()
+
+    with Live(_render(progress), console=console, refresh_per_second=4) as live:
+
+        async def _refresh():
+            while True:
+                live.update(_render(progress))
+                await asyncio.sleep(0.25)
+
+        refresher = asyncio.ensure_future(_refresh())
+        try:
+            await asyncio.gather(*(_deploy(p) for p in progress))
+        finally:
+            refresher.cancel()
+            live.update(_render(progress))
+
+    if timings:
+        for p in progress:
+            console.print(f'[bold]{p.spec.app}[/bold] ({p.spec.name})')
+            p.timer.print()
+    return progress
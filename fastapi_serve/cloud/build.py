@@ -7,9 +7,9 @@ from shutil import copyfile, copytree
 from tempfile import mkdtemp
 from typing import Optional, Tuple
 
-import requests
 import yaml
 
+from fastapi_serve.client import HUBBLE_API, get_http_client
 from fastapi_serve.cloud.helper import (
     any_websocket_route_in_app,
     get_parent_dir,
@@ -19,21 +19,23 @@ from fastapi_serve.helper import get_random_name
 
 
 def hubble_exists(name: str, secret: Optional[str] = None) -> bool:
+    params = {'id': name}
+    if secret is not None:
+        params['secret'] = secret
     return (
-        requests.get(
-            url='https://api.hubble.jina.ai/v2/executor/getMeta',
-            params={'id': name, 'secret': secret},
-        ).status_code
+        get_http_client()
+        .get_sync(f'{HUBBLE_API}/v2/executor/getMeta', params=params)
+        .status
         == HTTPStatus.OK
     )
 
 
 def get_jinaai_uri(id: str, tag: str):
-    import requests
     from hubble import Auth
 
-    r = requests.get(
-        f"https://apihubble.jina.ai/v2/executor/getMeta?id={id}&tag={tag}",
+    r = get_http_client().get_sync(
+        f'{HUBBLE_API}/v2/executor/getMeta',
+        params={'id': id, 'tag': tag},
         headers={"Authorization": f"token {Auth.get_auth_token()}"},
     )
     _json = r.json()
@@ -242,8 +244,29 @@ def push_app_to_hubble(
     verbose: Optional[bool] = False,
     public: Optional[bool] = False,
 ) -> str:
-    tmpdir = mkdtemp()
     app_dir, _ = get_app_dir(app=app, app_dir=app_dir)
+    return push_app_dir_to_hubble(
+        app_dir=app_dir,
+        image_name=image_name,
+        tag=tag,
+        version=version,
+        platform=platform,
+        verbose=verbose,
+        public=public,
+    )
+
+
+def push_app_dir_to_hubble(
+    app_dir: str,
+    image_name: str = None,
+    tag: str = 'latest',
+    version: str = 'latest',
+    platform: str = None,
+    verbose: Optional[bool] = False,
+    public: Optional[bool] = False,
+) -> str:
+    """Build & push the image of an app directory, without importing the app"""
+    tmpdir = mkdtemp()
 
     # Auto convert platform to amd64 if this is Mac
     if p.machine() == 'arm64':
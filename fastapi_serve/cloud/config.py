@@ -1,3 +1,4 @@
+import math
 import os
 from dataclasses import dataclass, field
 from typing import Dict
@@ -10,10 +11,58 @@ from fastapi_serve.cloud.errors import (
     InvalidAutoscaleMinError,
     InvalidDiskSizeError,
     InvalidInstanceError,
+    InvalidServerConfigError,
+    InvalidWorkersError,
 )
 
 # jcloud args
-VALID_AUTOSCALE_METRICS = ['cpu', 'memory', 'rps']
+VALID_AUTOSCALE_METRICS = ['cpu', 'memory', 'rps', 'concurrency']
+
+
+# CPU tiers of Jina AI Cloud, see https://docs.jina.ai/concepts/jcloud/configuration/#cpu-tiers
+@dataclass(frozen=True)
+class InstanceTier:
+    cpu: float  # vCPUs
+    memory: float  # GB
+    credits_per_hour: float
+
+
+INSTANCE_TIERS = {
+    'C1': InstanceTier(cpu=0.1, memory=0.2, credits_per_hour=1),
+    'C2': InstanceTier(cpu=0.5, memory=1, credits_per_hour=5),
+    'C3': InstanceTier(cpu=1, memory=2, credits_per_hour=10),
+    'C4': InstanceTier(cpu=2, memory=4, credits_per_hour=20),
+    'C5': InstanceTier(cpu=4, memory=8, credits_per_hour=40),
+    'C6': InstanceTier(cpu=8, memory=16, credits_per_hour=80),
+    'C7': InstanceTier(cpu=16, memory=32, credits_per_hour=160),
+    'C8': InstanceTier(cpu=32, memory=64, credits_per_hour=320),
+}
+EFS_CREDITS_PER_GB_HOUR = 0.104
+EUR_PER_CREDIT = 0.005
+
+# uvicorn args
+VALID_SERVER_LOOPS = ['auto', 'asyncio', 'uvloop']
+VALID_SERVER_HTTP = ['auto', 'h11', 'httptools']
+SERVER_PRESETS = {
+    'default': {},
+    # many concurrent, long-lived keep-alive clients (e.g. behind a load balancer)
+    'throughput': {
+        'loop': 'uvloop',
+        'http': 'httptools',
+        'backlog': 4096,
+        'timeout_keep_alive': 75,
+        'thread_pool_size': 64,
+    },
+    # bounded in-flight work so that queueing doesn't inflate latency
+    'low-latency': {
+        'loop': 'uvloop',
+        'http': 'httptools',
+        'backlog': 1024,
+        'timeout_keep_alive': 5,
+        'limit_concurrency': 256,
+        'thread_pool_size': 16,
+    },
+}
 
 # default values
 APP_NAME = 'fastapi'
@@ -32,12 +81,14 @@ class Defaults:
     instance: str = 'C3'  # instance type
     autoscale_min: int = 1  # min number of replicas
     autoscale_max: int = 10  # max number of replicas
-    autoscale_metric: str = 'cpu'  # cpu, memory, rps
+    autoscale_metric: str = 'cpu'  # cpu, memory, rps, concurrency
     autoscale_cpu_target: int = 70  # 70% cpu usage
     autoscale_rps_target: int = 10  # 10 requests per second
+    autoscale_concurrency_target: int = 10  # 10 in-flight requests per replica
     autoscale_stable_window: int = DEFAULT_TIMEOUT
     autoscale_revision_timeout: int = DEFAULT_TIMEOUT
     disk_size: str = '1G'
+    workers: int = 1  # number of gateway worker processes per replica
 
 
 @dataclass
@@ -95,21 +146,218 @@ class AutoscaleConfig:
 
     @classmethod
     def from_dict(cls, config: Dict):
-        _autoscale = config.get('autoscale', {})
+        _autoscale = config.get('autoscale') or {}
+        # like `JCloudConfig`, the windows follow the app timeout unless set explicitly
+        _timeout = config.get('timeout', DEFAULT_TIMEOUT)
+        _metric = _autoscale.get('metric', cls.metric)
+        _target = (
+            Defaults.autoscale_concurrency_target
+            if _metric == 'concurrency'
+            else cls.target
+        )
         return cls(
             min=_autoscale.get('min', cls.min),
             max=_autoscale.get('max', cls.max),
-            metric=_autoscale.get('metric', cls.metric),
-            target=_autoscale.get('target', cls.target),
+            metric=_metric,
+            target=_autoscale.get('target', _target),
+            stable_window=_autoscale.get('stable_window', _timeout),
+            revision_timeout=_autoscale.get('revision_timeout', _timeout),
+        )
+
+
+@dataclass
+class ServerConfig:
+    preset: str = None
+    loop: str = None
+    http: str = None
+    backlog: int = None
+    timeout_keep_alive: int = None
+    limit_concurrency: int = None
+    h11_max_incomplete_event_size: int = None
+    thread_pool_size: int = None  # anyio thread pool used for sync `def` endpoints
+    drain_timeout: float = None  # seconds in-flight requests get to finish on shutdown
+    drain_delay: float = None  # seconds to keep serving after `/healthz` fails
+    adaptive_concurrency: bool = None  # shed load past a limit learned from latency
+    max_concurrency: int = None  # upper bound of the learned limit, per worker
+    bulkheads: Dict = None  # name -> threads, max_queue & routes of a thread pool
+    response_cache: Dict = None  # max_memory & routes pattern -> ttl, vary, ...
+
+    _UVICORN_KEYS = (
+        'loop',
+        'http',
+        'backlog',
+        'timeout_keep_alive',
+        'limit_concurrency',
+        'h11_max_incomplete_event_size',
+    )
+
+    def __post_init__(self):
+        if self.preset is not None:
+            if self.preset not in SERVER_PRESETS:
+                raise InvalidServerConfigError('preset', self.preset)
+
+            # Explicitly set values take precedence over the preset
+            for key, value in SERVER_PRESETS[self.preset].items():
+                if getattr(self, key) is None:
+                    setattr(self, key, value)
+
+        if self.loop is not None and self.loop not in VALID_SERVER_LOOPS:
+            raise InvalidServerConfigError('loop', self.loop)
+
+        if self.http is not None and self.http not in VALID_SERVER_HTTP:
+            raise InvalidServerConfigError('http', self.http)
+
+        for key in (
+            'backlog',
+            'timeout_keep_alive',
+            'limit_concurrency',
+            'h11_max_incomplete_event_size',
+            'thread_pool_size',
+            'max_concurrency',
+        ):
+            value = getattr(self, key)
+            if value is None:
+                continue
+            try:
+                setattr(self, key, int(value))
+            except (TypeError, ValueError):
+                raise InvalidServerConfigError(key, value)
+            if getattr(self, key) < 1:
+                raise InvalidServerConfigError(key, value)
+
+        if self.adaptive_concurrency is not None and not isinstance(
+            self.adaptive_concurrency, bool
+        ):
+            raise InvalidServerConfigError(
+                'adaptive_concurrency', self.adaptive_concurrency
+            )
+
+        if self.bulkheads is not None:
+            self._validate_bulkheads()
+
+        if self.response_cache is not None:
+            self._validate_response_cache()
+
+        for key, minimum in (('drain_timeout', 1), ('drain_delay', 0)):
+            value = getattr(self, key)
+            if value is None:
+                continue
+            try:
+                setattr(self, key, float(value))
+            except (TypeError, ValueError):
+                raise InvalidServerConfigError(key, value)
+            if getattr(self, key) < minimum:
+                raise InvalidServerConfigError(key, value)
+
+    @property
+    def termination_grace_period(self) -> int:
+        """Seconds the platform must wait after SIGTERM before killing the server"""
+        from fastapi_serve.gateway.drain import (
+            DEFAULT_DRAIN_DELAY,
+            DEFAULT_DRAIN_TIMEOUT,
         )
 
+        delay = DEFAULT_DRAIN_DELAY if self.drain_delay is None else self.drain_delay
+        timeout = (
+            DEFAULT_DRAIN_TIMEOUT if self.drain_timeout is None else self.drain_timeout
+        )
+        return math.ceil(delay + timeout) + 5
+
+    def _validate_bulkheads(self):
+        if not isinstance(self.bulkheads, dict):
+            raise InvalidServerConfigError('bulkheads', self.bulkheads)
+
+        for name, spec in self.bulkheads.items():
+            if not isinstance(spec, dict) or set(spec) - {
+                'threads',
+                'max_queue',
+                'routes',
+            }:
+                raise InvalidServerConfigError(f'bulkheads.{name}', spec)
+            for key, minimum in (('threads', 1), ('max_queue', 0)):
+                value = spec.get(key)
+                if value is None:
+                    continue
+                if type(value) is not int or value < minimum:
+                    raise InvalidServerConfigError(f'bulkheads.{name}.{key}', value)
+            routes = spec.get('routes', [])
+            if not isinstance(routes, list) or not all(
+                isinstance(r, str) and r.startswith('/') for r in routes
+            ):
+                raise InvalidServerConfigError(f'bulkheads.{name}.routes', routes)
+
+    def _validate_response_cache(self):
+        from fastapi_serve.utils.cache import is_valid_vary
+
+        cache = self.response_cache
+        if not isinstance(cache, dict) or set(cache) - {'max_memory', 'routes'}:
+            raise InvalidServerConfigError('response_cache', cache)
+        max_memory = cache.get('max_memory')
+        if max_memory is not None and (
+            type(max_memory) not in (int, float) or max_memory <= 0
+        ):
+            raise InvalidServerConfigError('response_cache.max_memory', max_memory)
+
+        routes = cache.get('routes', {})
+        if not isinstance(routes, dict):
+            raise InvalidServerConfigError('response_cache.routes', routes)
+        for pattern, spec in routes.items():
+            key = f'response_cache.routes.{pattern}'
+            if (
+                not isinstance(pattern, str)
+                or not pattern.startswith('/')
+                or not isinstance(spec, dict)
+                or set(spec) - {'ttl', 'stale_while_revalidate', 'vary'}
+            ):
+                raise InvalidServerConfigError(key, spec)
+            for name, minimum in (('ttl', 0), ('stale_while_revalidate', -1)):
+                value = spec.get(name)
+                if value is None:
+                    continue
+                if type(value) not in (int, float) or value <= minimum:
+                    raise InvalidServerConfigError(f'{key}.{name}', value)
+            vary = spec.get('vary', [])
+            if not isinstance(vary, list) or not all(is_valid_vary(v) for v in vary):
+                raise InvalidServerConfigError(f'{key}.vary', vary)
+
+    def to_uvicorn_kwargs(self) -> Dict:
+        return {
+            key: getattr(self, key)
+            for key in self._UVICORN_KEYS
+            if getattr(self, key) is not None
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            'server': {
+                key: value
+                for key, value in self.__dict__.items()
+                if value is not None and key != 'preset'
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, config: Dict):
+        _server = config.get('server') or {}
+        if not isinstance(_server, dict):
+            raise InvalidServerConfigError('server', _server)
+
+        unknown = set(_server) - set(cls.__dataclass_fields__)
+        if unknown:
+            key = sorted(unknown)[0]
+            raise InvalidServerConfigError(key, _server[key])
+
+        return cls(**_server)
+
 
 @dataclass
 class JCloudConfig:
     timeout: int = DEFAULT_TIMEOUT
     instance: str = Defaults.instance
     disk_size: str = Defaults.disk_size
+    workers: int = Defaults.workers
     autoscale: AutoscaleConfig = field(init=False)
+    server: ServerConfig = field(init=False)
 
     def __post_init__(self):
         if self.instance and not (
@@ -127,9 +375,33 @@ class JCloudConfig:
         if self.timeout < 1:
             raise ValueError(f'Invalid timeout {self.timeout}. Must be greater than 1')
 
+        try:
+            self.workers = int(self.workers)
+            if self.workers < 1:
+                raise InvalidWorkersError(self.workers)
+        except (TypeError, ValueError):
+            raise InvalidWorkersError(self.workers)
+
         self.autoscale = AutoscaleConfig(
             stable_window=self.timeout, revision_timeout=self.timeout
         )
+        self.server = ServerConfig()
+
+    @property
+    def disk_size_gb(self) -> float:
+        if not isinstance(self.disk_size, str):
+            return 0
+        for suffix, scale in (
+            ('Gi', 1024**3 / 1e9),
+            ('GB', 1),
+            ('G', 1),
+            ('Mi', 1024**2 / 1e9),
+            ('MB', 1e-3),
+            ('M', 1e-3),
+        ):
+            if self.disk_size.endswith(suffix):
+                return float(self.disk_size[: -len(suffix)]) * scale
+        return 0
 
     def to_dict(self) -> Dict:
         jcloud_dict = {
@@ -165,16 +437,25 @@ class JCloudConfig:
                 "max": 10,
                 "metric": "cpu",
                 "target": 70,
+                "stable_window": 120,
+                "revision_timeout": 120,
             },
-            "disk_size": "1G"
+            "disk_size": "1G",
+            "workers": 1,
+            "server": {
+                "preset": "throughput",
+                "limit_concurrency": 512,
+            }
         }
         '''
         jcloud_config = cls(
             instance=config.get('instance', cls.instance),
             disk_size=config.get('disk_size', cls.disk_size),
             timeout=config.get('timeout', cls.timeout),
+            workers=config.get('workers', cls.workers),
         )
         jcloud_config.autoscale = AutoscaleConfig.from_dict(config)
+        jcloud_config.server = ServerConfig.from_dict(config)
         return jcloud_config
 
     @classmethod
@@ -201,6 +482,14 @@ def validate_jcloud_config_callback(ctx, param, value):
         raise click.BadParameter(
             f"Invalid disk size '{e.disk_size}' found in config file."
         )
+    except InvalidWorkersError as e:
+        raise click.BadParameter(
+            f"Invalid workers '{e.workers}' found in config file, it should be a number >= 1."
+        )
+    except InvalidServerConfigError as e:
+        raise click.BadParameter(
+            f"Invalid server.{e.key} '{e.value}' found in config file, please refer to https://github.com/jina-ai/fastapi-serve/blob/main/docs/CONFIG.MD for valid server options."
+        )
 
     return value
 
@@ -223,7 +512,13 @@ def resolve_jcloud_config(config, app_dir: str):
 
     try:
         JCloudConfig.from_file(config_path)
-    except (InvalidAutoscaleMinError, InvalidInstanceError, InvalidDiskSizeError) as e:
+    except (
+        InvalidAutoscaleMinError,
+        InvalidInstanceError,
+        InvalidDiskSizeError,
+        InvalidWorkersError,
+        InvalidServerConfigError,
+    ) as e:
         # If it's malformed, we treated as non-existed
         print(f'config file {config_path} is malformed: {e}')
         return None
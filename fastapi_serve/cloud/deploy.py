@@ -1,10 +1,11 @@
+import asyncio
 import os
 import sys
+from functools import partial
 from tempfile import TemporaryDirectory
-from typing import Dict, List, Tuple
+from typing import TYPE_CHECKING, Awaitable, Dict, List, Tuple
 
 import yaml
-from dotenv import dotenv_values
 
 from fastapi_serve.cloud.config import (
     APP_LOGS_URL,
@@ -13,14 +14,17 @@ from fastapi_serve.cloud.config import (
     DOCARRAY_VERSION,
     JINA_VERSION,
     PRICING_URL,
+    ServerConfig,
     get_jcloud_config,
 )
 from fastapi_serve.helper import (
     EnvironmentVarCtxtManager,
-    asyncio_run_property,
+    asyncio_run,
     get_random_name,
 )
-from fastapi_serve.utils.helper import FlowUserEnvVar, get_jina_userid
+
+if TYPE_CHECKING:
+    from fastapi_serve.cloud.helper import PhaseTimer
 
 
 def get_gateway_config_yaml_path() -> str:
@@ -34,10 +38,10 @@ def get_gateway_uses(id: str) -> str:
     return f'jinahub+docker://{id}'
 
 
-def get_existing_name(app_id: str) -> str:
+async def get_existing_name_async(app_id: str) -> str:
     from jcloud.flow import CloudFlow
 
-    flow_obj = asyncio_run_property(CloudFlow(flow_id=app_id).status)
+    flow_obj = await CloudFlow(flow_id=app_id).status
     if (
         'spec' in flow_obj
         and 'jcloud' in flow_obj['spec']
@@ -46,6 +50,10 @@ def get_existing_name(app_id: str) -> str:
         return flow_obj['spec']['jcloud']['name']
 
 
+def get_existing_name(app_id: str) -> str:
+    return asyncio_run(get_existing_name_async, app_id)
+
+
 def get_global_jcloud_args(app_id: str = None, name: str = APP_NAME) -> Dict:
     if app_id is not None:
         _name = get_existing_name(app_id)
@@ -74,26 +82,47 @@ def get_global_jcloud_args(app_id: str = None, name: str = APP_NAME) -> Dict:
     }
 
 
-def get_uvicorn_args() -> Dict:
+def get_uvicorn_args(server_config: ServerConfig = None) -> Dict:
     return {
         'uvicorn_kwargs': {
             'ws_ping_interval': None,
             'ws_ping_timeout': None,
+            **(server_config.to_uvicorn_kwargs() if server_config else {}),
         }
     }
 
 
-def get_with_args_for_jcloud(cors: bool = True, envs: Dict = {}) -> Dict:
+def get_with_args_for_jcloud(
+    cors: bool = True, envs: Dict = {}, server_config: ServerConfig = None
+) -> Dict:
     return {
         'with': {
             'cors': cors,
             'extra_search_paths': ['/workdir/fastapi_serve'],
             'env': envs or {},
-            **get_uvicorn_args(),
+            **get_uvicorn_args(server_config),
         }
     }
 
 
+def get_telemetry_args(host: str, traces: bool = False) -> Dict:
+    """Export metrics (and traces) to an OTLP (gRPC) collector on `host`"""
+    return {
+        'metrics': True,
+        'metrics_exporter_host': host,
+        'metrics_exporter_port': 4317,
+        **(
+            {
+                'tracing': True,
+                'traces_exporter_host': host,
+                'traces_exporter_port': 4317,
+            }
+            if traces
+            else {}
+        ),
+    }
+
+
 def get_flow_dict(
     app: str,
     jcloud: bool = False,
@@ -105,9 +134,22 @@ def get_flow_dict(
     jcloud_config_path: str = None,
     cors: bool = True,
     env: str = None,
+    workers: int = None,
+    server_config: ServerConfig = None,
+    user_id: str = None,
+    telemetry_host: str = None,
+    host: str = None,
 ) -> Dict:
+    from dotenv import dotenv_values
+
+    from fastapi_serve.utils.helper import FlowUserEnvVar, get_jina_userid
+
     if jcloud:
         jcloud_config = get_jcloud_config(config_path=jcloud_config_path)
+        if workers is None:
+            workers = jcloud_config.workers
+        if server_config is None:
+            server_config = jcloud_config.server
 
     _envs = {}
     if env is not None:
@@ -115,39 +157,52 @@ def get_flow_dict(
         _envs = dict(dotenv_values(env))
 
     # add userid to _envs dict
-    _envs.update({FlowUserEnvVar: get_jina_userid()})
+    _envs.update({FlowUserEnvVar: user_id or get_jina_userid()})
+
+    if server_config is not None and server_config.loop == 'asyncio':
+        # jina runs the gateway on uvloop whenever it's installed
+        _envs.update({'JINA_DISABLE_UVLOOP': '1'})
+
+    _uses_with = {'app': app}
+    if workers and workers > 1:
+        _uses_with['workers'] = workers
+    if server_config is not None and server_config.thread_pool_size:
+        _uses_with['thread_pool_size'] = server_config.thread_pool_size
+    if server_config is not None and server_config.drain_timeout is not None:
+        _uses_with['drain_timeout'] = server_config.drain_timeout
+    if server_config is not None and server_config.drain_delay is not None:
+        _uses_with['drain_delay'] = server_config.drain_delay
+    if server_config is not None and server_config.adaptive_concurrency:
+        _uses_with['adaptive_concurrency'] = True
+        if server_config.max_concurrency:
+            _uses_with['max_concurrency'] = server_config.max_concurrency
+    if server_config is not None and server_config.bulkheads:
+        _uses_with['bulkheads'] = server_config.bulkheads
+    if server_config is not None and server_config.response_cache:
+        _uses_with['response_cache'] = server_config.response_cache
 
     uses = get_gateway_uses(id=gateway_id) if jcloud else get_gateway_config_yaml_path()
     flow_dict = {
         'jtype': 'Flow',
-        **(get_with_args_for_jcloud(cors, _envs) if jcloud else {}),
+        **(get_with_args_for_jcloud(cors, _envs, server_config) if jcloud else {}),
         'gateway': {
             'uses': uses,
-            'uses_with': {
-                'app': app,
-            },
+            'uses_with': _uses_with,
             'port': [port],
+            **({'host': host} if host else {}),
             'protocol': ['websocket'] if is_websocket else ['http'],
             'env': _envs if _envs else {},
-            **get_uvicorn_args(),
+            **get_uvicorn_args(server_config),
             **(jcloud_config.to_dict() if jcloud else {}),
         },
         **(get_global_jcloud_args(app_id=app_id, name=name) if jcloud else {}),
     }
     if os.environ.get("FASTAPI_SERVE_TEST", False):
-        if 'with' not in flow_dict:
-            flow_dict['with'] = {}
-
-        flow_dict['with'].update(
-            {
-                'metrics': True,
-                'metrics_exporter_host': 'http://localhost',
-                'metrics_exporter_port': 4317,
-                'tracing': True,
-                'traces_exporter_host': 'http://localhost',
-                'traces_exporter_port': 4317,
-            }
+        flow_dict.setdefault('with', {}).update(
+            get_telemetry_args('http://localhost', traces=True)
         )
+    elif telemetry_host is not None:
+        flow_dict.setdefault('with', {}).update(get_telemetry_args(telemetry_host))
     return flow_dict
 
 
@@ -160,17 +215,23 @@ def get_flow_yaml(
     cors: bool = True,
     jcloud_config_path: str = None,
     env: str = None,
+    workers: int = None,
+    server_config: ServerConfig = None,
+    host: str = None,
 ) -> str:
     return yaml.safe_dump(
         get_flow_dict(
             app=app,
             port=port,
+            host=host,
             name=name,
             is_websocket=is_websocket,
             cors=cors,
             jcloud=jcloud,
             jcloud_config_path=jcloud_config_path,
             env=env,
+            workers=workers,
+            server_config=server_config,
         ),
         sort_keys=False,
     )
@@ -210,6 +271,7 @@ async def patch_secret_on_jcloud(
 ):
     os.environ['JCLOUD_LOGLEVEL'] = 'INFO' if verbose else 'ERROR'
 
+    from dotenv import dotenv_values
     from jcloud.flow import CloudFlow
 
     with TemporaryDirectory() as tmpdir:
@@ -228,6 +290,26 @@ async def patch_secret_on_jcloud(
             )
 
 
+async def create_secret_on_jcloud(
+    app_id: str, secret: str, verbose: bool = False
+) -> Dict:
+    """Create a secret for an existing app without rolling it out, returns the
+    `env_from_secret` mapping to be added to the flow"""
+    os.environ['JCLOUD_LOGLEVEL'] = 'INFO' if verbose else 'ERROR'
+
+    from dotenv import dotenv_values
+    from jcloud.flow import CloudFlow
+
+    secret_name = get_random_name()
+    secrets_values = dict(dotenv_values(secret))
+    await CloudFlow(flow_id=app_id).create_secret(
+        secret_name=secret_name,
+        env_secret_data=secrets_values,
+        update=False,
+    )
+    return {key: {'name': secret_name, 'key': key} for key in secrets_values}
+
+
 async def get_app_status_on_jcloud(app_id: str):
     from jcloud.flow import CloudFlow
     from rich import box
@@ -254,9 +336,11 @@ async def get_app_status_on_jcloud(app_id: str):
     ):
         return _t.add_row(
             Align(f'[bold]{key}' if bold_key else key, vertical='middle'),
-            Align(f'[bold]{value}[/bold]' if bold_value else value, align='center')
-            if center_align
-            else value,
+            (
+                Align(f'[bold]{value}[/bold]' if bold_value else value, align='center')
+                if center_align
+                else value
+            ),
         )
 
     console = Console()
@@ -295,42 +379,139 @@ async def get_app_status_on_jcloud(app_id: str):
         console.print(_t)
 
 
-async def list_apps_on_jcloud(phase: str, name: str):
+STATUS_COLUMNS = ('AppID', 'Name', 'Phase', 'Endpoint', 'Credits (per hour)')
+
+# Bounds the number of concurrent status requests of `status` with many apps
+STATUS_CONCURRENCY = 16
+
+
+async def _get_status_row(app_id: str, semaphore: asyncio.Semaphore) -> Tuple:
+    from jcloud.flow import CloudFlow
+
+    async with semaphore:
+        try:
+            app_details = await CloudFlow(flow_id=app_id).status
+        except Exception as e:
+            return (app_id, '', 'Error', str(e) or repr(e), '')
+
+    if not app_details or 'status' not in app_details:
+        return (app_id, '', 'Not found', '', '')
+
+    status: Dict = app_details['status']
+    endpoints = status.get('endpoints', {})
+    return (
+        app_id,
+        app_details.get('spec', {}).get('jcloud', {}).get('name', ''),
+        status.get('phase', ''),
+        list(endpoints.values())[0] if endpoints else '',
+        app_details.get('CPH', {}).get('total', 0),
+    )
+
+
+async def get_apps_status(app_ids: List[str]) -> Dict[str, Tuple]:
+    """Fetch the status of many apps concurrently, keyed by app id"""
+    semaphore = asyncio.Semaphore(STATUS_CONCURRENCY)
+    rows = await asyncio.gather(*(_get_status_row(i, semaphore) for i in app_ids))
+    return dict(zip(app_ids, rows))
+
+
+async def get_apps_status_on_jcloud(
+    app_ids: List[str],
+    watch: bool = False,
+    interval: float = 2,
+    max_interval: float = 30,
+):
+    from rich import box
+    from rich.console import Console
+    from rich.table import Table
+
+    from fastapi_serve.cloud.helper import watch_rows
+
+    # dedupe, keeping the order
+    app_ids = list(dict.fromkeys(app_ids))
+    if len(app_ids) == 1 and not watch:
+        return await get_app_status_on_jcloud(app_ids[0])
+
+    if watch:
+        return await watch_rows(
+            STATUS_COLUMNS,
+            partial(get_apps_status, app_ids),
+            phase_column=STATUS_COLUMNS.index('Phase'),
+            interval=interval,
+            max_interval=max_interval,
+        )
+
+    console = Console()
+    with console.status(f'[bold]Getting status of {len(app_ids)} apps'):
+        rows = await get_apps_status(app_ids)
+
+    _t = Table(*STATUS_COLUMNS, box=box.ROUNDED, highlight=True)
+    for row in rows.values():
+        _t.add_row(*(str(c) for c in row))
+    console.print(_t)
+
+
+LIST_COLUMNS = ('AppID', 'Phase', 'Endpoint', 'Created')
+
+
+async def _list_apps(phase: str, name: str) -> Dict[str, Tuple]:
     from jcloud.flow import CloudFlow
     from jcloud.helper import cleanup_dt, get_phase_from_response
+
+    all_apps = await CloudFlow().list_all(
+        phase=phase, name=name, labels=f'app={DEFAULT_LABEL}'
+    )
+    if not all_apps:
+        return {}
+
+    def _get_endpoint(app):
+        endpoints = app.get('status', {}).get('endpoints', {})
+        return list(endpoints.values())[0] if endpoints else ''
+
+    return {
+        app['id']: (
+            app['id'],
+            get_phase_from_response(app),
+            _get_endpoint(app),
+            cleanup_dt(app['ctime']),
+        )
+        for app in all_apps['flows']
+    }
+
+
+async def list_apps_on_jcloud(
+    phase: str,
+    name: str,
+    watch: bool = False,
+    interval: float = 2,
+    max_interval: float = 30,
+):
     from rich import box, print
     from rich.console import Console
     from rich.table import Table
 
-    _t = Table(
-        'AppID',
-        'Phase',
-        'Endpoint',
-        'Created',
-        box=box.ROUNDED,
-        highlight=True,
-    )
+    from fastapi_serve.cloud.helper import watch_rows
 
-    console = Console()
-    with console.status(f'[bold]Listing all apps'):
-        all_apps = await CloudFlow().list_all(
-            phase=phase, name=name, labels=f'app={DEFAULT_LABEL}'
+    if watch:
+        return await watch_rows(
+            LIST_COLUMNS,
+            partial(_list_apps, phase=phase, name=name),
+            phase_column=LIST_COLUMNS.index('Phase'),
+            interval=interval,
+            max_interval=max_interval,
         )
-        if not all_apps:
+
+    _t = Table(*LIST_COLUMNS, box=box.ROUNDED, highlight=True)
+
+    console = Console()
+    with console.status('[bold]Listing all apps'):
+        rows = await _list_apps(phase=phase, name=name)
+        if not rows:
             print('No apps found')
             return
 
-        def _get_endpoint(app):
-            endpoints = app.get('status', {}).get('endpoints', {})
-            return list(endpoints.values())[0] if endpoints else ''
-
-        for app in all_apps['flows']:
-            _t.add_row(
-                app['id'],
-                get_phase_from_response(app),
-                _get_endpoint(app),
-                cleanup_dt(app['ctime']),
-            )
+        for row in rows.values():
+            _t.add_row(*row)
         console.print(_t)
 
 
@@ -346,21 +527,252 @@ def serve_locally(
     app: str,
     port: int = 8080,
     env: str = None,
+    workers: int = 1,
+    server_config: ServerConfig = None,
+    direct: bool = False,
+    replicas: int = 1,
+    host: str = None,
 ):
+    """Serve the app on `port`, on all interfaces unless `host` is set"""
+    if replicas > 1:
+        return serve_replicas(
+            app=app,
+            port=port,
+            replicas=replicas,
+            env=env,
+            workers=workers,
+            server_config=server_config,
+            direct=direct,
+        )
+
+    if direct:
+        return serve_directly(
+            app=app,
+            host=host,
+            port=port,
+            env=env,
+            workers=workers,
+            server_config=server_config,
+        )
+
     from jina import Flow
 
     sys.path.append(os.getcwd())
     f_yaml = get_flow_yaml(
         app=app,
         jcloud=False,
+        host=host,
         port=port,
         env=env,
+        workers=workers,
+        server_config=server_config,
     )
     with Flow.load_config(f_yaml) as f:
         # TODO: add local description
         f.block()
 
 
+class LocalReplicas:
+    """Spawned processes serving copies of the app on internal ports, the upstreams of
+    a `ReverseProxy`. Dead replicas are restarted, and `rolling_restart` replaces them
+    one at a time without dropping requests."""
+
+    def __init__(
+        self,
+        app: str,
+        replicas: int = 2,
+        env: str = None,
+        workers: int = 1,
+        server_config: ServerConfig = None,
+        direct: bool = False,
+        logger=None,
+        startup_timeout: float = 600,
+        drain_timeout: float = 30,
+    ):
+        import multiprocessing
+
+        from fastapi_serve.gateway.direct import get_direct_logger
+
+        self.app = app
+        self.replicas = replicas
+        self.kwargs = dict(
+            env=env, workers=workers, server_config=server_config, direct=direct
+        )
+        self.logger = logger or get_direct_logger()
+        self.startup_timeout = startup_timeout
+        self.drain_timeout = drain_timeout
+        # a replica drains its own requests on SIGINT, give it the time to
+        self.stop_timeout = (server_config or ServerConfig()).termination_grace_period
+        # spawned, as forking after loading jina/the app isn't safe. A spawned replica
+        # imports the app afresh, so that restarts pick up code changes
+        self._ctx = multiprocessing.get_context('spawn')
+        self.processes = []
+        self.ports: List[int] = []
+
+    @property
+    def upstreams(self) -> List[str]:
+        return [f'http://127.0.0.1:{p}' for p in self.ports]
+
+    def _start(self, i: int, port: int):
+        process = self._ctx.Process(
+            target=serve_locally,
+            # only reachable through the proxy
+            kwargs=dict(app=self.app, host='127.0.0.1', port=port, **self.kwargs),
+            name=f'replica-{i}',
+        )
+        process.start()
+        self.logger.info(f'Started replica {i} (pid {process.pid}) on port {port}')
+        return process
+
+    def start(self):
+        from fastapi_serve.helper import get_free_port
+
+        self.ports = [get_free_port() for _ in range(self.replicas)]
+        self.processes = [self._start(i, p) for i, p in enumerate(self.ports)]
+
+    def restart_dead(self):
+        for i, process in enumerate(self.processes):
+            if not process.is_alive():
+                self.logger.warning(
+                    f'Replica {i} exited with code {process.exitcode}, restarting'
+                )
+                self.processes[i] = self._start(i, self.ports[i])
+
+    @staticmethod
+    def _interrupt(process):
+        import signal
+
+        if process.is_alive():
+            # replicas shut down gracefully on SIGINT, like on Ctrl+C
+            os.kill(process.pid, signal.SIGINT)
+
+    def _join(self, process):
+        process.join(timeout=self.stop_timeout)
+        if process.is_alive():
+            process.terminate()
+
+    def _stop(self, process):
+        self._interrupt(process)
+        self._join(process)
+
+    async def rolling_restart(self, proxy, app: str = None):
+        """Replace the replicas one at a time, e.g. with `app` or with the changed code
+        of the same app: a new replica is started and added to `proxy` once healthy,
+        then the old one is drained and stopped. Stops at the first new replica that
+        doesn't become healthy, leaving the old one serving."""
+        from fastapi_serve.helper import get_free_port
+
+        loop = asyncio.get_running_loop()
+        self.app = app or self.app
+        self.logger.info(f'Rolling restart of {self.replicas} replicas on {self.app}')
+        for i in range(self.replicas):
+            old_process, old_url = self.processes[i], self.upstreams[i]
+            port = get_free_port()
+            process = self._start(i, port)
+            upstream = proxy.add_upstream(f'http://127.0.0.1:{port}')
+            # not restarted by `restart_dead` while it starts
+            self.processes[i], self.ports[i] = process, port
+            try:
+                await proxy.wait_until_healthy(self.startup_timeout)
+            except TimeoutError:
+                self.logger.error(
+                    f'Replica {i} did not become healthy, rollout stopped'
+                )
+                self.processes[i] = old_process
+                self.ports[i] = int(old_url.rsplit(':', 1)[1])
+                await proxy.drain(upstream, timeout=0)
+                await loop.run_in_executor(None, self._stop, process)
+                return False
+
+            old = next(u for u in proxy.upstreams if u.url == old_url)
+            if not await proxy.drain(old, timeout=self.drain_timeout):
+                self.logger.warning(
+                    f'Replica {i} still had {old.inflight} requests in flight after {self.drain_timeout} s'
+                )
+            await loop.run_in_executor(None, self._stop, old_process)
+            self.logger.info(f'Replica {i} replaced (pid {process.pid}, port {port})')
+        return True
+
+    def stop(self):
+        for process in self.processes:
+            self._interrupt(process)
+        for process in self.processes:
+            self._join(process)
+
+
+def serve_replicas(
+    app: str,
+    port: int = 8080,
+    replicas: int = 2,
+    env: str = None,
+    workers: int = 1,
+    server_config: ServerConfig = None,
+    direct: bool = False,
+):
+    """Serve `replicas` copies of the app on internal ports, behind a
+    least-connections reverse proxy listening on `port`. SIGHUP restarts the
+    replicas one at a time, e.g. to pick up code changes without downtime."""
+    from fastapi_serve.gateway.proxy import serve_proxy
+
+    local = LocalReplicas(
+        app=app,
+        replicas=replicas,
+        env=env,
+        workers=workers,
+        server_config=server_config,
+        direct=direct,
+        drain_timeout=(server_config.drain_timeout if server_config else None) or 30,
+    )
+    local.start()
+    try:
+        serve_proxy(
+            upstreams=local.upstreams,
+            logger=local.logger,
+            port=port,
+            on_health_check=local.restart_dead,
+            on_reload=local.rolling_restart,
+        )
+    finally:
+        local.stop()
+
+
+def serve_directly(
+    app: str,
+    port: int = 8080,
+    host: str = None,
+    env: str = None,
+    workers: int = 1,
+    server_config: ServerConfig = None,
+    user_id: str = None,
+):
+    from dotenv import dotenv_values
+
+    from fastapi_serve.gateway.direct import serve_direct
+    from fastapi_serve.utils.helper import get_jina_userid
+
+    if env is not None:
+        os.environ.update(
+            {k: v for k, v in dotenv_values(env).items() if v is not None}
+        )
+
+    serve_direct(
+        app=app,
+        host=host or '0.0.0.0',
+        port=port,
+        workers=workers,
+        # the owner of the app, as `get_flow_dict` injects it in the gateway
+        user_id=user_id or get_jina_userid(),
+        thread_pool_size=server_config.thread_pool_size if server_config else None,
+        drain_timeout=server_config.drain_timeout if server_config else None,
+        drain_delay=server_config.drain_delay if server_config else None,
+        adaptive_concurrency=bool(server_config and server_config.adaptive_concurrency),
+        max_concurrency=server_config.max_concurrency if server_config else None,
+        bulkheads=server_config.bulkheads if server_config else None,
+        response_cache=server_config.response_cache if server_config else None,
+        uvicorn_kwargs=get_uvicorn_args(server_config)['uvicorn_kwargs'],
+    )
+
+
 async def serve_on_jcloud(
     app: str,
     app_dir: str = None,
@@ -375,21 +787,34 @@ async def serve_on_jcloud(
     secret: str = None,
     verbose: bool = False,
     public: bool = False,
+    timings: bool = False,
 ) -> str:
-    from fastapi_serve.cloud.build import get_app_dir, push_app_to_hubble
+    from fastapi_serve.cloud.build import get_app_dir, push_app_dir_to_hubble
     from fastapi_serve.cloud.config import resolve_jcloud_config
+    from fastapi_serve.cloud.helper import PhaseTimer
     from fastapi_serve.helper import get_random_tag
+    from fastapi_serve.utils.helper import get_jina_userid
 
-    app_dir, is_websocket = get_app_dir(app=app, app_dir=app_dir)
-    config = resolve_jcloud_config(config=config, app_dir=app_dir)
+    timer = PhaseTimer()
+    loop = asyncio.get_running_loop()
 
-    if uses is not None:
-        # If `uses` is provided, use it as gateway id
-        gateway_id = uses
-    else:
-        # If `uses` is not provided, push the app to hubble and get the gateway id
-        gateway_id = push_app_to_hubble(
-            app=app,
+    def _in_thread(func, **kwargs):
+        return loop.run_in_executor(None, partial(func, **kwargs))
+
+    with timer.phase('Load app & validate config'):
+        app_dir, is_websocket = get_app_dir(app=app, app_dir=app_dir)
+        config = resolve_jcloud_config(config=config, app_dir=app_dir)
+        get_jcloud_config(config_path=config)
+
+    async def _build() -> str:
+        if uses is not None:
+            # If `uses` is provided, use it as gateway id
+            return uses
+
+        # If `uses` is not provided, push the app to hubble and get the gateway id.
+        # Pushing is blocking, run it off the event loop
+        return await _in_thread(
+            push_app_dir_to_hubble,
             app_dir=app_dir,
             tag=get_random_tag(),
             version=version,
@@ -398,36 +823,99 @@ async def serve_on_jcloud(
             public=public,
         )
 
+    app_id = await deploy_built_app_on_jcloud(
+        app=app,
+        gateway_id=_build(),
+        user_id=_in_thread(get_jina_userid),
+        timer=timer,
+        is_websocket=is_websocket,
+        name=name,
+        app_id=app_id,
+        config=config,
+        cors=cors,
+        env=env,
+        secret=secret,
+        verbose=verbose,
+    )
+
+    # Show the app status
+    with timer.phase('Get status'):
+        await get_app_status_on_jcloud(app_id=app_id)
+
+    if timings:
+        timer.print()
+    return app_id
+
+
+async def deploy_built_app_on_jcloud(
+    app: str,
+    gateway_id: Awaitable[str],
+    user_id: Awaitable[str],
+    timer: 'PhaseTimer',
+    is_websocket: bool = False,
+    name: str = APP_NAME,
+    app_id: str = None,
+    config: str = None,
+    cors: bool = True,
+    env: str = None,
+    secret: str = None,
+    verbose: bool = False,
+) -> str:
+    """Deploy an app once its image is built, the image & the user are awaited
+    concurrently with the lookups of the existing app.
+
+    An existing app gets its secret in the same rollout. Secrets belong to an app, so
+    a new one only gets it in a second rollout, once it has an ID."""
+
+    async def _existing_name() -> str:
+        return await get_existing_name_async(app_id) if app_id else None
+
+    gateway_id, user_id, existing_name = await asyncio.gather(
+        timer.run('Build & push image', gateway_id),
+        timer.run('Look up user', user_id),
+        timer.run('Look up existing app', _existing_name()),
+    )
+
+    # Only once the build succeeded, so that a failed one leaves no secret behind
+    env_from_secret = None
+    if secret is not None and app_id is not None:
+        with timer.phase('Create secret'):
+            env_from_secret = await create_secret_on_jcloud(
+                app_id=app_id, secret=secret, verbose=verbose
+            )
+
     # Get the flow dict
     flow_dict = get_flow_dict(
         app=app,
         jcloud=True,
         port=8080,
-        name=name,
-        app_id=app_id,
+        name=existing_name or name,
+        app_id=None,  # the existing name is already resolved
         gateway_id=gateway_id,
         is_websocket=is_websocket,
         jcloud_config_path=config,
         cors=cors,
         env=env,
+        user_id=user_id,
     )
+    if env_from_secret:
+        flow_dict['with']['env_from_secret'] = env_from_secret
 
     # Deploy the app
-    app_id, _ = await deploy_app_on_jcloud(
-        flow_dict=flow_dict,
-        app_id=app_id,
-        verbose=verbose,
-    )
-
-    # If secret is not None, create a secret and update the app
-    if secret is not None:
-        await patch_secret_on_jcloud(
+    with timer.phase('Deploy'):
+        app_id, _ = await deploy_app_on_jcloud(
             flow_dict=flow_dict,
             app_id=app_id,
-            secret=secret,
             verbose=verbose,
         )
 
-    # Show the app status
-    await get_app_status_on_jcloud(app_id=app_id)
+    # A new app gets its secret after the first deploy, as jcloud needs the app ID
+    if secret is not None and env_from_secret is None:
+        with timer.phase('Create secret & update app'):
+            await patch_secret_on_jcloud(
+                flow_dict=flow_dict,
+                app_id=app_id,
+                secret=secret,
+                verbose=verbose,
+            )
     return app_id
@@ -20,3 +20,22 @@ class InvalidDiskSizeError(ValueError):
     def __init__(self, disk_size):
         super().__init__("Invalid disk size: {}".format(disk_size))
         self.disk_size = disk_size
+
+
+class InvalidWorkersError(ValueError):
+    def __init__(self, workers):
+        super().__init__("Invalid workers: {}".format(workers))
+        self.workers = workers
+
+
+class InvalidServerConfigError(ValueError):
+    def __init__(self, key, value):
+        super().__init__("Invalid server.{}: {}".format(key, value))
+        self.key = key
+        self.value = value
+
+
+class InvalidManifestError(ValueError):
+    def __init__(self, reason):
+        super().__init__("Invalid manifest: {}".format(reason))
+        self.reason = reason
@@ -1,6 +1,23 @@
+import asyncio
+import math
 import os
 from enum import Enum
+from functools import partial
 from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Optional
+
+import yaml
+
+if TYPE_CHECKING:
+    from fastapi_serve.cloud.config import AutoscaleConfig, JCloudConfig
+
+# Flow.to_kubernetes_yaml puts everything in this namespace unless told otherwise
+K8S_NAMESPACE = 'default'
+# emitted by the gateway's `MetricsMiddleware`, per replica. Exposed through the
+# custom metrics API, counters become per-second rates (e.g. with prometheus-adapter)
+INFLIGHT_METRIC = 'fastapi_serve_inflight_requests'
+REQUEST_RATE_METRIC = 'fastapi_serve_request_count'
+HEALTH_PATH = '/healthz'
 
 
 class ExportKind(str, Enum):
@@ -8,6 +25,293 @@ class ExportKind(str, Enum):
     DOCKER_COMPOSE = 'docker-compose'
 
 
+def _hpa_metric(autoscale: 'AutoscaleConfig') -> Dict:
+    if autoscale.metric in ('cpu', 'memory'):
+        return {
+            'type': 'Resource',
+            'resource': {
+                'name': autoscale.metric,
+                'target': {
+                    'type': 'Utilization',
+                    'averageUtilization': autoscale.target,
+                },
+            },
+        }
+
+    return {
+        'type': 'Pods',
+        'pods': {
+            'metric': {
+                'name': (
+                    INFLIGHT_METRIC
+                    if autoscale.metric == 'concurrency'
+                    else REQUEST_RATE_METRIC
+                )
+            },
+            'target': {
+                'type': 'AverageValue',
+                'averageValue': str(autoscale.target),
+            },
+        },
+    }
+
+
+def get_k8s_hpa(
+    autoscale: 'AutoscaleConfig',
+    deployment: str = 'gateway',
+    namespace: str = K8S_NAMESPACE,
+) -> Dict:
+    """HorizontalPodAutoscaler scaling `deployment` on the autoscale metric.
+
+    `cpu` & `memory` are relative to the pod's resource requests. `rps` & `concurrency`
+    have to be served by the custom metrics API, e.g. by prometheus-adapter on top of
+    the OpenTelemetry collector's Prometheus exporter.
+    """
+    return {
+        'apiVersion': 'autoscaling/v2',
+        'kind': 'HorizontalPodAutoscaler',
+        'metadata': {'name': deployment, 'namespace': namespace},
+        'spec': {
+            'scaleTargetRef': {
+                'apiVersion': 'apps/v1',
+                'kind': 'Deployment',
+                'name': deployment,
+            },
+            # HPA can't scale to zero without the `HPAScaleToZero` feature gate
+            'minReplicas': max(autoscale.min, 1),
+            'maxReplicas': autoscale.max,
+            'metrics': [_hpa_metric(autoscale)],
+            'behavior': {
+                'scaleDown': {'stabilizationWindowSeconds': autoscale.stable_window}
+            },
+        },
+    }
+
+
+def get_k8s_pdb(
+    selector: Dict, deployment: str = 'gateway', namespace: str = K8S_NAMESPACE
+) -> Dict:
+    """PodDisruptionBudget letting voluntary disruptions (e.g. node drains) take down
+    one replica at a time"""
+    return {
+        'apiVersion': 'policy/v1',
+        'kind': 'PodDisruptionBudget',
+        'metadata': {'name': deployment, 'namespace': namespace},
+        'spec': {'maxUnavailable': 1, 'selector': selector},
+    }
+
+
+def get_k8s_resources(instance: str) -> Optional[Dict]:
+    """Requests & limits matching a jcloud CPU tier, `None` for unknown tiers"""
+    from fastapi_serve.cloud.config import INSTANCE_TIERS
+
+    tier = INSTANCE_TIERS.get(instance)
+    if tier is None:
+        return None
+
+    resources = {
+        'cpu': f'{round(tier.cpu * 1000)}m',
+        'memory': f'{round(tier.memory * 1024)}Mi',
+    }
+    return {'requests': resources, 'limits': dict(resources)}
+
+
+def get_k8s_probes(port: int, startup_timeout: int) -> Dict:
+    """Probes on the gateway's `/healthz`. The startup probe gives the app
+    `startup_timeout` seconds to load (e.g. models) before liveness checks begin"""
+
+    def _probe(period: int, failures: int) -> Dict:
+        return {
+            'httpGet': {'path': HEALTH_PATH, 'port': port},
+            'periodSeconds': period,
+            'timeoutSeconds': 5,
+            'failureThreshold': failures,
+        }
+
+    return {
+        'startupProbe': _probe(5, max(math.ceil(startup_timeout / 5), 1)),
+        'readinessProbe': _probe(5, 3),
+        'livenessProbe': _probe(10, 3),
+    }
+
+
+def patch_k8s_gateway(path: str, config: 'JCloudConfig', port: int = 8080):
+    """Apply the jcloud config to the gateway exported by `Flow.to_kubernetes_yaml`:
+    resources of the instance tier, probes, a grace period covering the drain, an HPA
+    & a PDB next to the deployment"""
+    gateway_yaml = os.path.join(path, 'gateway', 'gateway.yml')
+    with open(gateway_yaml) as fp:
+        documents = [d for d in yaml.safe_load_all(fp) if d]
+
+    deployment = next(d for d in documents if d.get('kind') == 'Deployment')
+    name = deployment['metadata']['name']
+    namespace = deployment['metadata'].get('namespace', K8S_NAMESPACE)
+    deployment['spec']['replicas'] = max(config.autoscale.min, 1)
+
+    container = deployment['spec']['template']['spec']['containers'][0]
+    resources = get_k8s_resources(config.instance)
+    if resources is not None:
+        container['resources'] = resources
+    container.update(get_k8s_probes(port=port, startup_timeout=config.timeout))
+    # SIGTERM drains in-flight requests, the pod must not be killed before that. It
+    # includes `drain_delay`, which must cover the readiness probe's period (5 s)
+    deployment['spec']['template']['spec'][
+        'terminationGracePeriodSeconds'
+    ] = config.server.termination_grace_period
+
+    with open(gateway_yaml, 'w') as fp:
+        yaml.safe_dump_all(documents, fp, sort_keys=False)
+
+    with open(os.path.join(path, 'gateway', 'hpa.yml'), 'w') as fp:
+        yaml.safe_dump(
+            get_k8s_hpa(config.autoscale, deployment=name, namespace=namespace),
+            fp,
+            sort_keys=False,
+        )
+
+    with open(os.path.join(path, 'gateway', 'pdb.yml'), 'w') as fp:
+        yaml.safe_dump(
+            get_k8s_pdb(
+                deployment['spec']['selector'], deployment=name, namespace=namespace
+            ),
+            fp,
+            sort_keys=False,
+        )
+
+
+NGINX_IMAGE = 'nginx:1.27-alpine'  # `resolve` in upstreams needs nginx >= 1.27.3
+NGINX_CONF_TEMPLATE = """worker_processes auto;
+
+events {{
+    worker_connections 4096;
+}}
+
+http {{
+    # docker's embedded DNS, re-resolved so that restarted replicas are picked up
+    resolver 127.0.0.11 valid=10s ipv6=off;
+
+    upstream gateway {{
+        zone gateway 64k;
+        least_conn;
+        server {service}:{port} resolve;
+        keepalive 64;
+        keepalive_requests 10000;
+        keepalive_timeout 60s;
+    }}
+
+    map $http_upgrade $connection_upgrade {{
+        default upgrade;
+        '' '';
+    }}
+
+    gzip on;
+    gzip_proxied any;
+    gzip_vary on;
+    gzip_min_length 1024;
+    gzip_types application/json text/plain text/css application/javascript;
+
+    proxy_cache_path /var/cache/nginx/static levels=1:2 keys_zone=static:10m max_size=1g inactive=60m use_temp_path=off;
+
+    server {{
+        listen 80;
+        client_max_body_size 0;
+{locations}
+    }}
+}}
+"""
+NGINX_LOCATION_TEMPLATE = """
+        location {path} {{
+            proxy_pass http://gateway;
+            proxy_http_version 1.1;
+            proxy_set_header Upgrade $http_upgrade;
+            proxy_set_header Connection $connection_upgrade;
+            proxy_set_header Host $host;
+            proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+            proxy_set_header X-Forwarded-Proto $scheme;
+            # whole requests & responses are buffered, so that slow clients don't
+            # tie up replicas. Streaming responses opt out with `X-Accel-Buffering: no`
+            proxy_request_buffering on;
+            proxy_buffering on;
+            client_body_buffer_size 1m;
+            proxy_buffers 16 64k;
+            proxy_read_timeout {timeout}s;
+            proxy_send_timeout {timeout}s;{extra}
+        }}
+"""
+NGINX_STATIC_CACHE = """
+            proxy_cache static;
+            proxy_cache_valid 200 301 302 10m;
+            proxy_cache_use_stale error timeout updating;
+            proxy_cache_lock on;
+            add_header X-Cache-Status $upstream_cache_status;"""
+
+
+def get_nginx_conf(
+    service: str = 'gateway',
+    port: int = 8080,
+    timeout: int = 120,
+    static_paths: Iterable[str] = (),
+) -> str:
+    """nginx config balancing over all the replicas of a compose `service`. Responses
+    under `static_paths` are cached, so that replicas serve static files once"""
+    locations = [
+        NGINX_LOCATION_TEMPLATE.format(
+            path=f'/{p.strip("/")}/', timeout=timeout, extra=NGINX_STATIC_CACHE
+        )
+        for p in static_paths
+    ]
+    locations.append(
+        NGINX_LOCATION_TEMPLATE.format(path='/', timeout=timeout, extra='')
+    )
+    return NGINX_CONF_TEMPLATE.format(
+        service=service, port=port, locations=''.join(locations).rstrip('\n')
+    )
+
+
+def patch_compose_replicas(
+    compose_path: str,
+    replicas: int,
+    timeout: int = 120,
+    static_paths: Iterable[str] = (),
+    port: int = 8080,
+):
+    """Run `replicas` copies of the gateway exported by `Flow.to_docker_compose_yaml`,
+    behind an nginx service published on the gateway's port"""
+    with open(compose_path) as fp:
+        compose = yaml.safe_load(fp)
+
+    gateway = compose['services']['gateway']
+    # replicas can't share a published port or a container name
+    ports = gateway.pop('ports', None) or [f'{port}:{port}']
+    gateway.pop('container_name', None)
+    gateway.setdefault('expose', [port])
+    gateway['deploy'] = {**gateway.get('deploy', {}), 'replicas': replicas}
+
+    nginx_conf = os.path.join(os.path.dirname(compose_path), 'nginx.conf')
+    with open(nginx_conf, 'w') as fp:
+        fp.write(get_nginx_conf(port=port, timeout=timeout, static_paths=static_paths))
+
+    nginx = {
+        'image': NGINX_IMAGE,
+        'ports': [f'{p.split(":")[0]}:80' for p in map(str, ports)],
+        'volumes': ['./nginx.conf:/etc/nginx/nginx.conf:ro'],
+        'depends_on': {
+            'gateway': {
+                'condition': (
+                    'service_healthy' if 'healthcheck' in gateway else 'service_started'
+                )
+            }
+        },
+        'restart': 'unless-stopped',
+    }
+    if 'networks' in gateway:
+        nginx['networks'] = gateway['networks']
+    compose['services']['nginx'] = nginx
+
+    with open(compose_path, 'w') as fp:
+        yaml.safe_dump(compose, fp, sort_keys=False)
+
+
 async def export_app(
     app: str,
     kind: ExportKind,
@@ -18,30 +322,46 @@ async def export_app(
     platform: str = None,
     cors: bool = True,
     env: str = None,
+    config: str = None,
     verbose: bool = False,
     public: bool = True,
+    replicas: int = 1,
+    static_paths: Iterable[str] = (),
+    with_observability: bool = False,
 ) -> str:
     from jina import Flow
 
     from fastapi_serve.cloud.build import get_app_dir, push_app_to_hubble
+    from fastapi_serve.cloud.config import get_jcloud_config, resolve_jcloud_config
     from fastapi_serve.cloud.deploy import get_flow_dict
+    from fastapi_serve.cloud.observability import (
+        COLLECTOR_HOST,
+        add_compose_observability,
+        add_k8s_observability,
+    )
     from fastapi_serve.helper import get_random_tag
 
     app_dir, is_websocket = get_app_dir(app=app, app_dir=app_dir)
+    config = resolve_jcloud_config(config=config, app_dir=app_dir)
 
     if uses is not None:
         # If `uses` is provided, use it as gateway id
         gateway_id = uses
     else:
         # If `uses` is not provided, push the app to hubble and get the gateway id
-        gateway_id = push_app_to_hubble(
-            app=app,
-            app_dir=app_dir,
-            tag=get_random_tag(),
-            version=version,
-            platform=platform,
-            verbose=verbose,
-            public=True,  # TODO: add support for private images during export
+        # Pushing is blocking, run it off the event loop
+        gateway_id = await asyncio.get_running_loop().run_in_executor(
+            None,
+            partial(
+                push_app_to_hubble,
+                app=app,
+                app_dir=app_dir,
+                tag=get_random_tag(),
+                version=version,
+                platform=platform,
+                verbose=verbose,
+                public=True,  # TODO: add support for private images during export
+            ),
         )
 
     # Get the flow dict
@@ -52,21 +372,36 @@ async def export_app(
         app_id=None,
         gateway_id=gateway_id,
         is_websocket=is_websocket,
-        jcloud_config_path=None,
+        jcloud_config_path=config,
         cors=cors,
         env=env,
+        telemetry_host=f'http://{COLLECTOR_HOST}' if with_observability else None,
     )
 
     # Load the Flow & export it
     f: Flow = Flow.load_config(flow_dict)
 
     if kind == ExportKind.KUBERNETES:
-        f.to_kubernetes_yaml(path)
+        f.to_kubernetes_yaml(path, k8s_namespace=K8S_NAMESPACE)
+        patch_k8s_gateway(path, get_jcloud_config(config_path=config), port=8080)
+        if with_observability:
+            add_k8s_observability(path, namespace=K8S_NAMESPACE)
     elif kind == ExportKind.DOCKER_COMPOSE:
         _path = Path(path)
         if _path.is_file() and _path.suffix in ['.yml', '.yaml']:
-            f.to_docker_compose_yaml(path)
+            compose_path = path
         elif _path.is_dir():
-            f.to_docker_compose_yaml(os.path.join(path, 'docker-compose.yml'))
+            compose_path = os.path.join(path, 'docker-compose.yml')
         else:
             raise ValueError('path must be a file or a directory')
+
+        f.to_docker_compose_yaml(compose_path)
+        if replicas > 1:
+            patch_compose_replicas(
+                compose_path,
+                replicas=replicas,
+                timeout=get_jcloud_config(config_path=config).timeout,
+                static_paths=static_paths,
+            )
+        if with_observability:
+            add_compose_observability(compose_path)
@@ -1,13 +1,27 @@
+import asyncio
+import hashlib
+import json
 import os
-import sys
-import uuid
-from typing import TYPE_CHECKING, Tuple
+import time
+from contextlib import contextmanager
+from typing import (
+    TYPE_CHECKING,
+    Awaitable,
+    Callable,
+    Dict,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
 if TYPE_CHECKING:
     from types import ModuleType
 
     from fastapi import FastAPI
 
+T = TypeVar('T')
+
 
 def load_fastapi_app(app: str) -> Tuple['FastAPI', 'ModuleType']:
     from fastapi_serve.gateway.helper import ImportFromStringError, import_from_string
@@ -33,3 +47,108 @@ def get_parent_dir(modname: str, filename: str) -> str:
     for _ in range(len(parts) - 1):
         parent_dir = os.path.dirname(parent_dir)
     return parent_dir
+
+
+class PhaseTimer:
+    """Records start/end of (possibly concurrent) phases, e.g. of a deployment"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases: Dict[str, Tuple[float, float]] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (start - self.start, time.perf_counter() - self.start)
+
+    async def run(self, name: str, aw: Awaitable[T]) -> T:
+        with self.phase(name):
+            return await aw
+
+    def print(self):
+        from rich import box
+        from rich.console import Console
+        from rich.table import Table
+
+        _t = Table('Phase', 'Start (s)', 'Duration (s)', box=box.ROUNDED)
+        for name, (start, end) in sorted(self.phases.items(), key=lambda p: p[1]):
+            _t.add_row(name, f'{start:.2f}', f'{end - start:.2f}')
+        _t.add_row('[bold]Total', '', f'[bold]{time.perf_counter() - self.start:.2f}')
+        Console().print(_t)
+
+
+# Phases in which an app isn't expected to change on its own
+STABLE_PHASES = {'Serving', 'Failed', 'Paused', 'Deleted'}
+
+
+def row_digest(row: Sequence) -> str:
+    """ETag-like fingerprint of a rendered row, to tell whether it changed"""
+    return hashlib.sha1(json.dumps(row, default=str).encode()).hexdigest()
+
+
+def next_poll_interval(
+    current: float, changed: bool, stable: bool, interval: float, max_interval: float
+) -> float:
+    """Poll fast while things change, back off exponentially once they settle.
+    Apps in transition (e.g. `Starting`) are never polled slower than 4x `interval`"""
+    if changed:
+        return interval
+    return min(
+        current * 1.5, max_interval if stable else min(interval * 4, max_interval)
+    )
+
+
+async def watch_rows(
+    columns: Sequence[str],
+    fetch: Callable[[], Awaitable[Dict[str, Sequence]]],
+    phase_column: int,
+    interval: float = 2,
+    max_interval: float = 30,
+):
+    """Poll `fetch` (returning rows by key) until interrupted, redrawing the table
+    only when a row changed. Rows that changed in the last poll are highlighted"""
+    from rich import box
+    from rich.live import Live
+    from rich.table import Table
+
+    digests: Dict[str, str] = {}
+    updated: Dict[str, str] = {}
+
+    def _render(rows: Dict[str, Sequence], changed: Set[str]) -> Table:
+        _t = Table(*columns, 'Updated', box=box.ROUNDED, highlight=True)
+        for key, row in rows.items():
+            _t.add_row(
+                *(str(c) for c in row),
+                updated.get(key, ''),
+                style='bold' if key in changed else None,
+            )
+        return _t
+
+    delay, first = interval, True
+    with Live(auto_refresh=False) as live:
+        while True:
+            rows = await fetch()
+            changed = {
+                k for k, row in rows.items() if digests.get(k) != row_digest(row)
+            }
+            removed = set(digests) - set(rows)
+            now = time.strftime('%H:%M:%S')
+            for key in changed:
+                digests[key] = row_digest(rows[key])
+                updated[key] = now
+            for key in removed:
+                digests.pop(key)
+                updated.pop(key, None)
+
+            if changed or removed or first:
+                live.update(_render(rows, set() if first else changed), refresh=True)
+                first = False
+
+            stable = all(row[phase_column] in STABLE_PHASES for row in rows.values())
+            delay = next_poll_interval(
+                delay, bool(changed or removed), stable, interval, max_interval
+            )
+            await asyncio.sleep(delay)
@@ -0,0 +1,466 @@
+"""Self-hosted telemetry for exported apps, the way Jina AI Cloud monitors deployments.
+
+The gateway pushes its `fastapi_serve_*` metrics over OTLP to an OpenTelemetry
+collector, which exposes them to Prometheus. Grafana comes with a pre-built dashboard
+(latency percentiles, throughput, in-flight requests & error rates per route).
+"""
+
+import json
+import os
+from typing import Dict, List
+
+import yaml
+
+COLLECTOR_IMAGE = 'otel/opentelemetry-collector-contrib:0.104.0'
+PROMETHEUS_IMAGE = 'prom/prometheus:v2.53.0'
+GRAFANA_IMAGE = 'grafana/grafana:11.1.0'
+
+COLLECTOR_HOST = 'otel-collector'  # service name, in compose & kubernetes
+COLLECTOR_OTLP_PORT = 4317
+COLLECTOR_PROMETHEUS_PORT = 8889
+PROMETHEUS_PORT = 9090
+GRAFANA_PORT = 3000
+
+# OpenTelemetry -> Prometheus names, see `gateway.helper.setup_metrics_middleware`
+_LATENCY = 'fastapi_serve_request_latency_milliseconds'
+_REQUESTS = 'fastapi_serve_request_count_total'
+_INFLIGHT = 'fastapi_serve_inflight_requests'
+
+
+def get_collector_config(kubernetes: bool = False) -> Dict:
+    processors, pipeline = {'batch': {}}, ['batch']
+    if kubernetes:
+        # labels series with the pod they come from, which is what the custom
+        # metrics API (& HPA) expects
+        processors['k8sattributes'] = {
+            'extract': {
+                'metadata': [
+                    'k8s.namespace.name',
+                    'k8s.pod.name',
+                    'k8s.deployment.name',
+                ]
+            },
+            'pod_association': [{'sources': [{'from': 'connection'}]}],
+        }
+        pipeline.insert(0, 'k8sattributes')
+
+    return {
+        'receivers': {
+            'otlp': {
+                'protocols': {
+                    'grpc': {'endpoint': f'0.0.0.0:{COLLECTOR_OTLP_PORT}'},
+                }
+            }
+        },
+        'processors': processors,
+        'exporters': {
+            'prometheus': {
+                'endpoint': f'0.0.0.0:{COLLECTOR_PROMETHEUS_PORT}',
+                'resource_to_telemetry_conversion': {'enabled': True},
+            }
+        },
+        'service': {
+            'pipelines': {
+                'metrics': {
+                    'receivers': ['otlp'],
+                    'processors': pipeline,
+                    'exporters': ['prometheus'],
+                }
+            }
+        },
+    }
+
+
+def get_prometheus_config(kubernetes: bool = False) -> Dict:
+    job = {
+        'job_name': 'fastapi-serve',
+        'static_configs': [
+            {'targets': [f'{COLLECTOR_HOST}:{COLLECTOR_PROMETHEUS_PORT}']}
+        ],
+    }
+    if kubernetes:
+        # the `pod` & `namespace` labels that prometheus-adapter maps to resources
+        job['metric_relabel_configs'] = [
+            {
+                'source_labels': [f'k8s_{name}_name'],
+                'target_label': name,
+            }
+            for name in ('pod', 'namespace')
+        ]
+
+    return {
+        'global': {'scrape_interval': '15s', 'evaluation_interval': '15s'},
+        'scrape_configs': [job],
+    }
+
+
+def get_grafana_datasource() -> Dict:
+    return {
+        'apiVersion': 1,
+        'datasources': [
+            {
+                'name': 'Prometheus',
+                'uid': 'prometheus',
+                'type': 'prometheus',
+                'access': 'proxy',
+                'url': f'http://prometheus:{PROMETHEUS_PORT}',
+                'isDefault': True,
+            }
+        ],
+    }
+
+
+def get_grafana_dashboard_provider() -> Dict:
+    return {
+        'apiVersion': 1,
+        'providers': [
+            {
+                'name': 'fastapi-serve',
+                'type': 'file',
+                'options': {'path': '/var/lib/grafana/dashboards'},
+            }
+        ],
+    }
+
+
+def _panel(title: str, unit: str, targets: Dict[str, str], x: int, y: int) -> Dict:
+    return {
+        'title': title,
+        'type': 'timeseries',
+        'datasource': {'type': 'prometheus', 'uid': 'prometheus'},
+        'gridPos': {'x': x, 'y': y, 'w': 12, 'h': 8},
+        'fieldConfig': {'defaults': {'unit': unit}, 'overrides': []},
+        'targets': [
+            {'refId': chr(ord('A') + i), 'expr': expr, 'legendFormat': legend}
+            for i, (legend, expr) in enumerate(targets.items())
+        ],
+    }
+
+
+def get_grafana_dashboard() -> Dict:
+    quantiles = {
+        f'p{q}': f'histogram_quantile({q / 100}, sum by (le) (rate({_LATENCY}_bucket[5m])))'
+        for q in (50, 90, 99)
+    }
+    panels = [
+        _panel('Latency', 'ms', quantiles, 0, 0),
+        _panel(
+            'Requests per second',
+            'reqps',
+            {'{{route}}': f'sum by (route) (rate({_REQUESTS}[1m]))'},
+            12,
+            0,
+        ),
+        _panel(
+            'p99 latency per route',
+            'ms',
+            {
+                '{{route}}': f'histogram_quantile(0.99, sum by (le, route) (rate({_LATENCY}_bucket[5m])))'
+            },
+            0,
+            8,
+        ),
+        _panel(
+            'Error rate per route (5xx)',
+            'percentunit',
+            {
+                '{{route}}': (
+                    f'sum by (route) (rate({_LATENCY}_count{{status_code=~"5.."}}[5m]))'
+                    f' / sum by (route) (rate({_LATENCY}_count[5m]))'
+                )
+            },
+            12,
+            8,
+        ),
+        _panel(
+            'In-flight requests per route',
+            'short',
+            {'{{route}}': f'sum by (route) ({_INFLIGHT})'},
+            0,
+            16,
+        ),
+        _panel(
+            'In-flight requests per replica',
+            'short',
+            {'{{replica}}': f'sum by (replica) ({_INFLIGHT})'},
+            12,
+            16,
+        ),
+    ]
+    for i, panel in enumerate(panels):
+        panel['id'] = i + 1
+
+    return {
+        'uid': 'fastapi-serve',
+        'title': 'fastapi-serve',
+        'schemaVersion': 39,
+        'refresh': '10s',
+        'time': {'from': 'now-1h', 'to': 'now'},
+        'panels': panels,
+    }
+
+
+def _grafana_env() -> Dict[str, str]:
+    return {
+        'GF_AUTH_ANONYMOUS_ENABLED': 'true',
+        'GF_AUTH_ANONYMOUS_ORG_ROLE': 'Viewer',
+    }
+
+
+def _dump(data: Dict, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as fp:
+        if path.endswith('.json'):
+            json.dump(data, fp, indent=2)
+        else:
+            yaml.safe_dump(data, fp, sort_keys=False)
+
+
+def add_compose_observability(compose_path: str):
+    """Add the collector, Prometheus & Grafana services to a docker-compose file, with
+    their configs under `observability/` next to it"""
+    base = os.path.join(os.path.dirname(compose_path), 'observability')
+    _dump(get_collector_config(), os.path.join(base, 'otel-collector.yml'))
+    _dump(get_prometheus_config(), os.path.join(base, 'prometheus.yml'))
+    _dump(
+        get_grafana_datasource(),
+        os.path.join(base, 'grafana', 'datasources', 'prometheus.yml'),
+    )
+    _dump(
+        get_grafana_dashboard_provider(),
+        os.path.join(base, 'grafana', 'dashboards', 'fastapi-serve.yml'),
+    )
+    _dump(
+        get_grafana_dashboard(),
+        os.path.join(base, 'dashboards', 'fastapi-serve.json'),
+    )
+
+    with open(compose_path) as fp:
+        compose = yaml.safe_load(fp)
+
+    services = compose['services']
+    networks = services['gateway'].get('networks')
+    depends_on = services['gateway'].get('depends_on') or {}
+    if isinstance(depends_on, list):
+        depends_on = {s: {'condition': 'service_started'} for s in depends_on}
+    depends_on[COLLECTOR_HOST] = {'condition': 'service_started'}
+    services['gateway']['depends_on'] = depends_on
+    services[COLLECTOR_HOST] = {
+        'image': COLLECTOR_IMAGE,
+        'command': ['--config=/etc/otelcol-contrib/config.yaml'],
+        'volumes': [
+            './observability/otel-collector.yml:/etc/otelcol-contrib/config.yaml:ro'
+        ],
+        'expose': [COLLECTOR_OTLP_PORT, COLLECTOR_PROMETHEUS_PORT],
+    }
+    services['prometheus'] = {
+        'image': PROMETHEUS_IMAGE,
+        'volumes': ['./observability/prometheus.yml:/etc/prometheus/prometheus.yml:ro'],
+        'ports': [f'{PROMETHEUS_PORT}:{PROMETHEUS_PORT}'],
+    }
+    services['grafana'] = {
+        'image': GRAFANA_IMAGE,
+        'environment': _grafana_env(),
+        'volumes': [
+            './observability/grafana:/etc/grafana/provisioning:ro',
+            './observability/dashboards:/var/lib/grafana/dashboards:ro',
+        ],
+        'ports': [f'{GRAFANA_PORT}:{GRAFANA_PORT}'],
+        'depends_on': ['prometheus'],
+    }
+    for name in (COLLECTOR_HOST, 'prometheus', 'grafana'):
+        services[name]['restart'] = 'unless-stopped'
+        if networks:
+            services[name]['networks'] = networks
+
+    with open(compose_path, 'w') as fp:
+        yaml.safe_dump(compose, fp, sort_keys=False)
+
+
+def _k8s_config_map(name: str, namespace: str, files: Dict[str, str]) -> Dict:
+    return {
+        'apiVersion': 'v1',
+        'kind': 'ConfigMap',
+        'metadata': {'name': name, 'namespace': namespace},
+        'data': files,
+    }
+
+
+def _k8s_app(
+    name: str,
+    namespace: str,
+    image: str,
+    ports: List[int],
+    mounts: Dict[str, str],
+    args: List[str] = None,
+    env: Dict[str, str] = None,
+    service_account: str = None,
+) -> List[Dict]:
+    """Deployment & Service of a single replica `image`, with `mounts` mapping
+    ConfigMap names to mount paths"""
+    labels = {'app': name}
+    container = {
+        'name': name,
+        'image': image,
+        'ports': [{'containerPort': p} for p in ports],
+        'volumeMounts': [
+            {'name': config_map, 'mountPath': path, 'readOnly': True}
+            for config_map, path in mounts.items()
+        ],
+    }
+    if args:
+        container['args'] = args
+    if env:
+        container['env'] = [{'name': k, 'value': v} for k, v in env.items()]
+
+    pod_spec = {
+        'containers': [container],
+        'volumes': [
+            {'name': config_map, 'configMap': {'name': config_map}}
+            for config_map in mounts
+        ],
+    }
+    if service_account:
+        pod_spec['serviceAccountName'] = service_account
+
+    return [
+        {
+            'apiVersion': 'apps/v1',
+            'kind': 'Deployment',
+            'metadata': {'name': name, 'namespace': namespace},
+            'spec': {
+                'replicas': 1,
+                'selector': {'matchLabels': labels},
+                'template': {'metadata': {'labels': labels}, 'spec': pod_spec},
+            },
+        },
+        {
+            'apiVersion': 'v1',
+            'kind': 'Service',
+            'metadata': {'name': name, 'namespace': namespace},
+            'spec': {
+                'selector': labels,
+                'ports': [{'name': f'port-{p}', 'port': p} for p in ports],
+            },
+        },
+    ]
+
+
+def _k8s_collector_rbac(namespace: str) -> List[Dict]:
+    """Lets `k8sattributes` look up the pods sending metrics"""
+    return [
+        {
+            'apiVersion': 'v1',
+            'kind': 'ServiceAccount',
+            'metadata': {'name': COLLECTOR_HOST, 'namespace': namespace},
+        },
+        {
+            'apiVersion': 'rbac.authorization.k8s.io/v1',
+            'kind': 'ClusterRole',
+            'metadata': {'name': COLLECTOR_HOST},
+            'rules': [
+                {
+                    'apiGroups': [''],
+                    'resources': ['pods', 'namespaces'],
+                    'verbs': ['get', 'watch', 'list'],
+                },
+                {
+                    'apiGroups': ['apps'],
+                    'resources': ['replicasets'],
+                    'verbs': ['get', 'watch', 'list'],
+                },
+            ],
+        },
+        {
+            'apiVersion': 'rbac.authorization.k8s.io/v1',
+            'kind': 'ClusterRoleBinding',
+            'metadata': {'name': COLLECTOR_HOST},
+            'roleRef': {
+                'apiGroup': 'rbac.authorization.k8s.io',
+                'kind': 'ClusterRole',
+                'name': COLLECTOR_HOST,
+            },
+            'subjects': [
+                {
+                    'kind': 'ServiceAccount',
+                    'name': COLLECTOR_HOST,
+                    'namespace': namespace,
+                }
+            ],
+        },
+    ]
+
+
+def add_k8s_observability(path: str, namespace: str):
+    """Write the collector, Prometheus & Grafana manifests under `path/observability`"""
+    base = os.path.join(path, 'observability')
+    os.makedirs(base, exist_ok=True)
+
+    collector = [
+        *_k8s_collector_rbac(namespace),
+        _k8s_config_map(
+            f'{COLLECTOR_HOST}-config',
+            namespace,
+            {'config.yaml': yaml.safe_dump(get_collector_config(kubernetes=True))},
+        ),
+        *_k8s_app(
+            COLLECTOR_HOST,
+            namespace,
+            COLLECTOR_IMAGE,
+            ports=[COLLECTOR_OTLP_PORT, COLLECTOR_PROMETHEUS_PORT],
+            mounts={f'{COLLECTOR_HOST}-config': '/etc/otelcol-contrib'},
+            args=['--config=/etc/otelcol-contrib/config.yaml'],
+            service_account=COLLECTOR_HOST,
+        ),
+    ]
+    prometheus = [
+        _k8s_config_map(
+            'prometheus-config',
+            namespace,
+            {'prometheus.yml': yaml.safe_dump(get_prometheus_config(kubernetes=True))},
+        ),
+        *_k8s_app(
+            'prometheus',
+            namespace,
+            PROMETHEUS_IMAGE,
+            ports=[PROMETHEUS_PORT],
+            mounts={'prometheus-config': '/etc/prometheus'},
+        ),
+    ]
+    grafana = [
+        _k8s_config_map(
+            'grafana-datasources',
+            namespace,
+            {'prometheus.yml': yaml.safe_dump(get_grafana_datasource())},
+        ),
+        _k8s_config_map(
+            'grafana-dashboard-providers',
+            namespace,
+            {'fastapi-serve.yml': yaml.safe_dump(get_grafana_dashboard_provider())},
+        ),
+        _k8s_config_map(
+            'grafana-dashboards',
+            namespace,
+            {'fastapi-serve.json': json.dumps(get_grafana_dashboard(), indent=2)},
+        ),
+        *_k8s_app(
+            'grafana',
+            namespace,
+            GRAFANA_IMAGE,
+            ports=[GRAFANA_PORT],
+            mounts={
+                'grafana-datasources': '/etc/grafana/provisioning/datasources',
+                'grafana-dashboard-providers': '/etc/grafana/provisioning/dashboards',
+                'grafana-dashboards': '/var/lib/grafana/dashboards',
+            },
+            env=_grafana_env(),
+        ),
+    ]
+
+    for name, documents in (
+        (COLLECTOR_HOST, collector),
+        ('prometheus', prometheus),
+        ('grafana', grafana),
+    ):
+        with open(os.path.join(base, f'{name}.yml'), 'w') as fp:
+            yaml.safe_dump_all(documents, fp, sort_keys=False)
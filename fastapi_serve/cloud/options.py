@@ -1,8 +1,14 @@
 import click
-from jcloud.constants import Phase
 
-from fastapi_serve.cloud.config import APP_NAME, validate_jcloud_config_callback
+from fastapi_serve.cloud.config import (
+    APP_NAME,
+    SERVER_PRESETS,
+    VALID_SERVER_HTTP,
+    VALID_SERVER_LOOPS,
+    validate_jcloud_config_callback,
+)
 from fastapi_serve.cloud.export import ExportKind
+from fastapi_serve.cloud.simulate import TRACE_PATTERNS
 
 _help_option = [click.help_option('-h', '--help')]
 
@@ -26,6 +32,103 @@ _local_deploy_options = [
         help='Path to the environment file (should be a .env file)',
         show_default=False,
     ),
+    click.option(
+        '--workers',
+        type=click.IntRange(min=1),
+        default=1,
+        help='Number of worker processes sharing the port. Each loads the app itself, so memory grows linearly with it.',
+        show_default=True,
+    ),
+    click.option(
+        '--replicas',
+        type=click.IntRange(min=1),
+        default=1,
+        help='Number of replicas, each a separate server, behind a least-connections load balancer on `--port`.',
+        show_default=True,
+    ),
+    click.option(
+        '--direct',
+        is_flag=True,
+        default=False,
+        help='Serve the app on uvicorn directly instead of the jina gateway, for faster startup and lower overhead.',
+        show_default=True,
+    ),
+]
+
+_server_options = [
+    click.option(
+        '--server-preset',
+        type=click.Choice(list(SERVER_PRESETS)),
+        default=None,
+        help='Named server performance profile. Explicit server options override it.',
+    ),
+    click.option(
+        '--loop',
+        type=click.Choice(VALID_SERVER_LOOPS),
+        default=None,
+        help='Event loop implementation.',
+    ),
+    click.option(
+        '--http',
+        type=click.Choice(VALID_SERVER_HTTP),
+        default=None,
+        help='HTTP protocol implementation.',
+    ),
+    click.option(
+        '--backlog',
+        type=click.IntRange(min=1),
+        default=None,
+        help='Maximum number of pending connections.',
+    ),
+    click.option(
+        '--timeout-keep-alive',
+        type=click.IntRange(min=1),
+        default=None,
+        help='Close keep-alive connections after this many seconds without data.',
+    ),
+    click.option(
+        '--limit-concurrency',
+        type=click.IntRange(min=1),
+        default=None,
+        help='Maximum number of concurrent connections before responding with 503.',
+    ),
+    click.option(
+        '--h11-max-incomplete-event-size',
+        type=click.IntRange(min=1),
+        default=None,
+        help='Maximum buffer size (in bytes) for the h11 HTTP parser.',
+    ),
+    click.option(
+        '--thread-pool-size',
+        type=click.IntRange(min=1),
+        default=None,
+        help='Size of the thread pool used for sync `def` endpoints.',
+    ),
+    click.option(
+        '--drain-timeout',
+        type=click.FloatRange(min=1),
+        default=None,
+        help='Seconds in-flight requests get to finish on shutdown (default: 30).',
+    ),
+    click.option(
+        '--drain-delay',
+        type=click.FloatRange(min=0),
+        default=None,
+        help='Seconds to keep serving after /healthz starts failing on shutdown, '
+        'for load balancers to stop routing here (default: 5).',
+    ),
+    click.option(
+        '--adaptive-concurrency/--no-adaptive-concurrency',
+        default=None,
+        help='Reject requests with 503 past a concurrency limit learned from latency, '
+        'rather than queuing them.',
+    ),
+    click.option(
+        '--max-concurrency',
+        type=click.IntRange(min=1),
+        default=None,
+        help='Upper bound of the learned concurrency limit, per worker (default: 1000).',
+    ),
 ]
 
 _common_options = [
@@ -103,6 +206,29 @@ _export_only_options = [
         help='Export to Kubernetes or Docker Compose.',
         show_default=True,
     ),
+    click.option(
+        '--replicas',
+        type=click.IntRange(min=1),
+        default=1,
+        help='Docker Compose only. Number of replicas of the app, behind an nginx load balancer.',
+        show_default=True,
+    ),
+    click.option(
+        '--static-path',
+        'static_paths',
+        type=str,
+        multiple=True,
+        default=['/static'],
+        help='Docker Compose with replicas only. Path prefix of static files, cached by nginx.',
+        show_default=True,
+    ),
+    click.option(
+        '--with-observability',
+        is_flag=True,
+        default=False,
+        help='Also export an OpenTelemetry collector, Prometheus & Grafana with a dashboard of the app metrics.',
+        show_default=True,
+    ),
 ]
 
 _export_and_jcloud_common_options = [
@@ -126,6 +252,13 @@ _export_and_jcloud_common_options = [
         default=True,
         show_default=True,
     ),
+    click.option(
+        '--config',
+        type=click.Path(exists=True),
+        help='Path to the config file',
+        callback=validate_jcloud_config_callback,
+        show_default=False,
+    ),
 ]
 
 _jcloud_only_options = [
@@ -142,13 +275,6 @@ _jcloud_only_options = [
         default=None,
         help='AppID of the deployed app to be updated.',
     ),
-    click.option(
-        '--config',
-        type=click.Path(exists=True),
-        help='Path to the config file',
-        callback=validate_jcloud_config_callback,
-        show_default=False,
-    ),
     click.option(
         '--secret',
         '--secrets',
@@ -156,21 +282,49 @@ _jcloud_only_options = [
         help='Path to the secrets file (should be a .env file)',
         show_default=False,
     ),
+    click.option(
+        '--timings',
+        is_flag=True,
+        default=False,
+        help='Print a per-phase timing breakdown of the deployment.',
+        show_default=True,
+    ),
+]
+
+_batch_deploy_options = [
+    click.argument(
+        'manifest',
+        type=click.Path(exists=True, dir_okay=False),
+        required=True,
+    ),
+    click.option(
+        '--parallel',
+        type=click.IntRange(min=1),
+        default=None,
+        help='Maximum number of apps built & deployed at the same time. Defaults to `parallel` in the manifest, or 4.',
+    ),
+    click.option(
+        '--timings',
+        is_flag=True,
+        default=False,
+        help='Print a per-phase timing breakdown of each deployment.',
+        show_default=True,
+    ),
+    click.option(
+        '-v',
+        '--verbose',
+        is_flag=True,
+        help='Verbose mode.',
+        show_default=True,
+    ),
 ]
 
 _jcloud_list_options = [
     click.option(
         '--phase',
         type=str,
-        default=','.join(
-            [
-                Phase.Serving,
-                Phase.Failed,
-                Phase.Starting,
-                Phase.Updating,
-                Phase.Paused,
-            ]
-        ),
+        # values of `jcloud.constants.Phase`, not imported to keep the CLI startup fast
+        default=','.join(['Serving', 'Failed', 'Starting', 'Updating', 'Paused']),
         help='Deployment phase for the app.',
         show_default=True,
     ),
@@ -183,18 +337,424 @@ _jcloud_list_options = [
     ),
 ]
 
+_watch_options = [
+    click.option(
+        '--watch',
+        is_flag=True,
+        default=False,
+        help='Keep polling and redraw the table whenever an app changes.',
+        show_default=True,
+    ),
+    click.option(
+        '--interval',
+        type=click.FloatRange(min=0.5),
+        default=2,
+        help='Polling interval (in seconds) while apps are changing.',
+        show_default=True,
+    ),
+    click.option(
+        '--max-interval',
+        type=click.FloatRange(min=0.5),
+        default=30,
+        help='Polling interval (in seconds) is backed off up to this value once apps are stable.',
+        show_default=True,
+    ),
+]
+
+_jcloud_status_options = [
+    click.argument('app-ids', nargs=-1, required=True),
+]
+
+_simulate_options = [
+    click.option(
+        '--config',
+        'configs',
+        type=click.Path(exists=True),
+        multiple=True,
+        callback=lambda ctx, param, value: [
+            validate_jcloud_config_callback(ctx, param, v) for v in value
+        ],
+        help='Path to a jcloud config file. Repeat to compare configs, defaults are used if not set.',
+    ),
+    click.option(
+        '--capacity',
+        type=click.FloatRange(min=0, min_open=True),
+        required=True,
+        help='Requests per second a single replica serves at saturation, as measured (e.g. with `deploy local`).',
+    ),
+    click.option(
+        '--trace',
+        type=click.Path(exists=True, dir_okay=False),
+        default=None,
+        help='CSV trace with `time` (seconds), `rps` and optionally `latency_ms` columns. Overrides --pattern.',
+    ),
+    click.option(
+        '--pattern',
+        type=click.Choice(TRACE_PATTERNS),
+        default='diurnal',
+        help='Shape of the synthetic trace, from --base-rps to --rps.',
+        show_default=True,
+    ),
+    click.option(
+        '--rps',
+        type=click.FloatRange(min=0),
+        default=100,
+        help='Peak requests per second of the synthetic trace.',
+        show_default=True,
+    ),
+    click.option(
+        '--base-rps',
+        type=click.FloatRange(min=0),
+        default=0,
+        help='Lowest requests per second of the synthetic trace.',
+        show_default=True,
+    ),
+    click.option(
+        '--duration',
+        type=click.FloatRange(min=1),
+        default=3600,
+        help='Duration (in seconds) of the synthetic trace.',
+        show_default=True,
+    ),
+    click.option(
+        '--service-time-ms',
+        type=click.FloatRange(min=0),
+        default=50,
+        help='Latency of a request without any queueing, unless the trace has `latency_ms`.',
+        show_default=True,
+    ),
+    click.option(
+        '--cold-start',
+        type=click.FloatRange(min=0),
+        default=30,
+        help='Seconds before a new replica serves traffic.',
+        show_default=True,
+    ),
+    click.option(
+        '--output',
+        type=click.Path(dir_okay=False, writable=True),
+        default=None,
+        help='Write the simulated timeline (replicas, queue, latency per second) to a CSV file.',
+    ),
+]
+
+_bench_options = [
+    click.argument('url', type=str, required=True),
+    click.option(
+        '-c',
+        '--concurrency',
+        type=click.IntRange(min=1),
+        default=10,
+        help='Closed-loop: number of clients sending requests back-to-back. Open-loop: number of WebSocket connections.',
+        show_default=True,
+    ),
+    click.option(
+        '-r',
+        '--rate',
+        type=click.FloatRange(min=0, min_open=True),
+        default=None,
+        help='Open-loop: requests per second, sent no matter how many are in flight. Closed-loop if not set.',
+    ),
+    click.option(
+        '-d',
+        '--duration',
+        type=click.FloatRange(min=0, min_open=True),
+        default=10,
+        help='Duration (in seconds) of the measurement.',
+        show_default=True,
+    ),
+    click.option(
+        '--warmup',
+        type=click.FloatRange(min=0),
+        default=0,
+        help='Seconds of load before the measurement starts.',
+        show_default=True,
+    ),
+    click.option(
+        '-X',
+        '--method',
+        type=str,
+        default='GET',
+        help='HTTP method.',
+        show_default=True,
+    ),
+    click.option(
+        '-H',
+        '--header',
+        'headers',
+        type=str,
+        multiple=True,
+        help='Request header, e.g. `Authorization: Bearer <token>`. Repeatable.',
+    ),
+    click.option(
+        '--data',
+        type=str,
+        default=None,
+        help='Request body, or WebSocket message. Use `@path` to read it from a file.',
+    ),
+    click.option(
+        '--timeout',
+        type=click.FloatRange(min=0, min_open=True),
+        default=30,
+        help='Timeout (in seconds) of a single request.',
+        show_default=True,
+    ),
+    click.option(
+        '--max-inflight',
+        type=click.IntRange(min=1),
+        default=1000,
+        help='Open-loop: maximum number of open HTTP connections.',
+        show_default=True,
+    ),
+    click.option(
+        '--output',
+        type=click.Path(dir_okay=False, writable=True),
+        default=None,
+        help='Write the results, including the latency histograms, to a JSON file.',
+    ),
+    click.option(
+        '--baseline',
+        type=click.Path(exists=True, dir_okay=False),
+        default=None,
+        help='JSON results of a previous run (see --output) to compare against.',
+    ),
+]
+
+_recommend_options = [
+    click.argument('app', type=str, required=True),
+    click.option(
+        '--path',
+        type=str,
+        default='/',
+        help='Endpoint to load, e.g. the most common or most expensive one.',
+        show_default=True,
+    ),
+    click.option(
+        '--slo-ms',
+        type=click.FloatRange(min=0, min_open=True),
+        default=200,
+        help='Latency objective, in milliseconds, at --percentile.',
+        show_default=True,
+    ),
+    click.option(
+        '--percentile',
+        type=click.FloatRange(min=0, max=100, min_open=True),
+        default=99,
+        help='Latency percentile the SLO applies to.',
+        show_default=True,
+    ),
+    click.option(
+        '--metric',
+        type=click.Choice(['rps', 'concurrency']),
+        default='rps',
+        help='Autoscale metric to compute the target for.',
+        show_default=True,
+    ),
+    click.option(
+        '--utilization',
+        type=click.FloatRange(min=0, max=1, min_open=True),
+        default=0.7,
+        help='Share of a replica\'s capacity to autoscale at, the rest is headroom for spikes.',
+        show_default=True,
+    ),
+    click.option(
+        '--peak-rps',
+        type=click.FloatRange(min=0, min_open=True),
+        default=None,
+        help='Expected peak requests per second, to set `autoscale.max`.',
+    ),
+    click.option(
+        '--max-concurrency',
+        type=click.IntRange(min=1),
+        default=256,
+        help='Stop the load test at this concurrency.',
+        show_default=True,
+    ),
+    click.option(
+        '--step-duration',
+        type=click.FloatRange(min=0, min_open=True),
+        default=5,
+        help='Duration (in seconds) of the load test at each concurrency.',
+        show_default=True,
+    ),
+    click.option(
+        '-X',
+        '--method',
+        type=str,
+        default='GET',
+        help='HTTP method.',
+        show_default=True,
+    ),
+    click.option(
+        '-H',
+        '--header',
+        'headers',
+        type=str,
+        multiple=True,
+        help='Request header, e.g. `Authorization: Bearer <token>`. Repeatable.',
+    ),
+    click.option('--data', type=str, default=None, help='Request body.'),
+    click.option(
+        '--env',
+        '--envs',
+        type=click.Path(exists=True),
+        help='Path to the environment file (should be a .env file)',
+        show_default=False,
+    ),
+    click.option(
+        '--direct',
+        is_flag=True,
+        default=False,
+        help='Serve the app on uvicorn directly instead of the jina gateway.',
+        show_default=True,
+    ),
+    click.option(
+        '--output',
+        type=click.Path(dir_okay=False, writable=True),
+        default='jcloud.yml',
+        help='jcloud config to write. An existing file is updated, other settings are kept.',
+        show_default=True,
+    ),
+]
+
+_verify_upgrade_options = [
+    click.argument('app', type=str, required=False),
+    click.option(
+        '--url',
+        type=str,
+        default=None,
+        help='Probe a deployed app (e.g. on JCloud) instead of local replicas of APP.',
+    ),
+    click.option(
+        '--to',
+        type=str,
+        default=None,
+        help='App to upgrade the local replicas to, e.g. `main_v2:app`. Defaults to APP, reloaded with the code on disk.',
+    ),
+    click.option(
+        '--command',
+        type=str,
+        default=None,
+        help='Command that upgrades the app at --url, e.g. `fastapi-serve deploy jcloud main:app --app-id <app-id>`. Without it, upgrade by hand while probing.',
+    ),
+    click.option(
+        '--path',
+        type=str,
+        default='/healthz',
+        help='Endpoint to probe.',
+        show_default=True,
+    ),
+    click.option(
+        '--version-field',
+        type=str,
+        default='version',
+        help='Field of the JSON response with the app version, dots for nested fields.',
+        show_default=True,
+    ),
+    click.option(
+        '-s',
+        '--streams',
+        type=click.IntRange(min=1),
+        default=8,
+        help='Number of concurrent probe streams, each on a keep-alive connection.',
+        show_default=True,
+    ),
+    click.option(
+        '--interval',
+        type=click.FloatRange(min=0),
+        default=0.05,
+        help='Minimum time (in seconds) between the probes of a stream.',
+        show_default=True,
+    ),
+    click.option(
+        '--timeout',
+        type=click.FloatRange(min=0, min_open=True),
+        default=5,
+        help='Timeout (in seconds) of a probe.',
+        show_default=True,
+    ),
+    click.option(
+        '--slow-ms',
+        type=click.FloatRange(min=0),
+        default=1000,
+        help='Probes slower than this are reported.',
+        show_default=True,
+    ),
+    click.option(
+        '--warmup',
+        type=click.FloatRange(min=0),
+        default=5,
+        help='Duration (in seconds) of probing before the upgrade.',
+        show_default=True,
+    ),
+    click.option(
+        '--settle',
+        type=click.FloatRange(min=0),
+        default=5,
+        help='Duration (in seconds) of probing after the upgrade.',
+        show_default=True,
+    ),
+    click.option(
+        '-d',
+        '--duration',
+        type=click.FloatRange(min=0, min_open=True),
+        default=None,
+        help='Stop probing after this many seconds, when upgrading by hand. By default, once only the new version is served for --settle seconds.',
+    ),
+    click.option(
+        '--replicas',
+        type=click.IntRange(min=1),
+        default=2,
+        help='Number of local replicas, upgraded one at a time.',
+        show_default=True,
+    ),
+    click.option(
+        '--workers',
+        type=click.IntRange(min=1),
+        default=1,
+        help='Number of worker processes per local replica.',
+        show_default=True,
+    ),
+    click.option(
+        '--direct',
+        is_flag=True,
+        default=False,
+        help='Serve the local replicas on uvicorn directly instead of the jina gateway.',
+        show_default=True,
+    ),
+    click.option(
+        '--env',
+        '--envs',
+        type=click.Path(exists=True),
+        help='Path to the environment file (should be a .env file)',
+        show_default=False,
+    ),
+    click.option(
+        '--output',
+        type=click.Path(dir_okay=False, writable=True),
+        default=None,
+        help='Write every probe failure, slow request & version transition to a JSON file.',
+    ),
+]
+
 
 __all__ = [
     'local_deploy_options',
     'hubble_push_options',
     'jcloud_deploy_options',
+    'batch_deploy_options',
     'jcloud_list_options',
+    'jcloud_status_options',
     'export_options',
+    'simulate_options',
+    'bench_options',
+    'recommend_options',
+    'verify_upgrade_options',
 ]
 
 
 def local_deploy_options(func):
-    for option in reversed(_local_deploy_options + _help_option):
+    for option in reversed(_local_deploy_options + _server_options + _help_option):
         func = option(func)
     return func
 
@@ -219,6 +779,12 @@ def jcloud_deploy_options(func):
     return func
 
 
+def batch_deploy_options(func):
+    for option in reversed(_batch_deploy_options + _help_option):
+        func = option(func)
+    return func
+
+
 def export_options(func):
     for option in reversed(
         _common_options
@@ -232,6 +798,36 @@ def export_options(func):
 
 
 def jcloud_list_options(func):
-    for option in reversed(_jcloud_list_options + _help_option):
+    for option in reversed(_jcloud_list_options + _watch_options + _help_option):
+        func = option(func)
+    return func
+
+
+def jcloud_status_options(func):
+    for option in reversed(_jcloud_status_options + _watch_options + _help_option):
+        func = option(func)
+    return func
+
+
+def simulate_options(func):
+    for option in reversed(_simulate_options + _help_option):
+        func = option(func)
+    return func
+
+
+def bench_options(func):
+    for option in reversed(_bench_options + _help_option):
+        func = option(func)
+    return func
+
+
+def recommend_options(func):
+    for option in reversed(_recommend_options + _help_option):
+        func = option(func)
+    return func
+
+
+def verify_upgrade_options(func):
+    for option in reversed(_verify_upgrade_options + _help_option):
         func = option(func)
     return func
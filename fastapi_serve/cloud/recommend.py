@@ -0,0 +1,379 @@
+"""Sizing of a jcloud deployment from a local load test.
+
+The app is served locally, pinned to a single CPU core with a single worker, and
+loaded closed-loop at doubling concurrency until the latency percentile breaks the SLO
+or the throughput stops growing. The last step within the SLO is the knee, i.e. what a
+replica with one vCPU sustains.
+
+Each instance tier is then extrapolated from the knee: throughput scales with the
+vCPUs (a worker per vCPU), latency at low load grows on fractional vCPUs as the app is
+throttled, and the peak RSS is paid by every worker. This holds for CPU-bound apps and
+is conservative for I/O-bound ones.
+"""
+
+import asyncio
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import yaml
+
+from fastapi_serve.cloud.config import (
+    INSTANCE_TIERS,
+    Defaults,
+    InstanceTier,
+    JCloudConfig,
+)
+
+MEMORY_HEADROOM = 0.8  # share of the instance memory the app may use
+MAX_ERROR_RATE = 0.01  # a step with more errors breaks the SLO
+SATURATION_GAIN = 1.05  # doubling concurrency must add 5% throughput
+
+
+@dataclass
+class SweepStep:
+    concurrency: int
+    throughput: float
+    latency_ms: float  # at the SLO percentile, corrected
+    p50_ms: float
+    error_rate: float
+
+    def within(self, slo_ms: float) -> bool:
+        return self.latency_ms <= slo_ms and self.error_rate <= MAX_ERROR_RATE
+
+
+@dataclass
+class TierEstimate:
+    instance: str
+    tier: InstanceTier
+    workers: int
+    throughput: float  # requests per second at the knee
+    concurrency: float  # requests in flight at the knee
+    latency_ms: float  # at low load
+    memory_gb: float
+    meets_slo: bool
+    fits_memory: bool
+
+    @property
+    def eligible(self) -> bool:
+        return self.meets_slo and self.fits_memory and self.throughput > 0
+
+    def credits_per_million(self, utilization: float) -> float:
+        served_per_hour = self.throughput * utilization * 3600
+        return self.tier.credits_per_hour / served_per_hour * 1e6
+
+
+def estimate_tiers(
+    steps: List[SweepStep], knee: SweepStep, rss_gb: float, slo_ms: float
+) -> List[TierEstimate]:
+    estimates = []
+    for instance, tier in INSTANCE_TIERS.items():
+        workers = max(int(tier.cpu), 1)
+        share = min(tier.cpu, workers)
+        latency_ms = steps[0].p50_ms / min(tier.cpu, 1)
+        memory_gb = rss_gb * workers
+        estimates.append(
+            TierEstimate(
+                instance=instance,
+                tier=tier,
+                workers=workers,
+                throughput=knee.throughput * share,
+                concurrency=knee.concurrency * share,
+                latency_ms=latency_ms,
+                memory_gb=memory_gb,
+                meets_slo=latency_ms <= slo_ms,
+                fits_memory=memory_gb <= tier.memory * MEMORY_HEADROOM,
+            )
+        )
+    return estimates
+
+
+def find_knee(steps: List[SweepStep], slo_ms: float) -> Optional[SweepStep]:
+    within = [s for s in steps if s.within(slo_ms)]
+    return max(within, key=lambda s: s.throughput) if within else None
+
+
+def cheapest_tier(
+    estimates: List[TierEstimate], utilization: float
+) -> Optional[TierEstimate]:
+    """Lowest cost per request, ties (e.g. 10 credits per vCPU from C1 up) go to the
+    smallest tier, which scales in finer steps and costs less at `min` replicas"""
+    eligible = [e for e in estimates if e.eligible]
+    if not eligible:
+        return None
+    return min(
+        eligible,
+        key=lambda e: (
+            round(e.credits_per_million(utilization), 6),
+            e.tier.credits_per_hour,
+        ),
+    )
+
+
+def get_recommended_config(
+    estimate: TierEstimate,
+    metric: str,
+    utilization: float,
+    peak_rps: Optional[float] = None,
+    base: Dict = None,
+) -> Dict:
+    """`base` (e.g. an existing jcloud.yml) updated with the instance, workers and
+    autoscaling of `estimate`"""
+    rps_target = max(math.floor(estimate.throughput * utilization), 1)
+    if metric == 'concurrency':
+        target = max(math.floor(estimate.concurrency * utilization), 1)
+    else:
+        target = rps_target
+
+    config = dict(base or {})
+    autoscale = dict(config.get('autoscale') or {})
+    autoscale.update(metric=metric, target=target)
+    if peak_rps:
+        autoscale['max'] = max(math.ceil(peak_rps / rps_target), 1)
+    autoscale.setdefault('max', Defaults.autoscale_max)
+    autoscale['min'] = min(
+        autoscale.get('min', Defaults.autoscale_min), autoscale['max']
+    )
+    config.update(instance=estimate.instance, workers=estimate.workers)
+    config['autoscale'] = autoscale
+
+    # fail here rather than at deployment
+    JCloudConfig.from_dict(config)
+    return config
+
+
+def _serve_pinned(cpu: Optional[int], **kwargs):
+    from fastapi_serve.cloud.deploy import serve_locally
+
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    serve_locally(**kwargs)
+
+
+def _peak_children_rss_gb() -> float:
+    import resource
+    import sys
+
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024**3 if sys.platform == 'darwin' else 1024**2)
+
+
+async def _wait_until_healthy(url: str, timeout: float):
+    import aiohttp
+
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f'{url}/healthz') as r:
+                    if r.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f'App not healthy after {timeout} seconds')
+
+
+async def sweep(
+    url: str,
+    slo_ms: float,
+    percentile: float = 99,
+    max_concurrency: int = 256,
+    step_duration: float = 5,
+    method: str = 'GET',
+    headers: Dict[str, str] = None,
+    body: bytes = None,
+    on_step=None,
+) -> List[SweepStep]:
+    from fastapi_serve.bench import run_bench
+
+    steps: List[SweepStep] = []
+    concurrency = 1
+    while concurrency <= max_concurrency:
+        result = await run_bench(
+            url,
+            concurrency=concurrency,
+            duration=step_duration,
+            warmup=min(step_duration / 5, 1),
+            method=method,
+            headers=headers,
+            body=body,
+            timeout=max(slo_ms / 1000 * 10, 5),
+        )
+        step = SweepStep(
+            concurrency=concurrency,
+            throughput=result.throughput,
+            latency_ms=result.corrected.percentile(percentile) * 1000,
+            p50_ms=result.latency.percentile(50) * 1000,
+            error_rate=sum(result.errors.values()) / max(result.requests, 1),
+        )
+        steps.append(step)
+        if on_step is not None:
+            on_step(step)
+
+        if not step.within(slo_ms):
+            break
+        best = max(s.throughput for s in steps[:-1]) if len(steps) > 1 else 0
+        if len(steps) > 1 and step.throughput < best * SATURATION_GAIN:
+            break
+        concurrency *= 2
+    return steps
+
+
+def _print_report(
+    steps: List[SweepStep],
+    knee: Optional[SweepStep],
+    estimates: List[TierEstimate],
+    chosen: Optional[TierEstimate],
+    rss_gb: float,
+    slo_ms: float,
+    percentile: float,
+    utilization: float,
+):
+    from rich import box
+    from rich.console import Console
+    from rich.table import Table
+
+    console = Console()
+    _t = Table(
+        'Concurrency',
+        'Throughput',
+        'p50',
+        f'p{percentile:g}',
+        'Errors',
+        box=box.ROUNDED,
+        title=f'Load on 1 vCPU (SLO: p{percentile:g} <= {slo_ms:g} ms)',
+    )
+    for s in steps:
+        style = 'bold green' if s is knee else ('red' if not s.within(slo_ms) else None)
+        _t.add_row(
+            str(s.concurrency),
+            f'{s.throughput:.1f} req/s',
+            f'{s.p50_ms:.1f} ms',
+            f'{s.latency_ms:.1f} ms',
+            f'{s.error_rate:.1%}',
+            style=style,
+        )
+    console.print(_t)
+    console.print(f'Peak memory of a worker: {rss_gb * 1024:.0f} MiB')
+
+    if knee is None:
+        return
+
+    _t = Table(
+        'Instance',
+        'Workers',
+        'Throughput',
+        'Latency (low load)',
+        'Memory',
+        'Credits / 1M requests',
+        box=box.ROUNDED,
+        title=f'Per replica, at {utilization:.0%} utilization',
+    )
+    for e in estimates:
+        style = (
+            'bold green' if e is chosen else (None if e.eligible else 'bright_black')
+        )
+        _t.add_row(
+            e.instance,
+            str(e.workers),
+            f'{e.throughput:.1f} req/s',
+            f'{e.latency_ms:.1f} ms' + ('' if e.meets_slo else ' (> SLO)'),
+            f'{e.memory_gb:.2f} / {e.tier.memory:g} GB'
+            + ('' if e.fits_memory else ' (too much)'),
+            f'{e.credits_per_million(utilization):.1f}' if e.throughput else 'n/a',
+            style=style,
+        )
+    console.print(_t)
+
+
+def recommend(
+    app: str,
+    path: str = '/',
+    slo_ms: float = 200,
+    percentile: float = 99,
+    metric: str = 'rps',
+    utilization: float = 0.7,
+    peak_rps: Optional[float] = None,
+    max_concurrency: int = 256,
+    step_duration: float = 5,
+    method: str = 'GET',
+    headers: List[str] = (),
+    data: str = None,
+    env: str = None,
+    direct: bool = False,
+    output: str = 'jcloud.yml',
+    startup_timeout: float = 120,
+) -> Optional[Dict]:
+    import multiprocessing
+    import signal
+
+    from fastapi_serve.helper import get_free_port
+
+    _headers = {}
+    for header in headers:
+        key, _, value = header.partition(':')
+        _headers[key.strip()] = value.strip()
+    body = data.encode() if data is not None else None
+
+    # pinned to a core the load generator doesn't compete for, if there is one
+    cpu, affinity = None, None
+    if hasattr(os, 'sched_getaffinity') and len(os.sched_getaffinity(0)) > 1:
+        affinity = os.sched_getaffinity(0)
+        cpu = max(affinity)
+        os.sched_setaffinity(0, affinity - {cpu})
+
+    port = get_free_port()
+    url = f'http://127.0.0.1:{port}'
+    process = multiprocessing.get_context('spawn').Process(
+        target=_serve_pinned,
+        kwargs=dict(cpu=cpu, app=app, port=port, env=env, workers=1, direct=direct),
+    )
+    process.start()
+    try:
+        asyncio.run(_wait_until_healthy(url, startup_timeout))
+        steps = asyncio.run(
+            sweep(
+                url + '/' + path.lstrip('/'),
+                slo_ms=slo_ms,
+                percentile=percentile,
+                max_concurrency=max_concurrency,
+                step_duration=step_duration,
+                method=method,
+                headers=_headers,
+                body=body,
+            )
+        )
+    finally:
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGINT)
+        process.join(timeout=30)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+        if affinity is not None:
+            os.sched_setaffinity(0, affinity)
+
+    rss_gb = _peak_children_rss_gb()
+    knee = find_knee(steps, slo_ms)
+    estimates = estimate_tiers(steps, knee, rss_gb, slo_ms) if knee else []
+    chosen = cheapest_tier(estimates, utilization)
+    _print_report(
+        steps, knee, estimates, chosen, rss_gb, slo_ms, percentile, utilization
+    )
+    if chosen is None:
+        return None
+
+    base = {}
+    if os.path.exists(output):
+        with open(output) as f:
+            base = yaml.safe_load(f) or {}
+    config = get_recommended_config(
+        chosen, metric=metric, utilization=utilization, peak_rps=peak_rps, base=base
+    )
+    with open(output, 'w') as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+    return config
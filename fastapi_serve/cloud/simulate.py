@@ -0,0 +1,385 @@
+"""Offline simulation of Jina AI Cloud autoscaling for a `jcloud.yml`.
+
+The autoscaler is modelled after Knative's KPA, which backs JCloud autoscaling: the
+metric is averaged over `stable_window` (and a panic window of a tenth of it), the
+desired replica count is re-evaluated every 2 seconds, new replicas only serve after
+a cold start and requests queue (FIFO) for at most `revision_timeout`.
+
+Latency is approximated as service time + queueing inside the replicas (M/M/c
+approximation) + time spent in the backlog while all replicas are saturated.
+"""
+
+import bisect
+import csv
+import math
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Tuple
+
+from fastapi_serve.cloud.config import (
+    EFS_CREDITS_PER_GB_HOUR,
+    EUR_PER_CREDIT,
+    INSTANCE_TIERS,
+    JCloudConfig,
+)
+
+EVALUATION_INTERVAL = 2  # seconds between two autoscaler decisions
+PANIC_THRESHOLD = 2.0  # scale up right away once the panic window wants 2x replicas
+TRACE_PATTERNS = ['constant', 'step', 'ramp', 'spike', 'diurnal']
+
+
+@dataclass
+class TracePoint:
+    time: float  # seconds since the start of the trace
+    rps: float
+    latency_ms: Optional[float] = None  # service time, if recorded
+
+
+def load_trace(path: str) -> List[TracePoint]:
+    """Load a CSV trace with a `time` (seconds) & `rps` column, and optionally a
+    `latency_ms` column. Each value holds until the next point, the last point marks
+    the end of the trace"""
+    points = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            latency = row.get('latency_ms')
+            points.append(
+                TracePoint(
+                    time=float(row['time']),
+                    rps=float(row['rps']),
+                    latency_ms=float(latency) if latency not in (None, '') else None,
+                )
+            )
+    if not points:
+        raise ValueError(f'No points found in trace {path}')
+    return sorted(points, key=lambda p: p.time)
+
+
+def synthetic_trace(
+    pattern: str, rps: float, base_rps: float, duration: float, step: float = 10
+) -> List[TracePoint]:
+    """A synthetic trace going from `base_rps` to the peak `rps`"""
+    if pattern not in TRACE_PATTERNS:
+        raise ValueError(
+            f'Invalid pattern {pattern}. Valid options are {TRACE_PATTERNS}'
+        )
+
+    def _rps(t: float) -> float:
+        x = t / duration
+        if pattern == 'constant':
+            return rps
+        if pattern == 'step':
+            return rps if x >= 1 / 3 else base_rps
+        if pattern == 'ramp':
+            return base_rps + (rps - base_rps) * x
+        if pattern == 'spike':
+            return rps if 0.45 <= x < 0.5 else base_rps
+        # diurnal, a single day compressed into `duration`
+        return base_rps + (rps - base_rps) * (1 - math.cos(2 * math.pi * x)) / 2
+
+    return [TracePoint(time=t, rps=_rps(t)) for t in _frange(0, duration, step)] + [
+        TracePoint(time=duration, rps=0)
+    ]
+
+
+def _frange(start: float, stop: float, step: float):
+    n = int(math.ceil((stop - start) / step))
+    return (start + i * step for i in range(n))
+
+
+def mmc_wait(utilization: float, servers: float, service_time: float) -> float:
+    """Sakasegawa's approximation of the mean queueing delay of an M/M/c queue"""
+    if utilization <= 0:
+        return 0
+    utilization = min(utilization, 0.99)
+    servers = max(servers, 1)
+    return (
+        utilization ** (math.sqrt(2 * (servers + 1)) - 1)
+        / (servers * (1 - utilization))
+        * service_time
+    )
+
+
+def weighted_percentile(samples: List[Tuple[float, float]], q: float) -> float:
+    """`q`-th percentile of (value, weight) samples"""
+    samples = sorted(s for s in samples if s[1] > 0)
+    total = sum(w for _, w in samples)
+    if not total:
+        return 0
+    threshold, seen = total * q / 100, 0
+    for value, weight in samples:
+        seen += weight
+        if seen >= threshold:
+            return value
+    return samples[-1][0]
+
+
+@dataclass
+class SimulationResult:
+    name: str
+    config: JCloudConfig
+    duration: float  # seconds
+    requests: float = 0
+    served: float = 0
+    timed_out: float = 0
+    cold_starts: int = 0
+    peak_replicas: int = 0
+    replica_seconds: float = 0
+    serving_replica_seconds: float = 0
+    latencies: List[Tuple[float, float]] = field(default_factory=list)
+    timeline: List[Dict] = field(default_factory=list)
+
+    def latency_ms(self, q: float) -> float:
+        return weighted_percentile(self.latencies, q) * 1000
+
+    @property
+    def avg_replicas(self) -> float:
+        return self.replica_seconds / self.duration if self.duration else 0
+
+    @property
+    def credits(self) -> Optional[float]:
+        """Base credits (min replicas & disk) + serving credits, as documented in
+        docs/CONFIG.MD. `None` for instances without known pricing"""
+        tier = INSTANCE_TIERS.get(self.config.instance)
+        if tier is None:
+            return None
+        hours = self.duration / 3600
+        base = (
+            self.config.autoscale.min * tier.credits_per_hour
+            + self.config.disk_size_gb * EFS_CREDITS_PER_GB_HOUR
+        ) * hours
+        serving = tier.credits_per_hour * self.serving_replica_seconds / 3600
+        return base + serving
+
+    @property
+    def credits_per_hour(self) -> Optional[float]:
+        if self.credits is None or not self.duration:
+            return None
+        return self.credits / (self.duration / 3600)
+
+    def summary(self) -> Dict[str, str]:
+        def _fmt(value, unit=''):
+            return 'n/a' if value is None else f'{value:,.2f}{unit}'
+
+        return {
+            'Requests': f'{self.requests:,.0f}',
+            'Timed out': f'{self.timed_out:,.0f} ({self.timed_out / max(self.requests, 1):.2%})',
+            'Latency p50': _fmt(self.latency_ms(50), ' ms'),
+            'Latency p95': _fmt(self.latency_ms(95), ' ms'),
+            'Latency p99': _fmt(self.latency_ms(99), ' ms'),
+            'Cold starts': str(self.cold_starts),
+            'Replicas (avg / peak)': f'{self.avg_replicas:.2f} / {self.peak_replicas}',
+            'Credits': _fmt(self.credits),
+            'Credits per hour': _fmt(self.credits_per_hour),
+            'Cost (EUR)': _fmt(
+                self.credits * EUR_PER_CREDIT if self.credits is not None else None
+            ),
+        }
+
+
+class AutoscaleSimulator:
+    def __init__(
+        self,
+        config: JCloudConfig,
+        capacity: float,
+        service_time: float = 0.05,
+        cold_start: float = 30,
+        step: float = 1,
+        name: str = 'default',
+    ):
+        """
+        :param capacity: requests per second a single replica serves at saturation
+        :param service_time: seconds to serve a request without any queueing
+        :param cold_start: seconds between starting a replica and it serving traffic
+        :param step: simulation step, in seconds
+        """
+        if capacity <= 0:
+            raise ValueError(f'Invalid capacity {capacity}. Must be greater than 0')
+
+        self.config = config
+        self.autoscale = config.autoscale
+        self.capacity = capacity
+        self.service_time = service_time
+        self.cold_start = cold_start
+        self.step = step
+        self.name = name
+
+    def _replica_load(
+        self, arrival_rps: float, queued: float, ready: int, inflight: float
+    ) -> float:
+        """Number of replicas the autoscaler metric asks for, before averaging"""
+        metric, target = self.autoscale.metric, self.autoscale.target
+        if metric == 'rps':
+            return arrival_rps / target
+        if metric == 'concurrency':
+            # requests in flight, including the ones waiting for a replica
+            return inflight / target
+
+        # cpu & memory: the utilization of the ready replicas, which can't exceed 100%.
+        # Memory is assumed to grow with the load, like cpu
+        if ready == 0:
+            return 1 if queued > 0 else 0
+        utilization = min(queued / (ready * self.capacity * self.step), 1)
+        return ready * utilization * 100 / target
+
+    def run(self, trace: List[TracePoint]) -> SimulationResult:
+        autoscale = self.autoscale
+        duration = trace[-1].time
+        result = SimulationResult(name=self.name, config=self.config, duration=duration)
+        times = [p.time for p in trace]
+
+        ready = autoscale.min
+        pending: List[float] = []  # times at which starting replicas become ready
+        backlog: Deque[List[float]] = deque()  # [arrival time, requests]
+        stable: Deque[Tuple[float, float]] = deque()  # (time, desired replicas)
+        panic_window = max(autoscale.stable_window / 10, EVALUATION_INTERVAL)
+        last_latency, next_evaluation = self.service_time, 0.0
+
+        for t in _frange(0, duration, self.step):
+            point = trace[bisect.bisect_right(times, t) - 1]
+            service_time = (
+                point.latency_ms / 1000 if point.latency_ms else self.service_time
+            )
+
+            # replicas that finished their cold start
+            ready += sum(1 for r in pending if r <= t)
+            pending = [r for r in pending if r > t]
+
+            arrivals = point.rps * self.step
+            result.requests += arrivals
+            if arrivals:
+                backlog.append([t, arrivals])
+
+            # requests that waited longer than the revision timeout fail
+            while backlog and t - backlog[0][0] > autoscale.revision_timeout:
+                result.timed_out += backlog.popleft()[1]
+
+            queued = sum(n for _, n in backlog)
+            budget = ready * self.capacity * self.step
+            utilization = queued / budget if budget else 1
+            inner_wait = mmc_wait(
+                utilization, ready * self.capacity * service_time, service_time
+            )
+            served_now, waited = 0.0, 0.0
+            while backlog and budget > 0:
+                arrived, n = backlog[0]
+                take = min(n, budget)
+                budget -= take
+                served_now += take
+                waited += take * (t - arrived)
+                result.latencies.append((t - arrived + service_time + inner_wait, take))
+                if take == n:
+                    backlog.popleft()
+                else:
+                    backlog[0][1] -= take
+            result.served += served_now
+            if served_now:
+                last_latency = service_time + inner_wait + waited / served_now
+
+            # autoscaler
+            inflight = served_now / self.step * (service_time + inner_wait) + sum(
+                n for _, n in backlog
+            )
+            stable.append((t, self._replica_load(point.rps, queued, ready, inflight)))
+            while stable and t - stable[0][0] >= autoscale.stable_window:
+                stable.popleft()
+
+            if t >= next_evaluation:
+                next_evaluation = t + EVALUATION_INTERVAL
+                stable_desired = sum(d for _, d in stable) / len(stable)
+                panic = [d for (ts, d) in stable if t - ts < panic_window]
+                panic_desired = sum(panic) / len(panic)
+
+                current = ready + len(pending)
+                desired = math.ceil(stable_desired - 1e-9)
+                if panic_desired >= PANIC_THRESHOLD * max(ready, 1):
+                    # in panic mode, never scale down
+                    desired = max(math.ceil(panic_desired), current)
+                desired = max(autoscale.min, min(autoscale.max, desired))
+                if desired == 0 and (queued or point.rps):
+                    desired = 1  # a request is waiting, activate from zero
+
+                if desired > current:
+                    new = desired - current
+                    result.cold_starts += new
+                    pending.extend([t + self.cold_start] * new)
+                elif desired < current:
+                    extra = current - desired
+                    drop = min(extra, len(pending))
+                    pending = pending[: len(pending) - drop]
+                    ready -= extra - drop
+
+            replicas = ready + len(pending)
+            result.peak_replicas = max(result.peak_replicas, replicas)
+            result.replica_seconds += replicas * self.step
+            if arrivals or queued:
+                result.serving_replica_seconds += replicas * self.step
+            result.timeline.append(
+                {
+                    'config': self.name,
+                    'time': t,
+                    'rps': point.rps,
+                    'ready': ready,
+                    'starting': len(pending),
+                    'queued': round(sum(n for _, n in backlog), 3),
+                    'latency_ms': round(last_latency * 1000, 3),
+                }
+            )
+
+        result.timed_out += sum(n for _, n in backlog)
+        return result
+
+
+def print_results(results: List[SimulationResult]):
+    from rich import box
+    from rich.console import Console
+    from rich.table import Table
+
+    _t = Table('', *(r.name for r in results), box=box.ROUNDED, highlight=True)
+    summaries = [r.summary() for r in results]
+    for key in summaries[0]:
+        _t.add_row(key, *(s[key] for s in summaries))
+    Console().print(_t)
+
+
+def write_timeline(results: List[SimulationResult], path: str):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].timeline[0]))
+        writer.writeheader()
+        for r in results:
+            writer.writerows(r.timeline)
+
+
+def simulate(
+    configs: List[str],
+    capacity: float,
+    trace: str = None,
+    pattern: str = 'diurnal',
+    rps: float = 100,
+    base_rps: float = 0,
+    duration: float = 3600,
+    service_time_ms: float = 50,
+    cold_start: float = 30,
+    output: str = None,
+) -> List[SimulationResult]:
+    from fastapi_serve.cloud.config import get_jcloud_config
+
+    points = (
+        load_trace(trace)
+        if trace
+        else synthetic_trace(pattern, rps=rps, base_rps=base_rps, duration=duration)
+    )
+    results = [
+        AutoscaleSimulator(
+            config=get_jcloud_config(config_path=config),
+            capacity=capacity,
+            service_time=service_time_ms / 1000,
+            cold_start=cold_start,
+            name=config or 'default',
+        ).run(points)
+        for config in (configs or [None])
+    ]
+    print_results(results)
+    if output:
+        write_timeline(results, output)
+    return results
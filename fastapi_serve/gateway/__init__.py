@@ -1 +1,13 @@
-from .gateway import FastAPIServeGateway
+if __name__ != 'fastapi_serve.gateway':
+    # Loaded by jina through `py_modules` in config.yml, the class must be defined
+    # right away so that `jtype: FastAPIServeGateway` can be resolved
+    from .gateway import FastAPIServeGateway
+
+
+def __getattr__(name):
+    # Imported as a regular package, e.g. by direct mode, which doesn't need jina
+    if name == 'FastAPIServeGateway':
+        from .gateway import FastAPIServeGateway
+
+        return FastAPIServeGateway
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
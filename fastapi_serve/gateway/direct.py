@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+
+from fastapi_serve.gateway.helper import (
+    LoggingMiddleware,
+    configure_cors,
+    import_from_string,
+    register_healthz,
+    set_thread_pool_size,
+    setup_adaptive_concurrency_middleware,
+    setup_drain_middleware,
+    setup_metrics_middleware,
+)
+from fastapi_serve.gateway.workers import (
+    WorkerSupervisor,
+    new_event_loop,
+    worker_attributes,
+)
+from fastapi_serve.utils.batching import setup_batch_metrics
+from fastapi_serve.utils.bulkhead import configure_bulkheads, setup_bulkhead_metrics
+from fastapi_serve.utils.cache import configure_response_cache, setup_cache_metrics
+from fastapi_serve.utils.offload import setup_offload_metrics
+
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+
+
+def get_direct_logger() -> logging.Logger:
+    logger = logging.getLogger("fastapi-serve")
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        )
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def _otlp_metric_reader(host: str, port: int):
+    from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import (
+        OTLPMetricExporter,
+    )
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+
+    return PeriodicExportingMetricReader(
+        OTLPMetricExporter(endpoint=f"{host}:{port}", insecure=True)
+    )
+
+
+def get_meter_provider(
+    metrics_exporter_host: str,
+    metrics_exporter_port: int,
+    service_name: str = "fastapi_serve",
+):
+    """A meter provider exporting to the OTLP collector, as jina sets up for the
+    gateway. Used by workers, which don't run jina's runtime"""
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+
+    return MeterProvider(
+        metric_readers=[
+            _otlp_metric_reader(metrics_exporter_host, metrics_exporter_port)
+        ],
+        resource=Resource(
+            attributes={SERVICE_NAME: service_name, **worker_attributes()}
+        ),
+    )
+
+
+def _get_meter(fastapi_app: "FastAPI", telemetry: Optional[Dict] = None):
+    # Without `telemetry`, metrics are exported through the globally configured
+    # OpenTelemetry SDK (if any), e.g. when running under `opentelemetry-instrument`
+    try:
+        from opentelemetry.metrics import get_meter
+    except ModuleNotFoundError:
+        return None
+
+    if not telemetry:
+        return get_meter("fastapi_serve")
+
+    meter_provider = get_meter_provider(**telemetry)
+    try:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    except ModuleNotFoundError:
+        pass
+    else:
+        FastAPIInstrumentor.instrument_app(fastapi_app, meter_provider=meter_provider)
+    return meter_provider.get_meter("fastapi_serve")
+
+
+def build_direct_app(
+    app: str,
+    logger: Optional[logging.Logger] = None,
+    cors: bool = True,
+    health=None,
+    drain_timeout: Optional[float] = None,
+    drain_delay: Optional[float] = None,
+    adaptive_concurrency: bool = False,
+    max_concurrency: Optional[int] = None,
+    bulkheads: Optional[Dict] = None,
+    response_cache: Optional[Dict] = None,
+    telemetry: Optional[Dict] = None,
+) -> "FastAPI":
+    """Load the app and add the same middlewares & endpoints as `FastAPIServeGateway`.
+    The `Drainer` is kept on `app.state.fastapi_serve_drainer`. `telemetry` holds the
+    kwargs of `get_meter_provider`, to export metrics to an OTLP collector"""
+    logger = logger or get_direct_logger()
+    if os.getcwd() not in sys.path:
+        sys.path.append(os.getcwd())
+
+    logger.info(f"Loading app from {app}")
+    fastapi_app, _ = import_from_string(app)
+    if cors:
+        configure_cors(fastapi_app, logger)
+
+    drainer = setup_drain_middleware(
+        fastapi_app, timeout=drain_timeout, delay=drain_delay, logger=logger
+    )
+    fastapi_app.state.fastapi_serve_drainer = drainer
+    if adaptive_concurrency:
+        setup_adaptive_concurrency_middleware(
+            fastapi_app, max_concurrency=max_concurrency, logger=logger
+        )
+    configure_bulkheads(fastapi_app, bulkheads)
+    configure_response_cache(fastapi_app, response_cache)
+    register_healthz(fastapi_app, health=health, drainer=drainer)
+
+    meter = _get_meter(fastapi_app, telemetry)
+    if meter is not None:
+        setup_metrics_middleware(fastapi_app, meter)
+        setup_bulkhead_metrics(meter)
+        setup_cache_metrics(meter)
+        setup_offload_metrics(meter)
+        setup_batch_metrics(meter)
+
+    fastapi_app.add_middleware(LoggingMiddleware, logger=logger)
+    return fastapi_app
+
+
+def serve_direct(
+    app: str,
+    host: str = "0.0.0.0",
+    port: int = 8080,
+    cors: bool = True,
+    workers: int = 1,
+    thread_pool_size: Optional[int] = None,
+    drain_timeout: Optional[float] = None,
+    drain_delay: Optional[float] = None,
+    adaptive_concurrency: bool = False,
+    max_concurrency: Optional[int] = None,
+    bulkheads: Optional[Dict] = None,
+    response_cache: Optional[Dict] = None,
+    uvicorn_kwargs: Optional[Dict] = None,
+    user_id: Optional[str] = None,
+):
+    """Serve the app on uvicorn directly, skipping the jina gateway runtime. `user_id`
+    is the owner of the app, the only user `JinaAuthMiddleware` lets in"""
+    from uvicorn import Config
+
+    from fastapi_serve.gateway.drain import DrainingServer
+
+    if user_id is not None:
+        from fastapi_serve.utils.helper import FlowUserEnvVar
+
+        os.environ[FlowUserEnvVar] = user_id
+
+    logger = get_direct_logger()
+    app_kwargs = dict(
+        app=app,
+        cors=cors,
+        drain_timeout=drain_timeout,
+        drain_delay=drain_delay,
+        adaptive_concurrency=adaptive_concurrency,
+        max_concurrency=max_concurrency,
+        bulkheads=bulkheads,
+        response_cache=response_cache,
+    )
+    config_kwargs = dict(
+        host=host,
+        port=port,
+        log_level="info",
+        access_log=False,  # `LoggingMiddleware` logs requests
+        **(uvicorn_kwargs or {}),
+    )
+
+    if workers > 1:
+        # every worker loads the app itself
+        supervisor = WorkerSupervisor(
+            app_factory=build_direct_app,
+            app_kwargs=app_kwargs,
+            config_kwargs=config_kwargs,
+            workers=workers,
+            logger=logger,
+            thread_pool_size=thread_pool_size,
+        )
+        loop = new_event_loop(config_kwargs.get("loop", "auto"))
+        asyncio.set_event_loop(loop)
+
+        def _stop():
+            supervisor.should_exit = True
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, _stop)
+
+        supervisor.setup()
+        try:
+            loop.run_until_complete(supervisor.supervise())
+        finally:
+            loop.run_until_complete(supervisor.shutdown())
+            loop.close()
+        return
+
+    start = time.perf_counter()
+    fastapi_app = build_direct_app(**app_kwargs)
+    drainer = fastapi_app.state.fastapi_serve_drainer
+    config = Config(app=fastapi_app, **config_kwargs)
+    logger.info(f"App loaded in {time.perf_counter() - start:.3f} s")
+
+    loop = new_event_loop(config.loop)
+    asyncio.set_event_loop(loop)
+
+    async def _serve():
+        set_thread_pool_size(thread_pool_size)
+        await DrainingServer(config, drainer).serve()
+
+    try:
+        loop.run_until_complete(_serve())
+    except KeyboardInterrupt:
+        # uvicorn re-raises the signal it handled, once it has shut down gracefully
+        pass
+    finally:
+        loop.close()
@@ -0,0 +1,194 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Optional, Set
+
+from uvicorn import Server
+
+if TYPE_CHECKING:
+    import logging
+
+    from starlette.types import ASGIApp, Receive, Scope, Send
+    from uvicorn import Config
+
+
+DEFAULT_DRAIN_TIMEOUT = 30
+# a readiness probe period (5 s in `get_k8s_probes`), for the probe to see `/healthz`
+# fail before the listening socket closes
+DEFAULT_DRAIN_DELAY = 5
+# "Service Restart": the client should reconnect, to another replica
+DRAIN_CLOSE_CODE = 1012
+DRAIN_CLOSE_REASON = "Server draining, reconnect"
+# probes aren't requests to drain
+_UNCOUNTED_PATHS = ("/healthz", "/dry_run")
+
+
+class WebSocketDrained(OSError):
+    """Raised when the app sends on a WebSocket that was closed for draining, like the
+    server does on a disconnected client, so that the app sees a disconnect"""
+
+
+@dataclass
+class DrainReport:
+    finished: int  # requests that completed while draining
+    aborted: int  # requests & WebSockets still running at the deadline
+    websockets_closed: int
+    duration: float
+
+    def __str__(self) -> str:
+        return (
+            f"Drained in {self.duration:.2f} s: {self.finished} requests finished, "
+            f"{self.aborted} aborted, {self.websockets_closed} WebSockets closed"
+        )
+
+
+class Drainer:
+    """Tracks in-flight requests & WebSockets, and drains them on shutdown.
+
+    Once draining, `/healthz` fails so that load balancers stop sending new traffic,
+    responses ask clients to close their keep-alive connections, and WebSockets are
+    closed with a reconnect hint.
+    """
+
+    def __init__(
+        self,
+        timeout: float = DEFAULT_DRAIN_TIMEOUT,
+        delay: float = DEFAULT_DRAIN_DELAY,
+        logger: Optional["logging.Logger"] = None,
+    ):
+        self.timeout = timeout
+        self.delay = delay
+        self.logger = logger
+        self.draining = False
+        self.inflight = 0
+        self.finished = 0
+        self.websockets_closed = 0
+        self._websockets: Set[Callable] = set()
+        self._started: Optional[float] = None
+
+    def begin(self):
+        if self.draining:
+            return
+        self.draining = True
+        self._started = time.monotonic()
+        for close in list(self._websockets):
+            asyncio.ensure_future(close())
+
+    async def wait(self, timeout: Optional[float] = None) -> DrainReport:
+        """Wait up to `timeout` for in-flight requests & WebSockets to finish"""
+        self.begin()
+        timeout = self.timeout if timeout is None else timeout
+        deadline = self._started + timeout
+        while (self.inflight or self._websockets) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        report = DrainReport(
+            finished=self.finished,
+            aborted=self.inflight + len(self._websockets),
+            websockets_closed=self.websockets_closed,
+            duration=time.monotonic() - self._started,
+        )
+        if self.logger is not None:
+            log = self.logger.warning if report.aborted else self.logger.info
+            log(str(report))
+        return report
+
+    async def drain(self, servers=(), timeout: Optional[float] = None) -> DrainReport:
+        """Fail readiness, keep serving for `delay` seconds while load balancers catch
+        up, stop accepting connections on `servers` and wait for in-flight requests"""
+        self.begin()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        for server in servers:
+            server.close()
+        return await self.wait(timeout)
+
+
+class DrainMiddleware:
+    def __init__(self, app: "ASGIApp", drainer: Drainer):
+        self.app = app
+        self.drainer = drainer
+
+    async def __call__(self, scope: "Scope", receive: "Receive", send: "Send") -> None:
+        if scope["type"] == "http" and scope.get("path") not in _UNCOUNTED_PATHS:
+            await self._http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def _http(self, scope: "Scope", receive: "Receive", send: "Send") -> None:
+        drainer = self.drainer
+
+        async def _send(message: dict) -> None:
+            if message["type"] == "http.response.start" and drainer.draining:
+                # hand the client's keep-alive connection off to another replica
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"connection", b"close"),
+                ]
+            await send(message)
+
+        drainer.inflight += 1
+        try:
+            await self.app(scope, receive, _send)
+            if drainer.draining:
+                drainer.finished += 1
+        finally:
+            drainer.inflight -= 1
+
+    async def _websocket(self, scope: "Scope", receive: "Receive", send: "Send"):
+        drainer = self.drainer
+        closed = False
+
+        async def _close():
+            nonlocal closed
+            if closed:
+                return
+            closed = True
+            try:
+                await send(
+                    {
+                        "type": "websocket.close",
+                        "code": DRAIN_CLOSE_CODE,
+                        "reason": DRAIN_CLOSE_REASON,
+                    }
+                )
+                drainer.websockets_closed += 1
+            except OSError:
+                pass
+
+        async def _send(message: dict) -> None:
+            nonlocal closed
+            if closed:
+                if message["type"] == "websocket.close":
+                    return
+                raise WebSocketDrained("WebSocket closed, the server is draining")
+
+            await send(message)
+            if message["type"] == "websocket.accept":
+                drainer._websockets.add(_close)
+                if drainer.draining:
+                    await _close()
+            elif message["type"] == "websocket.close":
+                closed = True
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            drainer._websockets.discard(_close)
+
+
+class DrainingServer(Server):
+    """A uvicorn server that drains in-flight requests before shutting down"""
+
+    def __init__(self, config: "Config", drainer: Drainer):
+        super().__init__(config)
+        self.drainer = drainer
+
+    async def shutdown(self, sockets=None) -> None:
+        report = await self.drainer.drain(servers=self.servers)
+        if report.aborted:
+            # past the deadline, don't wait any longer for what's left
+            self.config.timeout_graceful_shutdown = 0.1
+        await super().shutdown(sockets=sockets)
@@ -2,30 +2,71 @@ import os
 import sys
 from functools import cached_property
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Dict, Optional
 
 from jina.serve.runtimes.gateway.http.fastapi import FastAPIBaseGateway
 
 from fastapi_serve.gateway.helper import (
     APPDIR,
     LoggingMiddleware,
-    MetricsMiddleware,
+    configure_cors,
     import_from_string,
+    register_healthz,
+    set_thread_pool_size,
+    setup_adaptive_concurrency_middleware,
+    setup_drain_middleware,
+    setup_metrics_middleware,
 )
+from fastapi_serve.gateway.workers import WorkerSupervisor
 from fastapi_serve.helper import EnvironmentVarCtxtManager
+from fastapi_serve.utils.batching import setup_batch_metrics
+from fastapi_serve.utils.bulkhead import configure_bulkheads, setup_bulkhead_metrics
+from fastapi_serve.utils.cache import configure_response_cache, setup_cache_metrics
+from fastapi_serve.utils.offload import setup_offload_metrics
 
 if TYPE_CHECKING:
     from fastapi import FastAPI
 
 
 class FastAPIServeGateway(FastAPIBaseGateway):
-    def __init__(self, app: str, *args, **kwargs):
+    def __init__(
+        self,
+        app: str,
+        workers: int = 1,
+        thread_pool_size: int = None,
+        drain_timeout: float = None,
+        drain_delay: float = None,
+        adaptive_concurrency: bool = False,
+        max_concurrency: int = None,
+        bulkheads: Dict = None,
+        response_cache: Dict = None,
+        *args,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self._app_str = app
         self._app: "FastAPI" = None
+        self._workers = self._resolve_workers(workers)
+        self._thread_pool_size = thread_pool_size
+        self._supervisor: WorkerSupervisor = None
+        # to load the app the same way in every worker
+        self._worker_app_kwargs = dict(
+            app=app,
+            cors=self.cors,
+            drain_timeout=drain_timeout,
+            drain_delay=drain_delay,
+            adaptive_concurrency=adaptive_concurrency,
+            max_concurrency=max_concurrency,
+            bulkheads=bulkheads,
+            response_cache=response_cache,
+        )
         self._fix_sys_path()
         self._init_fastapi_app()
         self._configure_cors()
+        self._setup_drain(drain_timeout, drain_delay)
+        self._setup_adaptive_concurrency(adaptive_concurrency, max_concurrency)
+        configure_bulkheads(self.app, bulkheads)
+        configure_response_cache(self.app, response_cache)
         self._register_healthz()
         self._setup_metrics()
         self._setup_logging()
@@ -39,32 +80,75 @@ class FastAPIServeGateway(FastAPIBaseGateway):
         return '/data/workspace'
 
     def _init_fastapi_app(self):
+        if self._workers > 1:
+            from fastapi import FastAPI
+
+            # served by the workers, which load the app themselves
+            self._app = FastAPI()
+            return
+
         with EnvironmentVarCtxtManager({'JCLOUD_WORKSPACE': self.workspace}):
             self.logger.info(f"Loading app from {self._app_str}")
             self._app, _ = import_from_string(self._app_str)
 
     def _configure_cors(self):
-        from fastapi.middleware.cors import CORSMiddleware
-
         if self.cors:
-            if any(
-                [
-                    isinstance(middleware, CORSMiddleware)
-                    for middleware in self._app.user_middleware
-                ]
-            ):
-                self.logger.warning("CORS is already enabled")
-                return
-
-            else:
-                self.logger.info("Enabling CORS")
-                self._app.add_middleware(
-                    CORSMiddleware,
-                    allow_origins=["*"],
-                    allow_credentials=True,
-                    allow_methods=["*"],
-                    allow_headers=["*"],
-                )
+            configure_cors(self._app, self.logger)
+
+    def _resolve_workers(self, workers: int) -> int:
+        return int(workers or 1)
+
+    async def setup_server(self):
+        if self._workers == 1:
+            set_thread_pool_size(self._thread_pool_size)
+            return await super().setup_server()
+
+        from fastapi_serve.gateway.direct import build_direct_app
+
+        self.logger.info(f"Starting {self._workers} workers")
+        self._supervisor = WorkerSupervisor(
+            app_factory=build_direct_app,
+            app_kwargs=dict(
+                self._worker_app_kwargs, telemetry=self._worker_telemetry()
+            ),
+            config_kwargs=dict(
+                host=self.host,
+                port=self.port,
+                log_level=os.getenv('JINA_LOG_LEVEL', 'error').lower(),
+                **self.uvicorn_kwargs,
+            ),
+            workers=self._workers,
+            logger=self.logger,
+            thread_pool_size=self._thread_pool_size,
+            env={'JCLOUD_WORKSPACE': self.workspace},
+        )
+        self._supervisor.setup()
+
+    def _worker_telemetry(self) -> Optional[Dict]:
+        """jina's metrics settings, for the workers to export to the same collector"""
+        if not self.meter_provider:
+            return None
+
+        return dict(
+            metrics_exporter_host=self.runtime_args.metrics_exporter_host,
+            metrics_exporter_port=self.runtime_args.metrics_exporter_port,
+            service_name=self.name,
+        )
+
+    async def run_server(self):
+        if self._supervisor is None:
+            return await super().run_server()
+
+        await self._supervisor.supervise()
+
+    async def shutdown(self):
+        if self._supervisor is None:
+            # stop accepting connections & let in-flight requests finish, before
+            # uvicorn closes what's left
+            await self._drainer.drain(servers=getattr(self.server, 'servers', ()))
+            return await super().shutdown()
+
+        await self._supervisor.shutdown()
 
     def _fix_sys_path(self):
         if os.getcwd() not in sys.path:
@@ -82,40 +166,48 @@ class FastAPIServeGateway(FastAPIBaseGateway):
             self.ws_duration_counter = None
             return
 
+        if self._workers > 1:
+            # every worker exports its own, see `_worker_telemetry`
+            return
+
         FastAPIInstrumentor.instrument_app(
             self._app,
             meter_provider=self.meter_provider,
             tracer_provider=self.tracer_provider,
         )
 
-        self.duration_counter = self.meter.create_counter(
-            name="fastapi_serve_request_duration_seconds",
-            description="FastAPI-serve Request duration in seconds",
-            unit="s",
-        )
-
-        self.request_counter = self.meter.create_counter(
-            name="fastapi_serve_request_count",
-            description="FastAPI-serve Request count",
+        (
+            self.duration_counter,
+            self.request_counter,
+            self.inflight_counter,
+            self.latency_histogram,
+        ) = setup_metrics_middleware(self.app, self.meter)
+        setup_bulkhead_metrics(self.meter)
+        setup_cache_metrics(self.meter)
+        setup_offload_metrics(self.meter)
+        setup_batch_metrics(self.meter)
+
+    def _setup_drain(self, timeout: float = None, delay: float = None):
+        self._drainer = setup_drain_middleware(
+            self.app, timeout=timeout, delay=delay, logger=self.logger
         )
 
-        self.app.add_middleware(
-            MetricsMiddleware,
-            duration_counter=self.duration_counter,
-            request_counter=self.request_counter,
-        )
+    def _setup_adaptive_concurrency(self, enabled: bool, max_concurrency: int = None):
+        if enabled:
+            setup_adaptive_concurrency_middleware(
+                self.app, max_concurrency=max_concurrency, logger=self.logger
+            )
 
     def _setup_logging(self):
         self.app.add_middleware(LoggingMiddleware, logger=self.logger)
 
     def _register_healthz(self):
-        @self.app.get("/healthz")
-        async def __healthz():
-            return {"status": "ok"}
+        def _health():
+            if self._supervisor is not None:
+                return {"workers": self._supervisor.health()}
+            return {}
 
-        @self.app.get("/dry_run")
-        async def __dry_run():
-            return {"status": "ok"}
+        register_healthz(self.app, health=_health, drainer=self._drainer)
 
     def _update_dry_run_with_ws(self):
         """Update the dry_run endpoint to a websocket endpoint"""
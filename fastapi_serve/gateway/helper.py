@@ -3,13 +3,20 @@ import importlib
 import os
 import time
 import uuid
-from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
+
+from fastapi_serve.gateway.workers import get_worker_id, worker_attributes
 
 if TYPE_CHECKING:
+    from fastapi import FastAPI
     from jina.logging.logger import JinaLogger
-    from opentelemetry.sdk.metrics import Counter
+    from opentelemetry.metrics import Meter
+    from opentelemetry.sdk.metrics import Counter, Histogram, UpDownCounter
     from starlette.types import ASGIApp, Receive, Scope, Send
 
+    from fastapi_serve.gateway.drain import Drainer
+    from fastapi_serve.gateway.limiter import AdaptiveLimiter
+
 
 APPDIR = "/appdir"
 
@@ -50,6 +57,140 @@ def import_from_string(import_str: Any) -> Tuple[Any, Any]:
     return app, module
 
 
+def configure_cors(app: "FastAPI", logger: "JinaLogger"):
+    from fastapi.middleware.cors import CORSMiddleware
+
+    if any(
+        [isinstance(middleware, CORSMiddleware) for middleware in app.user_middleware]
+    ):
+        logger.warning("CORS is already enabled")
+        return
+
+    logger.info("Enabling CORS")
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+
+def register_healthz(
+    app: "FastAPI",
+    health: Optional[Callable[[], Dict]] = None,
+    drainer: Optional["Drainer"] = None,
+):
+    """Register `/healthz` & `/dry_run`, `health` can add extra fields to `/healthz`.
+    `/healthz` fails while `drainer` drains, so that no new traffic is routed here"""
+    from fastapi.responses import JSONResponse
+
+    from fastapi_serve.utils.batching import get_batchers
+    from fastapi_serve.utils.bulkhead import get_bulkheads
+    from fastapi_serve.utils.offload import get_process_pools
+
+    @app.get("/healthz")
+    async def __healthz():
+        if drainer is not None and drainer.draining:
+            return JSONResponse({"status": "draining"}, status_code=503)
+        bulkheads = {name: b.stats() for name, b in get_bulkheads().items()}
+        pools = {p.name: p.stats() for p in get_process_pools()}
+        batchers = {name: b.stats() for name, b in get_batchers().items()}
+        cache = getattr(app.state, "fastapi_serve_response_cache", None)
+        return {
+            "status": "ok",
+            **(health() if health else {}),
+            **({"bulkheads": bulkheads} if bulkheads else {}),
+            **({"process_pools": pools} if pools else {}),
+            **({"batchers": batchers} if batchers else {}),
+            **({"response_cache": cache.stats()} if cache is not None else {}),
+        }
+
+    @app.get("/dry_run")
+    async def __dry_run():
+        return {"status": "ok"}
+
+
+def setup_drain_middleware(
+    app: "FastAPI",
+    timeout: float = None,
+    delay: float = None,
+    logger=None,
+) -> "Drainer":
+    from fastapi_serve.gateway.drain import (
+        DEFAULT_DRAIN_DELAY,
+        DEFAULT_DRAIN_TIMEOUT,
+        DrainMiddleware,
+        Drainer,
+    )
+
+    drainer = Drainer(
+        timeout=DEFAULT_DRAIN_TIMEOUT if timeout is None else timeout,
+        delay=DEFAULT_DRAIN_DELAY if delay is None else delay,
+        logger=logger,
+    )
+    app.add_middleware(DrainMiddleware, drainer=drainer)
+    return drainer
+
+
+def setup_adaptive_concurrency_middleware(
+    app: "FastAPI",
+    max_concurrency: int = None,
+    logger=None,
+) -> "AdaptiveLimiter":
+    from fastapi_serve.gateway.limiter import (
+        DEFAULT_MAX_CONCURRENCY,
+        AdaptiveConcurrencyMiddleware,
+        AdaptiveLimiter,
+    )
+
+    limiter = AdaptiveLimiter(max_limit=max_concurrency or DEFAULT_MAX_CONCURRENCY)
+    app.add_middleware(AdaptiveConcurrencyMiddleware, limiter=limiter, logger=logger)
+    return limiter
+
+
+def setup_metrics_middleware(app: "FastAPI", meter: "Meter"):
+    duration_counter = meter.create_counter(
+        name="fastapi_serve_request_duration_seconds",
+        description="FastAPI-serve Request duration in seconds",
+        unit="s",
+    )
+    request_counter = meter.create_counter(
+        name="fastapi_serve_request_count",
+        description="FastAPI-serve Request count",
+    )
+    # used as the `concurrency` autoscale metric
+    inflight_counter = meter.create_up_down_counter(
+        name="fastapi_serve_inflight_requests",
+        description="FastAPI-serve Requests & WebSocket connections in flight",
+    )
+    # HTTP only, a WebSocket connection's duration isn't latency
+    latency_histogram = meter.create_histogram(
+        name="fastapi_serve_request_latency",
+        description="FastAPI-serve HTTP request latency by route & status code",
+        unit="ms",
+    )
+    app.add_middleware(
+        MetricsMiddleware,
+        duration_counter=duration_counter,
+        request_counter=request_counter,
+        inflight_counter=inflight_counter,
+        latency_histogram=latency_histogram,
+    )
+    return duration_counter, request_counter, inflight_counter, latency_histogram
+
+
+def set_thread_pool_size(size: Optional[int]):
+    """Resize the anyio thread limiter that starlette uses to run sync `def` endpoints.
+    Must be called from within the event loop that serves the app."""
+    if not size:
+        return
+
+    from anyio.to_thread import current_default_thread_limiter
+
+    current_default_thread_limiter().total_tokens = size
+
+
 class Timer:
     class SharedData:
         def __init__(self, last_reported_time):
@@ -71,7 +212,7 @@ class Timer:
             if counter:
                 counter.add(
                     current_time - shared_data.last_reported_time,
-                    {"route": route, "protocol": protocol},
+                    {"route": route, "protocol": protocol, **worker_attributes()},
                 )
 
             shared_data.last_reported_time = current_time
@@ -83,10 +224,14 @@ class MetricsMiddleware:
         app: "ASGIApp",
         duration_counter: Optional["Counter"] = None,
         request_counter: Optional["Counter"] = None,
+        inflight_counter: Optional["UpDownCounter"] = None,
+        latency_histogram: Optional["Histogram"] = None,
     ):
         self.app = app
         self.duration_counter = duration_counter
         self.request_counter = request_counter
+        self.inflight_counter = inflight_counter
+        self.latency_histogram = latency_histogram
         # TODO: figure out solution for static assets
         self.skip_routes = [
             "/docs",
@@ -102,26 +247,48 @@ class MetricsMiddleware:
         # Not all Scope objs have path key, e.g., lifespan type of scope
         path = scope.get("path")
         if path and path not in self.skip_routes:
+            attributes = {
+                "route": path,
+                "protocol": scope["type"],
+                **worker_attributes(),
+            }
+            if self.inflight_counter:
+                self.inflight_counter.add(1, attributes)
+            # an exception before the response started ends up as a 500
+            status_code = 500
+
+            async def _send(message: dict) -> None:
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                await send(message)
+
+            start_time = time.perf_counter()
             timer = Timer(5)
-            shared_data = timer.SharedData(last_reported_time=time.perf_counter())
+            shared_data = timer.SharedData(last_reported_time=start_time)
             send_duration_task = asyncio.create_task(
                 timer.send_duration_periodically(
                     shared_data, path, scope["type"], self.duration_counter
                 )
             )
             try:
-                await self.app(scope, receive, send)
+                await self.app(scope, receive, _send)
             finally:
                 send_duration_task.cancel()
+                if self.inflight_counter:
+                    self.inflight_counter.add(-1, attributes)
+                if self.latency_histogram and scope["type"] == "http":
+                    self.latency_histogram.record(
+                        (time.perf_counter() - start_time) * 1000,
+                        {**attributes, "status_code": str(status_code)},
+                    )
                 if self.duration_counter:
                     self.duration_counter.add(
                         time.perf_counter() - shared_data.last_reported_time,
-                        {"route": path, "protocol": scope["type"]},
+                        attributes,
                     )
                 if self.request_counter:
-                    self.request_counter.add(
-                        1, {"route": path, "protocol": scope["type"]}
-                    )
+                    self.request_counter.add(1, attributes)
         else:
             await self.app(scope, receive, send)
 
@@ -176,13 +343,15 @@ class LoggingMiddleware:
             end_time = time.perf_counter()
             duration = round(end_time - start_time, 3)
 
+            worker_id = get_worker_id()
+            worker = f" - Worker: {worker_id}" if worker_id is not None else ""
             if scope["type"] == "http":
                 self.logger.info(
-                    f"HTTP request: {request_id} - Path: {path} - Client IP: {ip_address} - Status code: {status_code} - Duration: {duration} s"
+                    f"HTTP request: {request_id} - Path: {path} - Client IP: {ip_address} - Status code: {status_code} - Duration: {duration} s{worker}"
                 )
             elif scope["type"] == "websocket":
                 self.logger.info(
-                    f"WebSocket connection: {connection_id} - Path: {path} - Client IP: {ip_address} - Duration: {duration} s"
+                    f"WebSocket connection: {connection_id} - Path: {path} - Client IP: {ip_address} - Duration: {duration} s{worker}"
                 )
 
         else:
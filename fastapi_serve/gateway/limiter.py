@@ -0,0 +1,201 @@
+import asyncio
+import math
+import time
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import logging
+
+    from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+DEFAULT_INITIAL_CONCURRENCY = 20
+DEFAULT_MAX_CONCURRENCY = 1000
+# probes are never queued behind (or shed with) user traffic
+PRIORITY_PATHS = ("/healthz", "/dry_run")
+# between two "shedding" warnings
+_LOG_INTERVAL = 10
+# responses telling that the server (or one it calls) is overloaded
+OVERLOAD_STATUSES = (503, 504)
+
+
+def _ewma(average: Optional[float], sample: float, window: int) -> float:
+    if average is None:
+        return sample
+    return average + (sample - average) * 2 / (window + 1)
+
+
+class AdaptiveLimiter:
+    """A concurrency limit learned from latency, after Netflix's gradient limiter.
+
+    The minimum latency stands for the server without queuing. While the recent
+    latency stays within `tolerance` times it, the limit grows by its square root, so
+    that it finds more capacity. Once requests queue up and the recent latency grows
+    past that, the limit shrinks in proportion. Overloaded requests (timeouts, 503 &
+    504 responses) shrink it by 10%, at most once per recent latency so that a burst of
+    them counts once. Other errors (e.g. 500s from a bug) are samples like any other,
+    requests without a response (e.g. clients that disconnected) leave it alone.
+
+    Every `probe_interval` requests, the minimum is measured again, so that it follows
+    the app getting slower or faster: it becomes the minimum of those requests. If they
+    queued, the limit shrinks to the capacity they show (by Little's law, at most
+    halving it) for the queue to drain & the minimum is taken from the next requests.
+    """
+
+    def __init__(
+        self,
+        initial: int = DEFAULT_INITIAL_CONCURRENCY,
+        min_limit: int = 1,
+        max_limit: int = DEFAULT_MAX_CONCURRENCY,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        short_window: int = 10,
+        probe_interval: int = 1000,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.short_window = short_window
+        self.probe_interval = probe_interval
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.inflight = 0
+        self.rejected = 0
+        self.min_rtt: Optional[float] = None
+        self.short_rtt: Optional[float] = None
+        self._samples = 0
+        self._window_rtt: Optional[float] = None
+        self._shrunk = -math.inf
+
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+
+    def try_acquire(self) -> bool:
+        if self.inflight >= self.current:
+            self.rejected += 1
+            return False
+        self.inflight += 1
+        return True
+
+    def release(self, rtt: Optional[float], overloaded: bool = False):
+        """`rtt` in seconds, `None` if the request got no response"""
+        inflight = self.inflight
+        self.inflight -= 1
+        if overloaded:
+            now = time.monotonic()
+            if now - self._shrunk >= (self.short_rtt or 0):
+                self._shrunk = now
+                self._set(self.limit * 0.9)
+            return
+        if rtt is None:
+            return
+
+        self._samples += 1
+        self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+        self.short_rtt = _ewma(self.short_rtt, rtt, self.short_window)
+        self._window_rtt = (
+            rtt if self._window_rtt is None else min(self._window_rtt, rtt)
+        )
+        if self._samples % self.probe_interval == 0:
+            self._probe()
+            return
+
+        if inflight < self.limit / 2:
+            # too few requests to tell anything about the limit
+            return
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.min_rtt / self.short_rtt))
+        limit = self.limit * gradient + math.sqrt(self.limit)
+        self._set(self.limit * (1 - self.smoothing) + limit * self.smoothing)
+
+    def _probe(self):
+        window_rtt, self._window_rtt = self._window_rtt, None
+        if self.short_rtt <= self.tolerance * self.min_rtt:
+            # no queuing, the window's minimum is the app's latency
+            self.min_rtt = window_rtt
+            return
+        self._set(max(self.limit / 2, self.limit * self.min_rtt / self.short_rtt))
+        self.min_rtt = None
+
+    def _set(self, limit: float):
+        self.limit = min(max(limit, self.min_limit), self.max_limit)
+
+    @property
+    def retry_after(self) -> int:
+        """Seconds for a rejected client to wait, about the time a request takes"""
+        return max(math.ceil(self.short_rtt or 0), 1)
+
+
+class AdaptiveConcurrencyMiddleware:
+    """Rejects HTTP requests past the `limiter`'s limit with 503 & `Retry-After`,
+    rather than queuing them. Probes skip the limit, WebSockets aren't limited."""
+
+    def __init__(
+        self,
+        app: "ASGIApp",
+        limiter: AdaptiveLimiter,
+        logger: Optional["logging.Logger"] = None,
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.logger = logger
+        self._logged = 0.0
+
+    async def __call__(self, scope: "Scope", receive: "Receive", send: "Send") -> None:
+        if scope["type"] != "http" or scope.get("path") in PRIORITY_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter
+        if not limiter.try_acquire():
+            await self._reject(send)
+            return
+
+        start = time.perf_counter()
+        rtt = None
+        overloaded = False
+
+        async def _send(message: dict) -> None:
+            nonlocal rtt, overloaded
+            if message["type"] == "http.response.start":
+                # time to the response, a stream's duration isn't queuing
+                rtt = time.perf_counter() - start
+                overloaded = message["status"] in OVERLOAD_STATUSES
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        except (asyncio.TimeoutError, TimeoutError):
+            overloaded = True
+            raise
+        finally:
+            # cancelled, e.g. on a client disconnect, isn't the server overloaded
+            limiter.release(rtt, overloaded)
+
+    async def _reject(self, send: "Send"):
+        limiter = self.limiter
+        now = time.monotonic()
+        if self.logger is not None and now - self._logged > _LOG_INTERVAL:
+            self._logged = now
+            self.logger.warning(
+                f"Shedding load at {limiter.current} concurrent requests, "
+                f"{limiter.rejected} rejected so far"
+            )
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(limiter.retry_after).encode()),
+                ],
+            }
+        )
+        await send(
+            {
+                "type": "http.response.body",
+                "body": b'{"detail":"Server overloaded, retry later"}',
+            }
+        )
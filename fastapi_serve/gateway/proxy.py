@@ -0,0 +1,345 @@
+import asyncio
+import logging
+import signal
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+from aiohttp import (
+    ClientConnectionError,
+    ClientSession,
+    ClientTimeout,
+    TCPConnector,
+    WSMsgType,
+    WSServerHandshakeError,
+    web,
+)
+
+# Headers that only apply to a single connection, never forwarded
+HOP_BY_HOP_HEADERS = {
+    'connection',
+    'keep-alive',
+    'proxy-authenticate',
+    'proxy-authorization',
+    'te',
+    'trailer',
+    'transfer-encoding',
+    'upgrade',
+}
+
+
+class Upstream:
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.inflight = 0
+        self.requests = 0
+        self.healthy = False
+        # finishing its in-flight requests before being removed, gets no new ones
+        self.draining = False
+
+
+class LeastConnectionsBalancer:
+    """Picks the healthy upstream with the fewest in-flight requests, ties are
+    broken round-robin so that idle upstreams share the load evenly"""
+
+    def __init__(self, upstreams: Iterable[Upstream]):
+        self.upstreams = list(upstreams)
+        self._next = 0
+
+    def pick(self) -> Optional[Upstream]:
+        healthy = [u for u in self.upstreams if u.healthy and not u.draining]
+        if not healthy:
+            return None
+
+        start, self._next = self._next, self._next + 1
+        candidates = (healthy[(start + i) % len(healthy)] for i in range(len(healthy)))
+        return min(candidates, key=lambda u: u.inflight)
+
+
+def _forwarded_headers(request: web.Request) -> dict:
+    headers = {
+        k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS
+    }
+    peer = request.remote or ''
+    forwarded_for = request.headers.get('X-Forwarded-For')
+    headers['X-Forwarded-For'] = f'{forwarded_for}, {peer}' if forwarded_for else peer
+    headers['X-Forwarded-Proto'] = request.scheme
+    headers['X-Forwarded-Host'] = request.host
+    return headers
+
+
+class ReverseProxy:
+    """An asyncio reverse proxy balancing HTTP & WebSocket traffic over local replicas.
+
+    Each upstream gets a pool of keep-alive connections, and is taken out of rotation
+    when it fails a health check or refuses a connection.
+    """
+
+    def __init__(
+        self,
+        upstreams: List[str],
+        logger: logging.Logger,
+        health_path: str = '/healthz',
+        health_interval: float = 2.0,
+        pool_size: int = 256,
+        on_health_check: Optional[Callable[[], None]] = None,
+    ):
+        self.balancer = LeastConnectionsBalancer(Upstream(u) for u in upstreams)
+        self.logger = logger
+        self.health_path = health_path
+        self.health_interval = health_interval
+        self.pool_size = pool_size
+        self.on_health_check = on_health_check
+        self._session: Optional[ClientSession] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._health_task: Optional[asyncio.Task] = None
+
+    @property
+    def upstreams(self) -> List[Upstream]:
+        return self.balancer.upstreams
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=0)
+        app.router.add_route('*', '/{path:.*}', self._handle)
+        return app
+
+    async def start(self, host: str = '0.0.0.0', port: int = 8080):
+        self._session = ClientSession(
+            # `pool_size` connections to each upstream, without an overall cap
+            connector=TCPConnector(
+                limit=0, limit_per_host=self.pool_size, force_close=False
+            ),
+            # bodies are passed through untouched, e.g. gzip-encoded responses
+            auto_decompress=False,
+            # requests may legitimately take long, e.g. streaming responses
+            timeout=ClientTimeout(total=None, sock_connect=10),
+        )
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+        if self._session is not None:
+            await self._session.close()
+
+    def add_upstream(self, url: str) -> Upstream:
+        """Added out of rotation, until it passes a health check"""
+        upstream = Upstream(url)
+        self.upstreams.append(upstream)
+        return upstream
+
+    async def drain(self, upstream: Upstream, timeout: float = 30) -> bool:
+        """Take `upstream` out of rotation, wait for its in-flight requests to finish
+        and remove it. Returns `False` if requests were still in flight after `timeout`
+        """
+        upstream.draining = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while upstream.inflight and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+
+        self.upstreams.remove(upstream)
+        return upstream.inflight == 0
+
+    async def wait_until_healthy(self, timeout: float = 60):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not all(u.healthy for u in self.upstreams if not u.draining):
+            if loop.time() > deadline:
+                raise TimeoutError('Replicas did not become healthy in time')
+            await self.check_health()
+            await asyncio.sleep(0.1)
+
+    async def check_health(self):
+        async def _check(upstream: Upstream):
+            try:
+                async with self._session.get(
+                    upstream.url + self.health_path, timeout=5
+                ) as r:
+                    healthy = r.status == 200
+            except (ClientConnectionError, asyncio.TimeoutError):
+                healthy = False
+
+            if healthy != upstream.healthy:
+                self.logger.info(
+                    f'Replica {upstream.url} is {"healthy" if healthy else "unhealthy"}'
+                )
+            upstream.healthy = healthy
+
+        await asyncio.gather(*(_check(u) for u in self.upstreams))
+
+    async def _health_loop(self):
+        while True:
+            await self.check_health()
+            if self.on_health_check is not None:
+                self.on_health_check()
+            await asyncio.sleep(self.health_interval)
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        upstream = self.balancer.pick()
+        if upstream is None:
+            return web.json_response(
+                {'detail': 'No healthy replica available'}, status=503
+            )
+
+        upstream.inflight += 1
+        upstream.requests += 1
+        try:
+            if request.headers.get('Upgrade', '').lower() == 'websocket':
+                return await self._proxy_websocket(request, upstream)
+            return await self._proxy_http(request, upstream)
+        finally:
+            upstream.inflight -= 1
+
+    def _bad_gateway(self, upstream: Upstream, e: Exception) -> web.Response:
+        upstream.healthy = False
+        self.logger.warning(f'Replica {upstream.url} failed: {e!r}')
+        return web.json_response({'detail': 'Bad gateway'}, status=502)
+
+    async def _proxy_http(
+        self, request: web.Request, upstream: Upstream
+    ) -> web.StreamResponse:
+        response = web.StreamResponse()
+        try:
+            async with self._session.request(
+                request.method,
+                upstream.url + request.rel_url.raw_path_qs,
+                headers=_forwarded_headers(request),
+                data=request.content if request.body_exists else None,
+                allow_redirects=False,
+            ) as r:
+                response.set_status(r.status, r.reason)
+                for k, v in r.headers.items():
+                    if k.lower() not in HOP_BY_HOP_HEADERS:
+                        response.headers.add(k, v)
+                if r.content_length is None:
+                    response.enable_chunked_encoding()
+
+                await response.prepare(request)
+                try:
+                    async for chunk in r.content.iter_any():
+                        await response.write(chunk)
+                    await response.write_eof()
+                except ConnectionResetError:
+                    # the client went away, nothing left to send the response to
+                    pass
+                return response
+        except ClientConnectionError as e:
+            if response.prepared:
+                # too late for an error response, the client sees a truncated body
+                raise
+            return self._bad_gateway(upstream, e)
+
+    async def _proxy_websocket(
+        self, request: web.Request, upstream: Upstream
+    ) -> web.StreamResponse:
+        protocols = [
+            p.strip()
+            for p in request.headers.get('Sec-WebSocket-Protocol', '').split(',')
+            if p.strip()
+        ]
+        headers = {
+            k: v
+            for k, v in _forwarded_headers(request).items()
+            if not k.lower().startswith('sec-websocket')
+        }
+        # Connect upstream first, so that a rejected handshake is passed on as is
+        try:
+            upstream_ws = await self._session.ws_connect(
+                upstream.url.replace('http', 'ws', 1) + request.rel_url.raw_path_qs,
+                headers=headers,
+                protocols=protocols,
+                autoping=False,
+            )
+        except WSServerHandshakeError as e:
+            return web.Response(status=e.status, text=e.message)
+        except ClientConnectionError as e:
+            return self._bad_gateway(upstream, e)
+
+        async with upstream_ws:
+            client_ws = web.WebSocketResponse(
+                protocols=[upstream_ws.protocol] if upstream_ws.protocol else (),
+                autoping=False,
+            )
+            await client_ws.prepare(request)
+
+            async def _pump(source, target):
+                async for msg in source:
+                    if msg.type == WSMsgType.TEXT:
+                        await target.send_str(msg.data)
+                    elif msg.type == WSMsgType.BINARY:
+                        await target.send_bytes(msg.data)
+                    elif msg.type == WSMsgType.PING:
+                        await target.ping(msg.data)
+                    elif msg.type == WSMsgType.PONG:
+                        await target.pong(msg.data)
+                await target.close(code=source.close_code or 1000)
+
+            pumps = [
+                asyncio.create_task(_pump(client_ws, upstream_ws)),
+                asyncio.create_task(_pump(upstream_ws, client_ws)),
+            ]
+            _, pending = await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            return client_ws
+
+
+def serve_proxy(
+    upstreams: List[str],
+    logger: logging.Logger,
+    host: str = '0.0.0.0',
+    port: int = 8080,
+    on_health_check: Optional[Callable[[], None]] = None,
+    on_reload: Optional[Callable[[ReverseProxy], Awaitable]] = None,
+    startup_timeout: float = 600,
+):
+    """Run the reverse proxy in front of `upstreams` until SIGINT/SIGTERM, SIGHUP
+    calls `on_reload`, e.g. to replace the upstreams"""
+
+    async def _serve():
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        proxy = ReverseProxy(upstreams, logger=logger, on_health_check=on_health_check)
+        await proxy.start(host=host, port=port)
+
+        reload: Optional[asyncio.Task] = None
+
+        def _reload():
+            nonlocal reload
+            if reload is not None and not reload.done():
+                logger.warning('Reload already in progress')
+                return
+            reload = asyncio.create_task(on_reload(proxy))
+
+        if on_reload is not None and hasattr(signal, 'SIGHUP'):
+            loop.add_signal_handler(signal.SIGHUP, _reload)
+
+        def _on_ready(task: asyncio.Task):
+            if task.cancelled():
+                return
+            if task.exception() is not None:
+                logger.warning(f'{task.exception()}, serving the healthy ones')
+            else:
+                logger.info(
+                    f'Balancing http://{host}:{port} over {len(upstreams)} replicas'
+                )
+
+        ready = asyncio.create_task(proxy.wait_until_healthy(startup_timeout))
+        ready.add_done_callback(_on_ready)
+        try:
+            await stop.wait()
+        finally:
+            ready.cancel()
+            if reload is not None:
+                reload.cancel()
+            await proxy.stop()
+
+    asyncio.run(_serve())
@@ -0,0 +1,279 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from jina.logging.logger import JinaLogger
+    from uvicorn import Server
+
+
+# seconds between two heartbeats of a serving worker
+HEARTBEAT_INTERVAL = 1.0
+# a worker is alive until it misses that many heartbeats in a row
+_MISSED_HEARTBEATS = 3
+
+# Set in the worker process before the app is loaded, `None` in single-process mode
+_WORKER_ID: Optional[int] = None
+_WORKER_COUNT: Optional[int] = None
+# The container/pod name, which tells replicas apart
+_HOSTNAME = socket.gethostname()
+
+
+def get_worker_id() -> Optional[int]:
+    return _WORKER_ID
+
+
+def get_worker_count() -> int:
+    """Number of worker processes sharing the machine with this one"""
+    return _WORKER_COUNT or 1
+
+
+def worker_attributes() -> Dict[str, str]:
+    """Extra metric attributes, so that series from different replicas (e.g. compose
+    replicas sharing one collector) & workers don't collide"""
+    attributes = {"replica": _HOSTNAME}
+    if _WORKER_ID is not None:
+        attributes["worker"] = str(_WORKER_ID)
+    return attributes
+
+
+def new_event_loop(loop: str = "auto") -> asyncio.AbstractEventLoop:
+    if loop in ("auto", "uvloop"):
+        try:
+            import uvloop
+
+            return uvloop.new_event_loop()
+        except ModuleNotFoundError:
+            if loop == "uvloop":
+                raise
+    return asyncio.new_event_loop()
+
+
+def count_alive(
+    heartbeats: Sequence[float], interval: float = HEARTBEAT_INTERVAL
+) -> int:
+    """Workers whose last heartbeat is recent, i.e. serving with a responsive loop"""
+    now = time.time()
+    return sum(1 for beat in heartbeats if now - beat < interval * _MISSED_HEARTBEATS)
+
+
+async def _beat(server: "Server", heartbeats, worker_id: int, interval: float):
+    # from the event loop, so that a blocked loop stops beating
+    while not server.started:
+        await asyncio.sleep(0.01)
+    while not server.should_exit:
+        heartbeats[worker_id] = time.time()
+        await asyncio.sleep(interval)
+
+
+def _exit(*_):
+    # once uvicorn has shut down, it re-raises the signal it handled. Exit normally
+    # rather than being killed by it, so that `atexit` (e.g. process pools) runs
+    raise SystemExit(0)
+
+
+def _run_worker(
+    worker_id: int,
+    workers: int,
+    app_factory: Callable,
+    app_kwargs: Dict,
+    config_kwargs: Dict,
+    sockets: List[socket.socket],
+    heartbeats,
+    heartbeat_interval: float,
+    thread_pool_size: Optional[int],
+    env: Dict[str, str],
+):
+    """Entrypoint of a spawned worker: loads the app & serves it on `sockets`"""
+    global _WORKER_ID, _WORKER_COUNT
+    _WORKER_ID = worker_id
+    _WORKER_COUNT = workers
+    os.environ.update(env)
+
+    from uvicorn import Config, Server
+
+    from fastapi_serve.gateway.drain import DrainingServer
+    from fastapi_serve.gateway.helper import set_thread_pool_size
+
+    def _health():
+        alive = count_alive(heartbeats, heartbeat_interval)
+        return {"workers": {"alive": alive, "total": workers}}
+
+    app = app_factory(health=_health, **app_kwargs)
+    config = Config(app=app, **config_kwargs)
+    drainer = getattr(app.state, "fastapi_serve_drainer", None)
+    server = Server(config) if drainer is None else DrainingServer(config, drainer)
+
+    async def _serve():
+        set_thread_pool_size(thread_pool_size)
+        beat = asyncio.ensure_future(
+            _beat(server, heartbeats, worker_id, heartbeat_interval)
+        )
+        try:
+            await server.serve(sockets=sockets)
+        finally:
+            beat.cancel()
+            heartbeats[worker_id] = 0
+
+    signal.signal(signal.SIGTERM, _exit)
+    loop = new_event_loop(config.loop)
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(_serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.close()
+
+
+class WorkerSupervisor:
+    """Runs `workers` copies of a uvicorn server sharing one listening socket.
+
+    Workers are spawned rather than forked, as the supervisor runs in a process that
+    already has threads (e.g. jina's gRPC & OpenTelemetry ones), which a fork would
+    leave broken in the children. Every worker loads the app itself, with
+    `app_factory(health=..., **app_kwargs)` (e.g. `build_direct_app`), which must be
+    importable by name, with `env` set. Nothing is shared copy-on-write, so memory grows
+    linearly with `workers`: each holds its own copy of the app & its models. The parent
+    doesn't serve requests, it only restarts workers that die and stops them on shutdown.
+
+    Serving workers write a heartbeat to shared memory every `heartbeat_interval`
+    seconds, from their event loop. `alive` counts the workers with a recent one, so
+    that workers still starting, stuck or dead don't count.
+    """
+
+    def __init__(
+        self,
+        app_factory: Callable,
+        app_kwargs: Dict,
+        config_kwargs: Dict,
+        workers: int,
+        logger: "JinaLogger",
+        thread_pool_size: Optional[int] = None,
+        restart_interval: float = 1.0,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL,
+        env: Optional[Dict[str, str]] = None,
+    ):
+        self.app_factory = app_factory
+        self.app_kwargs = app_kwargs
+        self.config_kwargs = config_kwargs
+        self.workers = workers
+        self.logger = logger
+        self.thread_pool_size = thread_pool_size
+        self.restart_interval = restart_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.env = env or {}
+        self.should_exit = False
+        self._ctx = multiprocessing.get_context("spawn")
+        self._socket: Optional[socket.socket] = None
+        self._processes: Dict[int, multiprocessing.process.BaseProcess] = {}
+        # last heartbeat of every worker, shared with them
+        self._heartbeats = self._ctx.RawArray("d", workers)
+
+    @property
+    def alive(self) -> int:
+        return count_alive(self._heartbeats, self.heartbeat_interval)
+
+    @property
+    def pids(self) -> Dict[int, int]:
+        return {i: p.pid for i, p in self._processes.items()}
+
+    def health(self) -> Dict[str, int]:
+        return {"alive": self.alive, "total": self.workers}
+
+    def setup(self):
+        from uvicorn import Config
+
+        # the app is loaded by the workers, only bind the socket here
+        self._socket = Config(app=None, **self.config_kwargs).bind_socket()
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+
+    def _spawn(self, worker_id: int):
+        self._heartbeats[worker_id] = 0
+        process = self._ctx.Process(
+            target=_run_worker,
+            kwargs=dict(
+                worker_id=worker_id,
+                workers=self.workers,
+                app_factory=self.app_factory,
+                app_kwargs=self.app_kwargs,
+                config_kwargs=self.config_kwargs,
+                sockets=[self._socket],
+                heartbeats=self._heartbeats,
+                heartbeat_interval=self.heartbeat_interval,
+                thread_pool_size=self.thread_pool_size,
+                env=self.env,
+            ),
+            name=f"worker-{worker_id}",
+        )
+        process.start()
+        self._processes[worker_id] = process
+        self.logger.info(f"Started worker {worker_id} with pid {process.pid}")
+
+    def _reap(self):
+        for worker_id, process in list(self._processes.items()):
+            if process.exitcode is None:
+                continue
+
+            process.join()
+            del self._processes[worker_id]
+            self._heartbeats[worker_id] = 0
+            if not self.should_exit:
+                self.logger.warning(
+                    f"Worker {worker_id} (pid {process.pid}) exited with code "
+                    f"{process.exitcode}, restarting"
+                )
+                self._spawn(worker_id)
+
+    async def supervise(self):
+        while not self.should_exit:
+            self._reap()
+            await asyncio.sleep(self.restart_interval)
+
+    def _stop_timeout(self) -> float:
+        """Time for a worker to drain, as `ServerConfig.termination_grace_period`"""
+        from fastapi_serve.gateway.drain import (
+            DEFAULT_DRAIN_DELAY,
+            DEFAULT_DRAIN_TIMEOUT,
+        )
+
+        delay = self.app_kwargs.get("drain_delay")
+        timeout = self.app_kwargs.get("drain_timeout")
+        return (
+            (DEFAULT_DRAIN_DELAY if delay is None else delay)
+            + (DEFAULT_DRAIN_TIMEOUT if timeout is None else timeout)
+            + 5
+        )
+
+    async def shutdown(self, timeout: Optional[float] = None):
+        """Stop the workers with SIGTERM, each drains its own in-flight requests. Those
+        still running after `timeout` are killed"""
+        if timeout is None:
+            timeout = self._stop_timeout()
+        self.should_exit = True
+        for process in self._processes.values():
+            if process.exitcode is None:
+                process.terminate()
+
+        deadline = time.monotonic() + timeout
+        while self._processes and time.monotonic() < deadline:
+            self._reap()
+            await asyncio.sleep(0.1)
+
+        for worker_id, process in self._processes.items():
+            self.logger.warning(
+                f"Worker {worker_id} (pid {process.pid}) didn't stop, killing"
+            )
+            process.kill()
+            process.join()
+
+        self._processes.clear()
+        for worker_id in range(self.workers):
+            self._heartbeats[worker_id] = 0
+        if self._socket is not None:
+            self._socket.close()
@@ -1,21 +1,9 @@
 import asyncio
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
-from typing import Dict
-
-import nest_asyncio
-
-try:
-    nest_asyncio.apply()
-except RuntimeError:
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
-    try:
-        nest_asyncio.apply()
-    except RuntimeError:
-        pass
+from typing import Any, Awaitable, Dict
 
 
 def syncify(f):
@@ -34,24 +22,35 @@ def get_random_tag():
     return 't-' + uuid.uuid4().hex[:5]
 
 
-def get_or_create_eventloop():
+def get_free_port() -> int:
+    import socket
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _run(aw: Awaitable) -> Any:
+    async def _await():
+        return await aw
+
     try:
-        return asyncio.get_event_loop()
-    except RuntimeError as ex:
-        if "There is no current event loop in thread" in str(ex):
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            return asyncio.get_event_loop()
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_await())
+
+    # Called from sync code that runs inside an event loop (e.g. the CLI's `syncify`).
+    # The loop can't be re-entered, so run on a fresh loop in another thread.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, _await()).result()
 
 
 def asyncio_run(func, *args, **kwargs):
-    return get_or_create_eventloop().run_until_complete(func(*args, **kwargs))
+    return _run(func(*args, **kwargs))
 
 
 def asyncio_run_property(func):
-    task = asyncio.ensure_future(func)
-    get_or_create_eventloop().run_until_complete(task)
-    return task.result()
+    return _run(func)
 
 
 class EnvironmentVarCtxtManager:
@@ -0,0 +1,488 @@
+"""Verify that an upgrade doesn't drop or slow down requests.
+
+`streams` probes run concurrently, each sending a request as soon as the previous one
+returned (at most every `interval`), on its own keep-alive connection. Every probe is
+recorded: a failed or slow request shows up with its timestamp, and the version field
+of the responses tells when each stream moved to the new version.
+
+The upgrade is either a rolling restart of local replicas (`app` & `to`), a `command`
+run against `url` (e.g. `fastapi-serve deploy jcloud ... --app-id ...`), or done by
+hand while probing `url`. Probes are split into before/during/after phases, so that the
+tail latency during the rollout can be compared with the steady state.
+"""
+
+import asyncio
+import json
+import signal
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from fastapi_serve.bench import PERCENTILES, LatencyHistogram, _error_key
+
+PHASES = ['before', 'during', 'after']
+
+
+@dataclass
+class Probe:
+    stream: int
+    sent: float  # seconds since the start of the run
+    latency: float
+    status: Optional[int] = None
+    version: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+
+def _get_field(data, path: str) -> Optional[str]:
+    for key in path.split('.'):
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return None if data is None else str(data)
+
+
+@dataclass
+class UpgradeReport:
+    url: str
+    started_at: float  # wall clock
+    slow_ms: float
+    probes: List[Probe] = field(default_factory=list)
+    # seconds since the start of the run, `None` when unknown
+    upgrade_start: Optional[float] = None
+    upgrade_end: Optional[float] = None
+
+    def infer_upgrade_window(self):
+        """For upgrades done by hand: from the first failure or new version, to the last
+        failure or old version"""
+        probes = sorted(self.probes, key=lambda p: p.sent)
+        initial = next((p.version for p in probes if not p.failed), None)
+        changed = [p for p in probes if p.failed or p.version != initial]
+        if not changed:
+            return
+
+        self.upgrade_start = changed[0].sent
+        self.upgrade_end = max(
+            p.sent + p.latency
+            for p in probes
+            if p.sent >= self.upgrade_start and (p.failed or p.version == initial)
+        )
+
+    def phase(self, probe: Probe) -> str:
+        if self.upgrade_start is None or probe.sent < self.upgrade_start:
+            return 'before'
+        if self.upgrade_end is None or probe.sent <= self.upgrade_end:
+            return 'during'
+        return 'after'
+
+    @property
+    def failures(self) -> List[Probe]:
+        return [p for p in self.probes if p.failed]
+
+    @property
+    def slow(self) -> List[Probe]:
+        return [
+            p for p in self.probes if not p.failed and p.latency * 1000 > self.slow_ms
+        ]
+
+    @property
+    def failed_seconds(self) -> float:
+        """How long requests were failing, from each failed probe to the next successful
+        one, as resolved by the probes"""
+        total, failing_since, last_end = 0.0, None, 0.0
+        for p in sorted(self.probes, key=lambda p: p.sent):
+            if p.failed:
+                if failing_since is None:
+                    failing_since = p.sent
+                last_end = max(last_end, p.sent + p.latency)
+            elif failing_since is not None:
+                total += p.sent - failing_since
+                failing_since = None
+        if failing_since is not None:
+            total += last_end - failing_since
+        return total
+
+    def latencies(self) -> Dict[str, LatencyHistogram]:
+        histograms = {phase: LatencyHistogram() for phase in PHASES}
+        for p in self.probes:
+            if not p.failed:
+                histograms[self.phase(p)].record(p.latency)
+        return histograms
+
+    def versions(self) -> Dict[str, Dict]:
+        """First & last time each version was served, in order of appearance"""
+        versions = {}
+        for p in sorted(self.probes, key=lambda p: p.sent):
+            if p.failed:
+                continue
+            v = versions.setdefault(
+                p.version, {'first_seen': p.sent, 'last_seen': p.sent, 'probes': 0}
+            )
+            v['last_seen'] = p.sent
+            v['probes'] += 1
+        return versions
+
+    def transitions(self) -> List[Tuple[float, int, Optional[str], Optional[str]]]:
+        """(time, stream, from, to) each time a stream saw a different version"""
+        transitions, last = [], {}
+        for p in sorted(self.probes, key=lambda p: p.sent):
+            if p.failed:
+                continue
+            if p.stream in last and last[p.stream] != p.version:
+                transitions.append((p.sent, p.stream, last[p.stream], p.version))
+            last[p.stream] = p.version
+        return transitions
+
+    def rollbacks(self) -> List[Tuple[float, int, Optional[str], Optional[str]]]:
+        """Transitions back to a version that appeared earlier, e.g. a stream served by
+        an old replica again after a new one"""
+        order = {v: i for i, v in enumerate(self.versions())}
+        return [t for t in self.transitions() if order[t[3]] < order[t[2]]]
+
+    def _probe_dict(self, p: Probe) -> Dict:
+        return {
+            'time': datetime.fromtimestamp(self.started_at + p.sent).isoformat(),
+            'offset_s': round(p.sent, 3),
+            'stream': p.stream,
+            'latency_ms': round(p.latency * 1000, 2),
+            'status': p.status,
+            'version': p.version,
+            'error': p.error,
+        }
+
+    def to_dict(self) -> Dict:
+        latencies = self.latencies()
+        phases = {}
+        for phase in PHASES:
+            probes = [p for p in self.probes if self.phase(p) == phase]
+            phases[phase] = {
+                'probes': len(probes),
+                'failed': sum(p.failed for p in probes),
+                'latency': latencies[phase].to_dict(),
+            }
+        return {
+            'url': self.url,
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(),
+            'upgrade_start_s': self.upgrade_start,
+            'upgrade_end_s': self.upgrade_end,
+            'probes': len(self.probes),
+            'failed': len(self.failures),
+            'failed_seconds': round(self.failed_seconds, 3),
+            'slow_ms': self.slow_ms,
+            'phases': phases,
+            'versions': self.versions(),
+            'transitions': [
+                {'offset_s': round(t, 3), 'stream': s, 'from': a, 'to': b}
+                for t, s, a, b in self.transitions()
+            ],
+            'failures': [self._probe_dict(p) for p in self.failures],
+            'slow': [self._probe_dict(p) for p in self.slow],
+        }
+
+
+class Prober:
+    """Runs `streams` concurrent probe loops against `url` until stopped"""
+
+    def __init__(
+        self,
+        url: str,
+        streams: int = 8,
+        interval: float = 0.05,
+        timeout: float = 5,
+        version_field: str = 'version',
+        slow_ms: float = 1000,
+    ):
+        self.url = url
+        self.streams = streams
+        self.interval = interval
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.version_field = version_field
+        self.report = UpgradeReport(url=url, started_at=time.time(), slow_ms=slow_ms)
+        self._start = time.perf_counter()
+        self._stop = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def now(self) -> float:
+        return time.perf_counter() - self._start
+
+    async def _probe(self, stream: int) -> Probe:
+        sent = self.now()
+        status, version, error = None, None, None
+        try:
+            async with self._session.get(self.url, timeout=self.timeout) as r:
+                status = r.status
+                body = await r.read()
+            if status >= 400:
+                error = f'HTTP {status}'
+            else:
+                try:
+                    version = _get_field(json.loads(body), self.version_field)
+                except ValueError:
+                    pass
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = _error_key(e)
+        return Probe(stream, sent, self.now() - sent, status, version, error)
+
+    async def _stream(self, stream: int):
+        while not self._stop.is_set():
+            probe = await self._probe(stream)
+            self.report.probes.append(probe)
+            await asyncio.sleep(max(self.interval - probe.latency, 0))
+
+    async def start(self):
+        # a connection per stream, kept alive
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.streams)
+        )
+        self._start = time.perf_counter()
+        self.report.started_at = time.time()
+        self._tasks = [
+            asyncio.create_task(self._stream(i)) for i in range(self.streams)
+        ]
+
+    async def stop(self) -> UpgradeReport:
+        self._stop.set()
+        await asyncio.gather(*self._tasks)
+        if self._session is not None:
+            await self._session.close()
+        return self.report
+
+
+async def _wait_until_settled(prober: Prober, settle: float, stop: asyncio.Event):
+    """Until only a version other than the initial one was served, without failures,
+    for `settle` seconds"""
+    initial = None
+    while not stop.is_set():
+        await asyncio.sleep(0.2)
+        probes = prober.report.probes
+        if initial is None:
+            initial = next((p.version for p in probes if not p.failed), None)
+            continue
+        recent = [p for p in probes if p.sent >= prober.now() - settle]
+        changed = any(p.version != initial for p in probes if not p.failed)
+        if (
+            changed
+            and prober.now() - probes[0].sent > settle
+            and all(not p.failed and p.version != initial for p in recent)
+        ):
+            return
+
+
+async def _sleep_or_stop(seconds: float, stop: asyncio.Event):
+    try:
+        await asyncio.wait_for(stop.wait(), timeout=seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def _upgrade_with_command(command: str):
+    process = await asyncio.create_subprocess_shell(command)
+    return await process.wait()
+
+
+async def run_verify_upgrade(
+    url: str = None,
+    app: str = None,
+    to: str = None,
+    path: str = '/healthz',
+    streams: int = 8,
+    interval: float = 0.05,
+    timeout: float = 5,
+    slow_ms: float = 1000,
+    version_field: str = 'version',
+    warmup: float = 5,
+    settle: float = 5,
+    duration: float = None,
+    command: str = None,
+    replicas: int = 2,
+    workers: int = 1,
+    direct: bool = False,
+    env: str = None,
+    startup_timeout: float = 600,
+) -> UpgradeReport:
+    from fastapi_serve.helper import get_free_port
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    local, proxy = None, None
+    if app is not None:
+        from fastapi_serve.cloud.deploy import LocalReplicas
+        from fastapi_serve.gateway.proxy import ReverseProxy
+
+        local = LocalReplicas(
+            app=app,
+            replicas=replicas,
+            env=env,
+            workers=workers,
+            direct=direct,
+            startup_timeout=startup_timeout,
+        )
+        local.start()
+        port = get_free_port()
+        proxy = ReverseProxy(
+            local.upstreams, logger=local.logger, on_health_check=local.restart_dead
+        )
+        await proxy.start(host='127.0.0.1', port=port)
+        url = f'http://127.0.0.1:{port}'
+
+    prober = Prober(
+        url.rstrip('/') + '/' + path.lstrip('/'),
+        streams=streams,
+        interval=interval,
+        timeout=timeout,
+        version_field=version_field,
+        slow_ms=slow_ms,
+    )
+    report = prober.report
+    try:
+        if proxy is not None:
+            await proxy.wait_until_healthy(startup_timeout)
+
+        await prober.start()
+        await _sleep_or_stop(warmup, stop)
+        if stop.is_set():
+            return report
+
+        if local is not None or command is not None:
+            report.upgrade_start = prober.now()
+            if local is not None:
+                upgrade = local.rolling_restart(proxy, app=to)
+            else:
+                upgrade = _upgrade_with_command(command)
+            _, pending = await asyncio.wait(
+                [asyncio.ensure_future(upgrade), asyncio.ensure_future(stop.wait())],
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in pending:
+                task.cancel()
+            report.upgrade_end = prober.now()
+            await _sleep_or_stop(settle, stop)
+        else:
+            try:
+                await asyncio.wait_for(
+                    _wait_until_settled(prober, settle, stop), timeout=duration
+                )
+            except asyncio.TimeoutError:
+                pass
+
+        await prober.stop()
+        if report.upgrade_start is None:
+            report.infer_upgrade_window()
+        return report
+    finally:
+        await prober.stop()
+        if proxy is not None:
+            await proxy.stop()
+        if local is not None:
+            await loop.run_in_executor(None, local.stop)
+
+
+def print_report(report: UpgradeReport, limit: int = 20):
+    from rich import box
+    from rich.console import Console
+    from rich.table import Table
+
+    console = Console()
+    summary = report.to_dict()
+
+    _t = Table(
+        'Phase',
+        'Probes',
+        'Failed',
+        *[f'p{q:g}' for q in PERCENTILES],
+        'Max',
+        box=box.ROUNDED,
+        title=f'{report.url}',
+    )
+    for phase in PHASES:
+        p = summary['phases'][phase]
+        if not p['probes']:
+            continue
+        latency = p['latency']
+        _t.add_row(
+            phase,
+            str(p['probes']),
+            f'[red]{p["failed"]}[/red]' if p['failed'] else '0',
+            *[f'{latency[f"p{q:g}_ms"]:.1f} ms' for q in PERCENTILES],
+            f'{latency["max_ms"]:.1f} ms',
+        )
+    console.print(_t)
+    if report.upgrade_start is not None:
+        console.print(
+            f'Upgrade from {report.upgrade_start:.2f} s to '
+            f'{report.upgrade_end:.2f} s after the start'
+        )
+
+    _t = Table(
+        'Version',
+        'First seen',
+        'Last seen',
+        'Probes',
+        box=box.ROUNDED,
+        title='Versions',
+    )
+    for version, v in summary['versions'].items():
+        _t.add_row(
+            str(version),
+            f'{v["first_seen"]:.2f} s',
+            f'{v["last_seen"]:.2f} s',
+            str(v['probes']),
+        )
+    console.print(_t)
+    rollbacks = report.rollbacks()
+    if rollbacks:
+        console.print(
+            f'[yellow]{len(rollbacks)} probe(s) were served an older version after a newer one[/yellow]'
+        )
+
+    for kind, probes in (('Failed', summary['failures']), ('Slow', summary['slow'])):
+        if not probes:
+            continue
+        _t = Table(
+            'Time',
+            'Offset',
+            'Stream',
+            'Latency',
+            'Status',
+            'Error',
+            box=box.ROUNDED,
+            title=f'{kind} requests ({len(probes)})',
+        )
+        for p in probes[:limit]:
+            _t.add_row(
+                p['time'],
+                f'{p["offset_s"]:.2f} s',
+                str(p['stream']),
+                f'{p["latency_ms"]:.1f} ms',
+                str(p['status'] or ''),
+                p['error'] or '',
+            )
+        if len(probes) > limit:
+            _t.add_row('...', '', '', '', '', f'{len(probes) - limit} more')
+        console.print(_t)
+
+    if report.failures:
+        console.print(
+            f'[red]{len(report.failures)} failed probe(s), failing for {report.failed_seconds:.2f} s[/red]'
+        )
+    else:
+        console.print(f'[green]No failed probe out of {len(report.probes)}[/green]')
+
+
+def verify_upgrade(output: str = None, **kwargs) -> UpgradeReport:
+    report = asyncio.run(run_verify_upgrade(**kwargs))
+    print_report(report)
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(report.to_dict(), f, indent=2)
+    return report
@@ -1,2 +1,23 @@
-from .auth import JinaAPIKeyHeader, JinaAuthDependency, JinaAuthMiddleware
-from .blob import JinaBlobStorage
+_LAZY_IMPORTS = {
+    'Batcher': '.batching',
+    'Bulkhead': '.bulkhead',
+    'JinaAPIKeyHeader': '.auth',
+    'JinaAuthDependency': '.auth',
+    'JinaAuthMiddleware': '.auth',
+    'JinaBlobStorage': '.blob',
+    'ProcessPool': '.offload',
+    'cache_response': '.cache',
+    'offload': '.offload',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        import importlib
+
+        return getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_IMPORTS))
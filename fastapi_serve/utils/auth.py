@@ -7,7 +7,7 @@ from starlette.requests import Request
 from starlette.responses import JSONResponse
 from starlette.types import ASGIApp
 
-from fastapi_serve.utils.helper import authorize
+from fastapi_serve.utils.helper import authorize_async
 
 
 class JinaAuthBase:
@@ -42,7 +42,7 @@ class JinaAuthBase:
                     detail='Invalid scheme',
                 )
 
-            if not authorize(token):
+            if not await authorize_async(token):
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail='Invalid token',
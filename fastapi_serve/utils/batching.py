@@ -0,0 +1,206 @@
+import asyncio
+import functools
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set
+
+from anyio import to_thread
+
+if TYPE_CHECKING:
+    from opentelemetry.metrics import Meter
+
+
+_BATCHERS: Dict[str, "Batcher"] = {}
+_INSTRUMENTS: Dict[str, object] = {}
+
+
+class Batcher:
+    """Collects concurrent calls into batches, so that a vectorized model runs one
+    forward pass for many requests rather than one each.
+
+    Calls are queued until `max_batch_size` of them are waiting, or the oldest has
+    waited `max_wait_ms`. The batch function is then called once with the list of
+    their items, and must return one result per item, in order. At most
+    `max_concurrent_batches` batches run at once, calls keep queuing meanwhile and
+    form the next batch::
+
+        embedder = Batcher('embed', max_batch_size=32, max_wait_ms=5)
+
+        @embedder
+        async def embed(texts: List[str]) -> List[List[float]]:
+            return model.encode(texts).tolist()
+
+        @app.post('/embed')
+        async def endpoint(text: str):
+            return await embed(text)
+
+    Sync batch functions run on a thread, stack `@offload` under the batcher to run
+    them in a process pool instead.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 10,
+        max_concurrent_batches: int = 1,
+    ):
+        if max_batch_size < 1:
+            raise ValueError(f'max_batch_size must be at least 1, got {max_batch_size}')
+        if max_concurrent_batches < 1:
+            raise ValueError(
+                'max_concurrent_batches must be at least 1, got '
+                f'{max_concurrent_batches}'
+            )
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_concurrent_batches = max_concurrent_batches
+        self.batches = 0
+        self.calls = 0
+        self.failed = 0
+        self.largest = 0
+        self.wait_seconds = 0.0
+        self.running = 0
+        self._func: Optional[Callable] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # (item, future, queued at)
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        _BATCHERS[name] = self
+
+    @property
+    def queued(self) -> int:
+        return len(self._pending)
+
+    def _record(self, instrument: str, amount: float):
+        if instrument in _INSTRUMENTS:
+            from fastapi_serve.gateway.workers import worker_attributes
+
+            attributes = {'batcher': self.name, **worker_attributes()}
+            _INSTRUMENTS[instrument].record(amount, attributes)
+
+    def _schedule(self):
+        """Flush when the oldest pending call has waited long enough, or right away
+        if a full batch is waiting"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        if len(self._pending) >= self.max_batch_size:
+            delay = 0
+        else:
+            deadline = self._pending[0][2] + self.max_wait_ms / 1000
+            delay = max(deadline - self._loop.time(), 0)
+        self._timer = self._loop.call_later(delay, self._flush)
+
+    def _flush(self):
+        self._timer = None
+        if self.running >= self.max_concurrent_batches:
+            # picked up once a running batch is done
+            return
+
+        batch = self._pending[: self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size :]
+        # callers that gave up (e.g. disconnected) are left out
+        batch = [entry for entry in batch if not entry[1].done()]
+        if batch:
+            self.running += 1
+            task = self._loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        self._schedule()
+
+    async def _call(self, items: List[Any]) -> List[Any]:
+        if asyncio.iscoroutinefunction(self._func):
+            return await self._func(items)
+        return await to_thread.run_sync(self._func, items)
+
+    async def _run(self, batch: List[tuple]):
+        wait = self._loop.time() - batch[0][2]
+        self.batches += 1
+        self.calls += len(batch)
+        self.largest = max(self.largest, len(batch))
+        self.wait_seconds += wait
+        self._record('size', len(batch))
+        self._record('wait', wait * 1000)
+
+        try:
+            results = await self._call([item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(
+                    f'Batch function of {self.name!r} returned {len(results)} results '
+                    f'for {len(batch)} items'
+                )
+        except asyncio.CancelledError:
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            self.failed += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self.running -= 1
+            self._schedule()
+
+    async def submit(self, item: Any) -> Any:
+        """Queue `item` for the next batch & wait for its result"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # a fresh loop (e.g. a new worker), nothing pending can complete on it
+            self._loop, self._pending, self._timer = loop, [], None
+            self.running = 0
+
+        future = loop.create_future()
+        self._pending.append((item, future, loop.time()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif len(self._pending) == 1:
+            self._schedule()
+        return await future
+
+    def __call__(self, func: Callable) -> Callable:
+        self._func = func
+
+        @functools.wraps(func)
+        async def wrapper(item):
+            return await self.submit(item)
+
+        wrapper.batcher = self
+        return wrapper
+
+    def stats(self) -> Dict:
+        return {
+            'max_batch_size': self.max_batch_size,
+            'batches': self.batches,
+            'queued': self.queued,
+            'running': self.running,
+            'failed': self.failed,
+            'mean_size': round(self.calls / max(self.batches, 1), 3),
+            'largest': self.largest,
+            'mean_wait_ms': round(self.wait_seconds / max(self.batches, 1) * 1000, 3),
+        }
+
+
+def get_batchers() -> Dict[str, Batcher]:
+    return dict(_BATCHERS)
+
+
+def setup_batch_metrics(meter: "Meter"):
+    if not _BATCHERS:
+        return
+    _INSTRUMENTS['size'] = meter.create_histogram(
+        name='fastapi_serve_batch_size',
+        description='FastAPI-serve Number of calls per batch',
+    )
+    _INSTRUMENTS['wait'] = meter.create_histogram(
+        name='fastapi_serve_batch_wait',
+        description='FastAPI-serve Time the oldest call of a batch waited for it',
+        unit='ms',
+    )
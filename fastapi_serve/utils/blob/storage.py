@@ -1,10 +1,14 @@
+from functools import partial
 from io import BytesIO
 from typing import Dict, Union
 
 from fastapi import UploadFile as FastAPIUploadFile
 from hubble import Client
+from starlette.concurrency import run_in_threadpool
 from starlette.datastructures import UploadFile as StarletteUploadFile
 
+from fastapi_serve.client import run_with_retries
+
 JINAAI_PREFIX = 'jinaai://'
 
 
@@ -13,7 +17,8 @@ class InvalidURI(Exception):
 
 
 class JinaBlobStorage:
-    # TODO: add support for real-async for hubble client
+    # The hubble client is blocking, calls run in a thread to keep the event loop free.
+    # Only idempotent calls are retried.
     @staticmethod
     async def upload(
         file: Union[str, BytesIO, FastAPIUploadFile, StarletteUploadFile],
@@ -28,7 +33,8 @@ class JinaBlobStorage:
         if '.' in name:
             name = name[: name.rfind('.')]
 
-        r = Client().upload_artifact(
+        r = await run_in_threadpool(
+            Client().upload_artifact,
             f=file,
             name=name,
             metadata=metadata,
@@ -47,7 +53,7 @@ class JinaBlobStorage:
             raise InvalidURI(f'Invalid uri: {uri}')
 
         _id = uri.replace(JINAAI_PREFIX, '')
-        Client().download_artifact(id=_id, f=file)
+        await run_in_threadpool(Client().download_artifact, id=_id, f=file)
         print(f'Downloaded artifact to {file}')
 
     @staticmethod
@@ -57,14 +63,14 @@ class JinaBlobStorage:
 
         _id = uri.replace(JINAAI_PREFIX, '')
 
-        r = Client().get_artifact_info(id=_id)
+        r = await run_with_retries(partial(Client().get_artifact_info, id=_id))
         r.raise_for_status()
         return r.json().get('data', {})
 
     @staticmethod
     async def list() -> Dict:
         # TODO: add filters
-        r = Client().list_artifacts()
+        r = await run_with_retries(Client().list_artifacts)
         r.raise_for_status()
         return r.json().get('data', {})
 
@@ -74,6 +80,6 @@ class JinaBlobStorage:
             raise InvalidURI(f'Invalid uri: {uri}')
 
         _id = uri.replace(JINAAI_PREFIX, '')
-        r = Client().delete_artifact(id=_id)
+        r = await run_in_threadpool(Client().delete_artifact, id=_id)
         r.raise_for_status()
         print(f'Deleted artifact with id {_id}')
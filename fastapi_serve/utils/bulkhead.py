@@ -0,0 +1,284 @@
+import asyncio
+import functools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from fnmatch import fnmatch
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from anyio import CapacityLimiter, to_thread
+
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+    from opentelemetry.metrics import Meter
+    from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+# by name, so that `jcloud.yml` can resize the bulkheads defined in code
+_BULKHEADS: Dict[str, "Bulkhead"] = {}
+# set once metrics are configured, shared by all the bulkheads
+_INSTRUMENTS: Dict[str, object] = {}
+# threads of the bulkhead the current request was routed to by `BulkheadMiddleware`
+_LIMITER: ContextVar[Optional[CapacityLimiter]] = ContextVar(
+    'fastapi_serve_bulkhead_limiter', default=None
+)
+# modules of FastAPI running sync endpoints (routing) & dependencies (utils) with
+# starlette's `run_in_threadpool`
+_THREADPOOL_CALLERS = ('fastapi.routing', 'fastapi.dependencies.utils')
+
+
+class BulkheadFull(Exception):
+    def __init__(self, name: str):
+        super().__init__(f'Bulkhead {name!r} is full')
+        self.name = name
+
+
+class Bulkhead:
+    """A bounded pool for blocking work, so that a slow sync route can't starve the
+    others of the default thread pool they all share.
+
+    At most `threads` calls run at once, up to `max_queue` more wait for a thread and
+    the rest are rejected with 503. Use it as a decorator on sync `def` endpoints, which
+    then run on its own threads::
+
+        reports = Bulkhead('reports', threads=4, max_queue=16)
+
+        @app.get('/report')
+        @reports
+        def report():
+            ...
+
+    or route requests to it from `jcloud.yml` (see `server.bulkheads`).
+    """
+
+    def __init__(self, name: str, threads: int = 4, max_queue: Optional[int] = None):
+        self.name = name
+        self.threads = threads
+        self.max_queue = max_queue
+        self.active = 0
+        self.queued = 0
+        self.rejected = 0
+        self.completed = 0
+        self.wait_seconds = 0.0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._limiter = CapacityLimiter(threads)
+        if name in _BULKHEADS:
+            # its endpoints would silently move to this one's threads
+            raise ValueError(
+                f'Bulkhead {name!r} already exists, use `get_bulkheads()[{name!r}]`'
+            )
+        _BULKHEADS[name] = self
+
+    def resize(self, threads: Optional[int] = None, max_queue: Optional[int] = None):
+        """Must be called before the bulkhead is used"""
+        if threads is not None:
+            self.threads = threads
+            self._limiter.total_tokens = threads
+            self._semaphore = None
+        if max_queue is not None:
+            self.max_queue = max_queue
+
+    def _record(self, instrument: str, amount: float):
+        if instrument in _INSTRUMENTS:
+            from fastapi_serve.gateway.workers import worker_attributes
+
+            attributes = {'bulkhead': self.name, **worker_attributes()}
+            if instrument == 'wait':
+                _INSTRUMENTS[instrument].record(amount, attributes)
+            else:
+                _INSTRUMENTS[instrument].add(amount, attributes)
+
+    async def acquire(self):
+        """Wait for one of the `threads` slots, raises `BulkheadFull` if too many calls
+        wait already"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.threads)
+        if (
+            self.max_queue is not None
+            and self._semaphore.locked()
+            and self.queued >= self.max_queue
+        ):
+            self.rejected += 1
+            raise BulkheadFull(self.name)
+
+        start = time.perf_counter()
+        self.queued += 1
+        self._record('queued', 1)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+            self._record('queued', -1)
+        wait = time.perf_counter() - start
+        self.wait_seconds += wait
+        self._record('wait', wait * 1000)
+        self.active += 1
+        self._record('active', 1)
+
+    def release(self):
+        self.active -= 1
+        self.completed += 1
+        self._record('active', -1)
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def __call__(self, func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            raise TypeError(
+                f'{func.__name__} is async, only sync functions run on a bulkhead'
+            )
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            from fastapi import HTTPException
+
+            try:
+                async with self.slot():
+                    return await to_thread.run_sync(
+                        functools.partial(func, *args, **kwargs), limiter=self._limiter
+                    )
+            except BulkheadFull as e:
+                raise HTTPException(
+                    status_code=503, detail=str(e), headers={'Retry-After': '1'}
+                )
+
+        return wrapper
+
+    def stats(self) -> Dict:
+        return {
+            'threads': self.threads,
+            'active': self.active,
+            'queued': self.queued,
+            'rejected': self.rejected,
+            'mean_wait_ms': round(
+                self.wait_seconds / max(self.completed + self.active, 1) * 1000, 3
+            ),
+        }
+
+
+def get_bulkheads() -> Dict[str, Bulkhead]:
+    return dict(_BULKHEADS)
+
+
+async def run_in_threadpool(func: Callable, *args, **kwargs):
+    """Like starlette's, which FastAPI runs sync endpoints & dependencies with, but on
+    the threads of the request's bulkhead if it has one"""
+    return await to_thread.run_sync(
+        functools.partial(func, *args, **kwargs), limiter=_LIMITER.get()
+    )
+
+
+def _use_request_threadpool():
+    """Make FastAPI run sync endpoints & dependencies with `run_in_threadpool`, so that
+    the limiter is picked per request"""
+    import importlib
+
+    from starlette import concurrency
+
+    modules = [importlib.import_module(name) for name in _THREADPOOL_CALLERS]
+    for module in modules:
+        if getattr(module, 'run_in_threadpool', None) not in (
+            run_in_threadpool,
+            concurrency.run_in_threadpool,
+        ):
+            raise RuntimeError(
+                f'{module.__name__} no longer uses starlette\'s `run_in_threadpool`, '
+                'bulkheads from `server.bulkheads` are not supported with this FastAPI'
+            )
+    for module in modules:
+        module.run_in_threadpool = run_in_threadpool
+
+
+class BulkheadMiddleware:
+    """Admits the requests to routes matching a pattern (e.g. `/reports/*`) through the
+    pattern's bulkhead, whose threads then run their sync endpoints & dependencies."""
+
+    def __init__(self, app: "ASGIApp", routes: List[Tuple[str, Bulkhead]]):
+        self.app = app
+        self.routes = routes
+
+    def _match(self, path: str) -> Optional[Bulkhead]:
+        for pattern, bulkhead in self.routes:
+            if fnmatch(path, pattern):
+                return bulkhead
+        return None
+
+    async def __call__(self, scope: "Scope", receive: "Receive", send: "Send") -> None:
+        bulkhead = self._match(scope['path']) if scope['type'] == 'http' else None
+        if bulkhead is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await bulkhead.acquire()
+        except BulkheadFull as e:
+            await send(
+                {
+                    'type': 'http.response.start',
+                    'status': 503,
+                    'headers': [
+                        (b'content-type', b'application/json'),
+                        (b'retry-after', b'1'),
+                    ],
+                }
+            )
+            await send(
+                {
+                    'type': 'http.response.body',
+                    'body': f'{{"detail":"{e}"}}'.encode(),
+                }
+            )
+            return
+
+        token = _LIMITER.set(bulkhead._limiter)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _LIMITER.reset(token)
+            bulkhead.release()
+
+
+def setup_bulkhead_metrics(meter: "Meter"):
+    if not _BULKHEADS:
+        return
+    _INSTRUMENTS['active'] = meter.create_up_down_counter(
+        name='fastapi_serve_bulkhead_active',
+        description='FastAPI-serve Calls running on a bulkhead',
+    )
+    _INSTRUMENTS['queued'] = meter.create_up_down_counter(
+        name='fastapi_serve_bulkhead_queued',
+        description='FastAPI-serve Calls waiting for a bulkhead thread',
+    )
+    _INSTRUMENTS['wait'] = meter.create_histogram(
+        name='fastapi_serve_bulkhead_wait',
+        description='FastAPI-serve Time spent waiting for a bulkhead thread',
+        unit='ms',
+    )
+
+
+def configure_bulkheads(app: "FastAPI", bulkheads: Optional[Dict[str, Dict]] = None):
+    """Create (or resize, if defined in code) the `bulkheads` of `server.bulkheads` and
+    route the requests matching their `routes` through them"""
+    routes = []
+    for name, spec in (bulkheads or {}).items():
+        if name in _BULKHEADS:
+            bulkhead = _BULKHEADS[name]
+            bulkhead.resize(
+                threads=spec.get('threads'), max_queue=spec.get('max_queue')
+            )
+        else:
+            bulkhead = Bulkhead(
+                name, threads=spec.get('threads', 4), max_queue=spec.get('max_queue')
+            )
+        routes += [(pattern, bulkhead) for pattern in spec.get('routes', [])]
+
+    if routes:
+        _use_request_threadpool()
+        app.add_middleware(BulkheadMiddleware, routes=routes)
@@ -0,0 +1,535 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from fnmatch import fnmatch
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl
+
+if TYPE_CHECKING:
+    from re import Pattern
+
+    from fastapi import FastAPI
+    from opentelemetry.metrics import Meter
+    from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+DEFAULT_MAX_MEMORY = 64  # MiB
+_POLICY_ATTR = '__fastapi_serve_cache__'
+
+# endpoints decorated with `cache_response`, the cache is only set up if there are any
+_DECORATED: List[Callable] = []
+_CACHES: List["ResponseCache"] = []
+_INSTRUMENTS: Dict[str, object] = {}
+# `ResponseCache` counter -> `result` attribute of the metric
+_RESULTS = {'hits': 'hit', 'stale': 'stale', 'misses': 'miss'}
+
+
+def is_valid_vary(item) -> bool:
+    """`query`, `user`, `query:<name>` or `header:<name>`"""
+    if not isinstance(item, str):
+        return False
+    if item in ('query', 'user'):
+        return True
+    kind, _, name = item.partition(':')
+    return kind in ('query', 'header') and bool(name)
+
+
+class CachePolicy:
+    """How long responses of a route are cached, and what tells them apart besides the
+    path (and so the path params)"""
+
+    def __init__(
+        self,
+        ttl: float = 60,
+        stale_while_revalidate: float = 0,
+        vary: Sequence[str] = ('query',),
+    ):
+        invalid = [item for item in vary if not is_valid_vary(item)]
+        if invalid:
+            raise ValueError(
+                f'Invalid vary {invalid}, expected query, user, '
+                'query:<name> or header:<name>'
+            )
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.vary = tuple(item.lower() for item in vary)
+
+    def key(self, scope: "Scope", headers: Dict[str, str]) -> Tuple:
+        key = [scope['path']]
+        query = None
+        for item in self.vary:
+            if item.startswith('query'):
+                if query is None:
+                    query = parse_qsl(
+                        scope.get('query_string', b'').decode('latin-1'),
+                        keep_blank_values=True,
+                    )
+                name = item[len('query:') :]
+                key.append(
+                    tuple(sorted(query))
+                    if not name
+                    else tuple(v for k, v in query if k == name)
+                )
+            elif item == 'user':
+                key.append(_user(headers))
+            else:
+                key.append(headers.get(item[len('header:') :]))
+        return tuple(key)
+
+    @property
+    def vary_headers(self) -> List[str]:
+        """Request headers the responses depend on, for the `Vary` response header"""
+        names = []
+        for item in self.vary:
+            if item == 'user':
+                names.append('authorization')
+            elif item.startswith('header:'):
+                names.append(item[len('header:') :])
+        return list(dict.fromkeys(names))
+
+
+def cache_response(
+    ttl: float = 60,
+    stale_while_revalidate: float = 0,
+    vary: Sequence[str] = ('query',),
+) -> Callable:
+    """Cache the responses of a `GET` endpoint for `ttl` seconds, in each worker::
+
+        @app.get('/products/{id}')
+        @cache_response(ttl=60, stale_while_revalidate=300, vary=['query', 'user'])
+        async def product(id: int):
+            ...
+
+    Past `ttl`, the stale response is still served for `stale_while_revalidate`
+    seconds while it's refreshed in the background.
+    """
+    policy = CachePolicy(ttl, stale_while_revalidate, vary)
+
+    def decorator(func: Callable) -> Callable:
+        setattr(func, _POLICY_ATTR, policy)
+        _DECORATED.append(func)
+        return func
+
+    return decorator
+
+
+def _user(headers: Dict[str, str]) -> Optional[str]:
+    # the credentials identify the user, without keeping them around in clear
+    authorization = headers.get('authorization')
+    if authorization is None:
+        return None
+    return hashlib.sha256(authorization.encode('latin-1')).hexdigest()
+
+
+def _headers(raw: List[Tuple[bytes, bytes]]) -> Dict[str, str]:
+    headers = {}
+    for name, value in raw:
+        name, value = name.decode('latin-1').lower(), value.decode('latin-1')
+        headers[name] = f'{headers[name]}, {value}' if name in headers else value
+    return headers
+
+
+def _timestamp(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(parsedate_to_datetime(value).timestamp())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class _Entry:
+    __slots__ = (
+        'headers',
+        'body',
+        'etag',
+        'last_modified',
+        'stored',
+        'fresh_until',
+        'stale_until',
+    )
+
+    def __init__(self, headers, body, etag, last_modified, ttl, stale_while_revalidate):
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored = time.monotonic()
+        self.fresh_until = self.stored + ttl
+        self.stale_until = self.fresh_until + stale_while_revalidate
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers)
+
+    def not_modified(self, headers: Dict[str, str]) -> bool:
+        """Whether the client's copy, per its conditional headers, is this one"""
+        if_none_match = headers.get('if-none-match')
+        if if_none_match is not None:
+            if if_none_match.strip() == '*':
+                return True
+            # weak comparison, as for `GET`
+            tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            return self.etag.removeprefix('W/') in tags
+        since = _timestamp(headers.get('if-modified-since'))
+        return since is not None and self.last_modified <= since
+
+
+class ResponseCache:
+    """Responses by key, least recently used first, evicted past `max_bytes`"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_MEMORY * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # a single response can't take more than a fraction of the cache
+        self.max_entry_bytes = max(max_bytes // 8, 1)
+        self.bytes = 0
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        _CACHES.append(self)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry.stale_until:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Tuple, entry: _Entry):
+        if entry.size > self.max_entry_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.bytes += entry.size
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: Tuple):
+        self.bytes -= self._entries.pop(key).size
+
+    def stats(self) -> Dict:
+        served = self.hits + self.stale + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'stale': self.stale,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'evictions': self.evictions,
+            'hit_ratio': round((self.hits + self.stale) / max(served, 1), 3),
+        }
+
+
+def _with_vary(message: "Message", policy: CachePolicy) -> "Message":
+    """Add the request headers `policy` varies on to the `Vary` of a response"""
+    names = policy.vary_headers
+    if not names:
+        return message
+    headers = [(k, v) for k, v in message.get('headers', []) if k.lower() != b'vary']
+    vary = _headers(message.get('headers', [])).get('vary')
+    if vary == '*':
+        return message
+    current = [v.strip() for v in vary.split(',') if v.strip()] if vary else []
+    known = {v.lower() for v in current}
+    current += [name for name in names if name not in known]
+    headers.append((b'vary', ', '.join(current).encode('latin-1')))
+    return {**message, 'headers': headers}
+
+
+def _storable(message: "Message") -> bool:
+    if message['status'] != 200:
+        return False
+    headers = _headers(message.get('headers', []))
+    cache_control = headers.get('cache-control', '')
+    return (
+        'set-cookie' not in headers
+        and headers.get('vary') != '*'
+        and not any(d in cache_control for d in ('no-store', 'no-cache', 'private'))
+    )
+
+
+class ResponseCacheMiddleware:
+    """Serves `GET` requests from the cache, for routes matching a pattern of
+    `server.response_cache` or whose endpoint is decorated with `cache_response`.
+
+    Decorated endpoints are only known once a request has been routed to them, so
+    the first response of each of their routes is a miss that teaches the middleware
+    the route."""
+
+    def __init__(
+        self,
+        app: "ASGIApp",
+        cache: ResponseCache,
+        routes: Optional[List[Tuple[str, CachePolicy]]] = None,
+    ):
+        self.app = app
+        self.cache = cache
+        self.routes = routes or []
+        # route path -> regex & policy of decorated endpoints, learned from requests
+        self._learned: Dict[str, Tuple["Pattern", CachePolicy]] = {}
+        self._refreshing = set()
+        self._tasks = set()
+
+    def _match(self, scope: "Scope") -> Tuple[Optional[CachePolicy], Optional[str]]:
+        path = scope['path']
+        for pattern, policy in self.routes:
+            if fnmatch(path, pattern):
+                return policy, pattern
+        for route, (regex, policy) in self._learned.items():
+            if regex.match(path):
+                return policy, route
+        return None, None
+
+    def _learn(self, scope: "Scope") -> Tuple[Optional[CachePolicy], Optional[str]]:
+        policy = getattr(scope.get('endpoint'), _POLICY_ATTR, None)
+        route = scope.get('route')
+        if policy is None or not hasattr(route, 'path_regex'):
+            return None, None
+        self._learned[route.path] = (route.path_regex, policy)
+        return policy, route.path
+
+    def _record(self, route: str, result: str):
+        setattr(self.cache, result, getattr(self.cache, result) + 1)
+        if 'requests' in _INSTRUMENTS:
+            from fastapi_serve.gateway.workers import worker_attributes
+
+            _INSTRUMENTS['requests'].add(
+                1,
+                {
+                    'route': route,
+                    'result': _RESULTS[result],
+                    **worker_attributes(),
+                },
+            )
+
+    async def __call__(self, scope: "Scope", receive: "Receive", send: "Send") -> None:
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            await self.app(scope, receive, send)
+            return
+
+        headers = _headers(scope['headers'])
+        cache_control = headers.get('cache-control', '')
+        policy, route = self._match(scope)
+        if policy is not None:
+            if not self._cacheable(policy, headers):
+                await self.app(scope, receive, send)
+                return
+
+            key = policy.key(scope, headers)
+            entry = None if 'no-cache' in cache_control else self.cache.get(key)
+            if entry is not None:
+                if time.monotonic() < entry.fresh_until:
+                    self._record(route, 'hits')
+                else:
+                    self._record(route, 'stale')
+                    self._revalidate(scope, key, policy)
+                await self._respond(entry, headers, send)
+                return
+
+        await self._forward(scope, receive, send, headers, policy, route)
+
+    @staticmethod
+    def _cacheable(policy: CachePolicy, headers: Dict[str, str]) -> bool:
+        # as for shared HTTP caches, responses to authorized requests are the user's
+        if 'authorization' in headers and 'user' not in policy.vary:
+            return False
+        return 'no-store' not in headers.get('cache-control', '')
+
+    async def _forward(
+        self,
+        scope: "Scope",
+        receive: "Receive",
+        send: "Send",
+        headers: Dict[str, str],
+        policy: Optional[CachePolicy],
+        route: Optional[str],
+    ):
+        """Call the app & cache the response if it can be, buffering it until then"""
+        start: Optional["Message"] = None
+        chunks: List[bytes] = []
+        size = 0
+        passthrough = False
+
+        async def _send(message: "Message"):
+            nonlocal policy, route, start, size, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message['type'] == 'http.response.start':
+                if policy is None:
+                    policy, route = self._learn(scope)
+                    if policy is not None and not self._cacheable(policy, headers):
+                        policy = None
+                if policy is not None:
+                    self._record(route, 'misses')
+                if policy is not None:
+                    message = _with_vary(message, policy)
+                if policy is None or not _storable(message):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+
+            chunks.append(message.get('body', b''))
+            size += len(chunks[-1])
+            if size > self.cache.max_entry_bytes:
+                # too large to cache, stream the rest
+                passthrough = True
+                await send(start)
+                await send(
+                    {
+                        'type': 'http.response.body',
+                        'body': b''.join(chunks),
+                        'more_body': message.get('more_body', False),
+                    }
+                )
+            elif not message.get('more_body', False):
+                key = policy.key(scope, headers)
+                entry = self._store(key, policy, start, b''.join(chunks))
+                await self._respond(entry, headers, send)
+
+        await self.app(scope, receive, _send)
+
+    def _store(
+        self, key: Tuple, policy: CachePolicy, start: "Message", body: bytes
+    ) -> _Entry:
+        response_headers = [
+            (k, v) for k, v in start.get('headers', []) if k.lower() != b'date'
+        ]
+        names = {k.lower() for k, _ in response_headers}
+        etag = _headers(response_headers).get('etag')
+        if etag is None:
+            etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            response_headers.append((b'etag', etag.encode('latin-1')))
+        last_modified = None
+        if b'last-modified' in names:
+            last_modified = _timestamp(_headers(response_headers)['last-modified'])
+        if last_modified is None:
+            last_modified = int(time.time())
+            response_headers.append(
+                (b'last-modified', formatdate(last_modified, usegmt=True).encode())
+            )
+
+        entry = _Entry(
+            headers=response_headers,
+            body=body,
+            etag=etag,
+            last_modified=last_modified,
+            ttl=policy.ttl,
+            stale_while_revalidate=policy.stale_while_revalidate,
+        )
+        self.cache.put(key, entry)
+        return entry
+
+    async def _respond(self, entry: _Entry, headers: Dict[str, str], send: "Send"):
+        """Send `entry`, or `304` if the client's copy is still valid"""
+        age = (b'age', str(int(time.monotonic() - entry.stored)).encode())
+        if entry.not_modified(headers):
+            self.cache.not_modified += 1
+            status, body = 304, b''
+            response_headers = [
+                (k, v)
+                for k, v in entry.headers
+                if k.lower() in (b'etag', b'last-modified', b'cache-control', b'vary')
+            ] + [age]
+        else:
+            status = 200
+            body = entry.body
+            response_headers = entry.headers + [age]
+
+        await send(
+            {
+                'type': 'http.response.start',
+                'status': status,
+                'headers': response_headers,
+            }
+        )
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _revalidate(self, scope: "Scope", key: Tuple, policy: CachePolicy):
+        """Refresh a stale entry in the background, once at a time"""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        task = asyncio.get_running_loop().create_task(self._refresh(scope, key, policy))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, scope: "Scope", key: Tuple, policy: CachePolicy):
+        scope = dict(
+            scope,
+            headers=[
+                (k, v)
+                for k, v in scope['headers']
+                if k.lower() not in (b'if-none-match', b'if-modified-since')
+            ],
+        )
+        messages: List["Message"] = []
+        requested = False
+
+        async def receive() -> "Message":
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # nobody disconnects, wait to be cancelled once the response is sent
+            await asyncio.Future()
+
+        async def send(message: "Message"):
+            messages.append(message)
+
+        try:
+            await self.app(scope, receive, send)
+        except Exception:
+            # the stale response is served until it expires
+            return
+        finally:
+            self._refreshing.discard(key)
+
+        start = _with_vary(messages[0], policy) if messages else None
+        if start is not None and _storable(start):
+            body = b''.join(m.get('body', b'') for m in messages[1:])
+            self._store(key, policy, start, body)
+
+
+def setup_cache_metrics(meter: "Meter"):
+    if not _CACHES:
+        return
+    _INSTRUMENTS['requests'] = meter.create_counter(
+        name='fastapi_serve_cache_requests',
+        description='FastAPI-serve Requests to cached routes, by result (hit, stale '
+        'or miss)',
+    )
+
+
+def configure_response_cache(app: "FastAPI", config: Optional[Dict] = None):
+    """Cache the responses of the routes matching `server.response_cache.routes`
+    and of endpoints decorated with `cache_response`, if any. The cache is kept on
+    `app.state.fastapi_serve_response_cache`"""
+    config = config or {}
+    routes = [
+        (pattern, CachePolicy(**spec))
+        for pattern, spec in (config.get('routes') or {}).items()
+    ]
+    if not routes and not _DECORATED:
+        return None
+
+    max_memory = config.get('max_memory', DEFAULT_MAX_MEMORY)
+    cache = ResponseCache(max_bytes=int(max_memory * 1024 * 1024))
+    app.add_middleware(ResponseCacheMiddleware, cache=cache, routes=routes)
+    app.state.fastapi_serve_response_cache = cache
+    return cache
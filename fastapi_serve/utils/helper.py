@@ -1,30 +1,66 @@
 import os
-from functools import lru_cache
+from typing import Optional
 
-import requests
 from hubble import Auth
 
-HubbleAPI = "https://api.hubble.jina.ai/v2/rpc/"
+from fastapi_serve.client import HUBBLE_API, TTLCache, get_http_client
+
+HubbleAPI = f"{HUBBLE_API}/v2/rpc/"
 HubbleGetUserAPI = HubbleAPI + "user.session.getUser"
 FlowUserEnvVar = "JINA_FLOW_USER_ID"
 
+# A token maps to the same user for its whole lifetime, revoked tokens stop being
+# accepted once their entry expires
+AuthCacheTTLEnvVar = "FASTAPI_SERVE_AUTH_CACHE_TTL"
+_userid_cache = TTLCache(
+    ttl=float(os.environ.get(AuthCacheTTLEnvVar, 60)), maxsize=4096
+)
+
+
+def _parse_userid(response) -> Optional[str]:
+    if response.status != 200:
+        raise Exception(f"Failed to get user id from Hubble: {response.text}")
+
+    _json = response.json() or {}
+    return (_json.get("data") or {}).get("_id") or None
 
-@lru_cache
-def get_jina_userid(token: str = None) -> str:
+
+def get_jina_userid(token: str = None) -> Optional[str]:
     """Get the Jina user id from the Hubble API."""
     if token is None:
         token = Auth().get_auth_token()
 
-    response = requests.post(
-        HubbleGetUserAPI,
-        headers={"Authorization": f"Bearer {token}"},
-    )
+    userid = _userid_cache.get(token)
+    if userid is None:
+        userid = _parse_userid(
+            get_http_client().post_sync(
+                HubbleGetUserAPI,
+                headers={"Authorization": f"Bearer {token}"},
+                # a read, safe to retry
+                retry=True,
+            )
+        )
+        _userid_cache.set(token, userid)
+    return userid
 
-    if response.status_code != 200:
-        raise Exception(f"Failed to get user id from Hubble: {response.text}")
 
-    _json = response.json()
-    return _json.get("data", {}).get("_id", '<unknown>')
+async def get_jina_userid_async(token: str = None) -> Optional[str]:
+    """Get the Jina user id from the Hubble API without blocking the event loop."""
+    if token is None:
+        token = Auth().get_auth_token()
+
+    userid = _userid_cache.get(token)
+    if userid is None:
+        userid = _parse_userid(
+            await get_http_client().post(
+                HubbleGetUserAPI,
+                headers={"Authorization": f"Bearer {token}"},
+                # a read, safe to retry
+                retry=True,
+            )
+        )
+        _userid_cache.set(token, userid)
+    return userid
 
 
 def get_userid_from_env():
@@ -33,8 +69,24 @@ def get_userid_from_env():
 
 def authorize(token: str) -> bool:
     """Authorize the user with the Hubble API."""
+    userid = get_userid_from_env()
+    if not userid:
+        # without the flow user, nobody is the owner of the app
+        return False
+    try:
+        return get_jina_userid(token) == userid
+    except Exception as e:
+        print(e)
+        return False
+
+
+async def authorize_async(token: str) -> bool:
+    """Authorize the user with the Hubble API without blocking the event loop."""
+    userid = get_userid_from_env()
+    if not userid:
+        return False
     try:
-        return get_jina_userid(token) == get_userid_from_env()
+        return await get_jina_userid_async(token) == userid
     except Exception as e:
         print(e)
         return False
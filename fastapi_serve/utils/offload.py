@@ -0,0 +1,328 @@
+import asyncio
+import atexit
+import functools
+import importlib
+import math
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from opentelemetry.metrics import Meter
+
+
+# smaller arguments & results are pickled, larger bytes & arrays are shared
+SHARED_MEMORY_THRESHOLD = 1024 * 1024
+
+# decorated functions, looked up by name in the pool's processes, where the module
+# attribute is the async wrapper and can't be pickled
+_REGISTRY: Dict[str, Callable] = {}
+_POOLS: List["ProcessPool"] = []
+_INSTRUMENTS: Dict[str, object] = {}
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: its affinity, capped by the container's CPU quota"""
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+
+    try:
+        # cgroup v2, e.g. "200000 100000" for 2 CPUs or "max 100000"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(cpus, 1)
+
+
+def _key(func: Callable) -> str:
+    # a script run as `__main__` is imported as `__mp_main__` by spawned processes
+    module = '__main__' if func.__module__ == '__mp_main__' else func.__module__
+    return f'{module}:{func.__qualname__}'
+
+
+class _Shared:
+    """A large argument or result, passed through shared memory rather than pickled"""
+
+    __slots__ = ('name', 'size', 'dtype', 'shape')
+
+    def __init__(self, name: str, size: int, dtype: str = None, shape: tuple = None):
+        self.name = name
+        self.size = size
+        self.dtype = dtype
+        self.shape = shape
+
+
+def _is_ndarray(obj) -> bool:
+    return type(obj).__module__ == 'numpy' and hasattr(obj, '__array_interface__')
+
+
+def _share(obj, threshold: int, names: List[str]):
+    """`obj` copied to shared memory if it's large bytes or an array, the name of the
+    shared memory is added to `names`"""
+    if isinstance(obj, (bytes, bytearray)) and len(obj) >= threshold:
+        shm = SharedMemory(create=True, size=len(obj))
+        shm.buf[: len(obj)] = obj
+        shared = _Shared(shm.name, len(obj))
+    elif _is_ndarray(obj) and obj.nbytes >= threshold:
+        import numpy as np
+
+        shm = SharedMemory(create=True, size=obj.nbytes)
+        np.ndarray(obj.shape, obj.dtype, buffer=shm.buf)[...] = obj
+        shared = _Shared(shm.name, obj.nbytes, obj.dtype.str, obj.shape)
+    else:
+        return obj
+
+    shm.close()
+    names.append(shared.name)
+    return shared
+
+
+def _unshare(obj, attached: List[SharedMemory], copy: bool):
+    """The value of a `_Shared`, arrays are views on the shared memory unless `copy`"""
+    if not isinstance(obj, _Shared):
+        return obj
+
+    shm = SharedMemory(name=obj.name)
+    attached.append(shm)
+    if obj.dtype is None:
+        return bytes(shm.buf[: obj.size])
+
+    import numpy as np
+
+    array = np.ndarray(obj.shape, np.dtype(obj.dtype), buffer=shm.buf)
+    return array.copy() if copy else array
+
+
+def _close(attached: List[SharedMemory], unlink: bool = False):
+    for shm in attached:
+        try:
+            shm.close()
+        except BufferError:
+            # still viewed by an array, unmapped once that's collected
+            pass
+        if unlink:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _unlink(names: List[str]):
+    for name in names:
+        try:
+            shm = SharedMemory(name=name)
+        except FileNotFoundError:
+            continue
+        shm.close()
+        shm.unlink()
+
+
+def _init_process():
+    # Ctrl+C is for the server, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _run(key: Optional[str], func, args, kwargs, threshold: int):
+    """Runs in the pool's processes"""
+    if key is not None:
+        if key not in _REGISTRY:
+            module = key.split(':', 1)[0]
+            importlib.import_module('__mp_main__' if module == '__main__' else module)
+        func = _REGISTRY[key]
+
+    attached: List[SharedMemory] = []
+    try:
+        args = [_unshare(a, attached, copy=False) for a in args]
+        kwargs = {k: _unshare(v, attached, copy=False) for k, v in kwargs.items()}
+        result = func(*args, **kwargs)
+        del args, kwargs
+        return _share(result, threshold, [])
+    finally:
+        _close(attached)
+
+
+class ProcessPool:
+    """Runs CPU-bound functions in a pool of processes, so that they run in parallel
+    on all the cores rather than one at a time under the GIL of the server.
+
+    The processes are started on first use, one per CPU available to each worker of
+    the server by default. Bytes & numpy arrays larger than `shared_memory_threshold`
+    are passed through shared memory, both ways. Arguments & results must be picklable.
+
+        pool = ProcessPool()
+
+        @app.post('/resize')
+        @pool
+        def resize(image: bytes = Body()):
+            ...
+
+        # or, from an async endpoint
+        result = await pool.run(top_level_function, data)
+    """
+
+    def __init__(
+        self,
+        name: str = 'default',
+        max_workers: Optional[int] = None,
+        shared_memory_threshold: int = SHARED_MEMORY_THRESHOLD,
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.shared_memory_threshold = shared_memory_threshold
+        self.inflight = 0
+        self.completed = 0
+        self.failed = 0
+        self.seconds = 0.0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        _POOLS.append(self)
+
+    @property
+    def size(self) -> int:
+        if self.max_workers is not None:
+            return self.max_workers
+
+        from fastapi_serve.gateway.workers import get_worker_count
+
+        return max(available_cpus() // get_worker_count(), 1)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.size,
+                # forking a server with running threads & loops isn't safe
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_process,
+            )
+        return self._executor
+
+    def _record(self, instrument: str, amount: float):
+        if instrument in _INSTRUMENTS:
+            from fastapi_serve.gateway.workers import worker_attributes
+
+            attributes = {'pool': self.name, **worker_attributes()}
+            if instrument == 'duration':
+                _INSTRUMENTS[instrument].record(amount, attributes)
+            else:
+                _INSTRUMENTS[instrument].add(amount, attributes)
+
+    async def _submit(self, key: Optional[str], func, args, kwargs) -> Any:
+        names: List[str] = []
+        threshold = self.shared_memory_threshold
+        start = time.perf_counter()
+        self.inflight += 1
+        self._record('inflight', 1)
+        try:
+            args = [_share(a, threshold, names) for a in args]
+            kwargs = {k: _share(v, threshold, names) for k, v in kwargs.items()}
+            future = self._get_executor().submit(
+                _run, key, None if key else func, args, kwargs, threshold
+            )
+            result = await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            # a process died (e.g. killed for its memory), start afresh on next call
+            self.failed += 1
+            self._executor = None
+            raise
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            _unlink(names)
+            self.inflight -= 1
+            self._record('inflight', -1)
+
+        attached: List[SharedMemory] = []
+        try:
+            result = _unshare(result, attached, copy=True)
+        finally:
+            _close(attached, unlink=True)
+
+        elapsed = time.perf_counter() - start
+        self.completed += 1
+        self.seconds += elapsed
+        self._record('duration', elapsed * 1000)
+        return result
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run `func`, a module-level function, in the pool"""
+        return await self._submit(None, func, args, kwargs)
+
+    def __call__(self, func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            raise TypeError(
+                f'{func.__name__} is async, only sync functions run in a process pool'
+            )
+        if '<locals>' in func.__qualname__:
+            raise TypeError(
+                f'{func.__qualname__} must be defined at module level to run in a '
+                'process pool'
+            )
+
+        key = _key(func)
+        _REGISTRY[key] = func
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await self._submit(key, None, args, kwargs)
+
+        return wrapper
+
+    def stats(self) -> Dict:
+        return {
+            'processes': self.size,
+            'started': self._executor is not None,
+            'inflight': self.inflight,
+            'completed': self.completed,
+            'failed': self.failed,
+            'mean_ms': round(self.seconds / max(self.completed, 1) * 1000, 3),
+        }
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+_default_pool: Optional[ProcessPool] = None
+
+
+def offload(func: Callable) -> Callable:
+    """Run a sync function, e.g. a CPU-bound endpoint, in the default `ProcessPool`"""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = ProcessPool()
+    return _default_pool(func)
+
+
+def get_process_pools() -> List[ProcessPool]:
+    return list(_POOLS)
+
+
+@atexit.register
+def shutdown_process_pools(wait: bool = True):
+    for pool in _POOLS:
+        pool.shutdown(wait=wait)
+
+
+def setup_offload_metrics(meter: "Meter"):
+    if not _POOLS:
+        return
+    _INSTRUMENTS['inflight'] = meter.create_up_down_counter(
+        name='fastapi_serve_offload_inflight',
+        description='FastAPI-serve Calls submitted to a process pool & not done',
+    )
+    _INSTRUMENTS['duration'] = meter.create_histogram(
+        name='fastapi_serve_offload_duration',
+        description='FastAPI-serve Duration of calls run in a process pool',
+        unit='ms',
+    )
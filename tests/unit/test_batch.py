@@ -0,0 +1,127 @@
+import asyncio
+import os
+import textwrap
+
+import pytest
+
+from fastapi_serve.cloud.batch import (
+    Manifest,
+    deploy_batch_on_jcloud,
+    get_build_key,
+    inspect_app,
+)
+from fastapi_serve.cloud.errors import InvalidManifestError
+
+APP = '''
+from fastapi import FastAPI
+
+app = FastAPI()
+
+
+@app.{route}('/{path}')
+async def handler():
+    pass
+'''
+
+
+def _write_app(app_dir, route='get', path='ping'):
+    os.makedirs(app_dir, exist_ok=True)
+    with open(os.path.join(app_dir, 'main.py'), 'w') as f:
+        f.write(APP.format(route=route, path=path))
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    _write_app(tmp_path / 'a')
+    _write_app(tmp_path / 'b', route='websocket', path='ws')
+    manifest = tmp_path / 'manifest.yml'
+    manifest.write_text(
+        textwrap.dedent(
+            '''
+            parallel: 2
+            apps:
+              - app: main:app
+                app_dir: a
+                name: a-one
+              - app: main:app
+                app_dir: a
+                name: a-two
+              - app: main:app
+                app_dir: b
+                name: b
+            '''
+        )
+    )
+    return manifest
+
+
+def test_manifest_paths_are_relative_to_manifest(fleet, tmp_path):
+    manifest = Manifest.from_file(str(fleet))
+    assert manifest.parallel == 2
+    assert [a.name for a in manifest.apps] == ['a-one', 'a-two', 'b']
+    assert manifest.apps[2].app_dir == str(tmp_path / 'b')
+
+
+@pytest.mark.parametrize(
+    'content',
+    [
+        'apps: []',
+        'apps:\n  - app_dir: a',
+        'apps:\n  - app: main:app\n    unknown: 1',
+        'apps:\n  - app: main:app\n    env: missing.env',
+        'parallel: 0\napps:\n  - app: main:app',
+    ],
+)
+def test_invalid_manifest(tmp_path, content):
+    manifest = tmp_path / 'manifest.yml'
+    manifest.write_text(content)
+    with pytest.raises(InvalidManifestError):
+        Manifest.from_file(str(manifest))
+
+
+def test_build_key_follows_content(tmp_path):
+    _write_app(tmp_path / 'a')
+    _write_app(tmp_path / 'b')
+    key = get_build_key(str(tmp_path / 'a'), 'latest', None, False)
+    assert key == get_build_key(str(tmp_path / 'b'), 'latest', None, False)
+    assert key != get_build_key(str(tmp_path / 'a'), '0.1.0', None, False)
+
+    _write_app(tmp_path / 'b', path='pong')
+    assert key != get_build_key(str(tmp_path / 'b'), 'latest', None, False)
+
+
+def test_inspect_apps_with_the_same_module_name(fleet, tmp_path):
+    assert not inspect_app('main:app', str(tmp_path / 'a'))
+    assert inspect_app('main:app', str(tmp_path / 'b'))
+
+
+def test_deploy_batch(fleet, monkeypatch):
+    pytest.importorskip('hubble')
+    from fastapi_serve.cloud import build, deploy
+    from fastapi_serve.utils import helper
+
+    pushed, running, peak = [], [0], [0]
+
+    def _push(app_dir, **kwargs):
+        pushed.append(app_dir)
+        return f'{os.path.basename(app_dir)}-image:tag'
+
+    async def _deploy(app, gateway_id, user_id, timer, name, **kwargs):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await gateway_id, await user_id
+        await asyncio.sleep(0.05)
+        running[0] -= 1
+        if name == 'b':
+            raise RuntimeError('boom')
+        return f'{name}-id'
+
+    monkeypatch.setattr(build, 'push_app_dir_to_hubble', _push)
+    monkeypatch.setattr(deploy, 'deploy_built_app_on_jcloud', _deploy)
+    monkeypatch.setattr(helper, 'get_jina_userid', lambda: 'user-id')
+
+    progress = asyncio.run(deploy_batch_on_jcloud(str(fleet)))
+    assert sorted(os.path.basename(p) for p in pushed) == ['a', 'b']
+    assert peak[0] == 2
+    assert [p.app_id for p in progress] == ['a-one-id', 'a-two-id', None]
+    assert progress[2].failed and progress[2].error == 'boom'
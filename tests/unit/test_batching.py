@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+import pytest
+
+from fastapi_serve import Batcher, ProcessPool
+
+pool = ProcessPool('test-batching', max_workers=1)
+
+
+@Batcher('test-offloaded', max_batch_size=8, max_wait_ms=20)
+@pool
+def squares(xs):
+    return [x * x for x in xs]
+
+
+@pytest.fixture(scope='module', autouse=True)
+def _shutdown():
+    yield
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_batched():
+    sizes = []
+    release = asyncio.Event()
+
+    @Batcher('test-batched', max_batch_size=4, max_wait_ms=1000)
+    async def double(xs):
+        sizes.append(len(xs))
+        await release.wait()
+        return [x * 2 for x in xs]
+
+    batcher = double.batcher
+    calls = [asyncio.create_task(double(n)) for n in range(10)]
+    while batcher.running == 0 or batcher.queued < 6:
+        await asyncio.sleep(0.001)
+    # full batches don't wait for `max_wait_ms`, the next ones wait for a free slot
+    assert sizes == [4] and batcher.running == 1
+
+    release.set()
+    assert await asyncio.gather(*calls) == [n * 2 for n in range(10)]
+    assert sizes == [4, 4, 2]
+    stats = batcher.stats()
+    assert stats['batches'] == 3 and stats['largest'] == 4 and stats['queued'] == 0
+
+
+@pytest.mark.asyncio
+async def test_partial_batch_waits_at_most_max_wait():
+    threads = []
+
+    @Batcher('test-waited', max_batch_size=100, max_wait_ms=20)
+    def total(xs):
+        threads.append(threading.current_thread())
+        return [sum(xs)] * len(xs)
+
+    assert await asyncio.gather(total(1), total(2), total(3)) == [6, 6, 6]
+    assert threads[0] is not threading.main_thread()
+    assert 15 <= total.batcher.stats()['mean_wait_ms'] < 1000
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    @Batcher('test-failing', max_batch_size=2, max_wait_ms=1)
+    async def fail(xs):
+        raise RuntimeError('model failed')
+
+    @Batcher('test-short', max_batch_size=2, max_wait_ms=1)
+    async def short(xs):
+        return xs[:1]
+
+    for func, error in ((fail, RuntimeError), (short, ValueError)):
+        results = await asyncio.gather(func(1), func(2), return_exceptions=True)
+        assert [type(r) for r in results] == [error, error]
+        assert func.batcher.failed == 1 and func.batcher.running == 0
+
+
+@pytest.mark.asyncio
+async def test_offloaded_batch_function():
+    assert await asyncio.gather(*(squares(n) for n in range(5))) == [
+        n * n for n in range(5)
+    ]
+    assert squares.batcher.stats()['batches'] == 1
+    assert pool.stats()['completed'] == 1
@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from fastapi_serve.bench import LatencyHistogram, bench, run_bench
+from fastapi_serve.helper import get_free_port
+
+
+@pytest_asyncio.fixture
+async def server():
+    stalled = asyncio.Event()
+
+    async def work(request):
+        # a single long stall, like a GC pause
+        if not stalled.is_set():
+            stalled.set()
+            await asyncio.sleep(0.5)
+        return web.json_response({})
+
+    async def missing(request):
+        return web.json_response({}, status=404)
+
+    async def ws(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:
+            await ws.send_bytes(msg.data)
+        return ws
+
+    app = web.Application()
+    app.router.add_get('/work', work)
+    app.router.add_get('/missing', missing)
+    app.router.add_get('/ws', ws)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = get_free_port()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    yield f'127.0.0.1:{port}'
+    await runner.cleanup()
+
+
+def test_histogram_percentiles():
+    h = LatencyHistogram()
+    for ms in range(1, 1001):
+        h.record(ms / 1000)
+    assert h.count == 1000
+    for q in (50, 90, 99, 99.9):
+        assert h.percentile(q) == pytest.approx(q / 100, rel=0.01)
+    assert h.percentile(100) == pytest.approx(1, rel=0.01)
+    assert h.mean == pytest.approx(0.5005)
+
+
+def test_histogram_correction_backfills_stalls():
+    h = LatencyHistogram()
+    h.record_corrected(1.0, expected_interval=0.1)
+    assert h.count == 10
+    assert h.percentile(50) == pytest.approx(0.5, rel=0.01)
+
+
+@pytest.mark.asyncio
+async def test_open_loop_sees_the_stall(server):
+    result = await run_bench(f'http://{server}/work', rate=200, duration=1)
+    assert result.mode == 'open-loop' and not result.errors
+    assert result.successes == 200
+    # requests scheduled during the stall queue behind it
+    assert result.corrected.percentile(90) > result.latency.percentile(90)
+    assert result.corrected.percentile(50) < 0.1
+
+
+@pytest.mark.asyncio
+async def test_closed_loop_corrects_the_stall(server):
+    result = await run_bench(f'http://{server}/work', concurrency=1, duration=1)
+    assert result.mode == 'closed-loop'
+    assert result.latency.max >= 0.5
+    # one client, so the stall hides all the requests it kept from being sent
+    assert result.latency.percentile(99) < 0.1
+    assert result.corrected.percentile(99) >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_errors_are_broken_down(server):
+    result = await run_bench(f'http://{server}/missing', concurrency=2, duration=0.2)
+    assert result.successes == 0 and set(result.errors) == {'HTTP 404'}
+
+    result = await run_bench(f'ws://{server}/ws', rate=50, concurrency=2, duration=0.2)
+    assert result.successes == 10 and not result.errors
+
+
+def test_bench_writes_json(tmp_path):
+    output = tmp_path / 'bench.json'
+    bench('http://127.0.0.1:1/', concurrency=1, duration=0.1, output=str(output))
+    result = json.loads(output.read_text())
+    assert result['successes'] == 0
+    assert set(result['errors']) == {'ClientConnectorError'}
+    assert result['latency']['count'] == sum(result['latency']['buckets'].values())
+    assert {'p50_ms', 'p90_ms', 'p99_ms', 'p99.9_ms'} <= set(result['latency'])
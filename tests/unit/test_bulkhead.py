@@ -0,0 +1,196 @@
+import asyncio
+import threading
+
+import anyio
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+
+from fastapi_serve import Bulkhead
+from fastapi_serve.cloud.config import ServerConfig
+from fastapi_serve.cloud.errors import InvalidServerConfigError
+from fastapi_serve.gateway.helper import register_healthz
+from fastapi_serve.utils.bulkhead import configure_bulkheads, get_bulkheads
+
+
+def _client(app: FastAPI) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url='http://test'
+    )
+
+
+async def _until(condition):
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_bulkhead_isolates_a_slow_route():
+    app = FastAPI()
+    unblock = threading.Event()
+    reports = Bulkhead('test-reports', threads=2, max_queue=1)
+
+    @app.get('/report/{n}')
+    @reports
+    def report(n: int):
+        unblock.wait(5)
+        return {'report': n}
+
+    @app.get('/ping')
+    def ping():
+        return 'pong'
+
+    register_healthz(app)
+    async with _client(app) as client:
+        slow = [asyncio.create_task(client.get(f'/report/{n}')) for n in range(3)]
+        await _until(lambda: reports.active == 2 and reports.queued == 1)
+
+        r = await client.get('/report/3')
+        assert r.status_code == 503 and r.headers['retry-after'] == '1'
+        # other sync routes still get threads
+        assert (await client.get('/ping')).json() == 'pong'
+        health = (await client.get('/healthz')).json()
+        assert health['bulkheads']['test-reports']['active'] == 2
+
+        unblock.set()
+        responses = await asyncio.gather(*slow)
+        assert [r.json() for r in responses] == [{'report': n} for n in range(3)]
+    assert reports.stats()['rejected'] == 1 and reports.active == 0
+
+
+@pytest.mark.asyncio
+async def test_routes_from_config_run_on_the_bulkhead_threads():
+    app = FastAPI()
+    unblock = threading.Event()
+
+    @app.get('/render/{n}')
+    def render(n: int):
+        unblock.wait(5)
+        return {'render': n}
+
+    @app.get('/ping')
+    def ping():
+        return 'pong'
+
+    configure_bulkheads(
+        app, {'test-renders': {'threads': 2, 'max_queue': 0, 'routes': ['/render/*']}}
+    )
+    renders = get_bulkheads()['test-renders']
+    async with _client(app) as client:
+        shared = anyio.to_thread.current_default_thread_limiter()
+        slow = [asyncio.create_task(client.get(f'/render/{n}')) for n in range(2)]
+        await asyncio.wait_for(_until(lambda: renders._limiter.borrowed_tokens == 2), 5)
+        # none of the shared threads are taken
+        assert shared.borrowed_tokens == 0
+        assert (await client.get('/ping')).json() == 'pong'
+
+        unblock.set()
+        assert [(await r).json() for r in slow] == [{'render': 0}, {'render': 1}]
+    assert renders._limiter.borrowed_tokens == 0
+
+
+@pytest.mark.asyncio
+async def test_routes_from_config():
+    app = FastAPI()
+    unblock = asyncio.Event()
+
+    @app.get('/export/{n}')
+    async def export(n: int):
+        await unblock.wait()
+        return {'export': n}
+
+    @app.get('/ping')
+    async def ping():
+        return 'pong'
+
+    configure_bulkheads(
+        app, {'test-exports': {'threads': 1, 'max_queue': 0, 'routes': ['/export/*']}}
+    )
+    exports = get_bulkheads()['test-exports']
+    async with _client(app) as client:
+        slow = asyncio.create_task(client.get('/export/1'))
+        await _until(lambda: exports.active == 1)
+
+        assert (await client.get('/export/2')).status_code == 503
+        assert (await client.get('/ping')).status_code == 200
+        unblock.set()
+        assert (await slow).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_blocking_dependency_stays_in_its_bulkhead():
+    app = FastAPI()
+    unblock = threading.Event()
+
+    def wait_for_upstream():
+        unblock.wait(5)
+
+    def cheap():
+        return 'cheap'
+
+    @app.get('/upstream/call', dependencies=[Depends(wait_for_upstream)])
+    def upstream():
+        return 'upstream'
+
+    @app.get('/local/call')
+    def local(value: str = Depends(cheap)):
+        return value
+
+    configure_bulkheads(
+        app,
+        {
+            'test-upstream': {'threads': 1, 'routes': ['/upstream/*']},
+            'test-local': {'threads': 1, 'routes': ['/local/*']},
+        },
+    )
+    upstream_threads = get_bulkheads()['test-upstream']._limiter
+    async with _client(app) as client:
+        shared = anyio.to_thread.current_default_thread_limiter()
+        default, shared.total_tokens = shared.total_tokens, 1
+        try:
+            blocked = asyncio.create_task(client.get('/upstream/call'))
+            await asyncio.wait_for(
+                _until(lambda: upstream_threads.borrowed_tokens == 1), 5
+            )
+            # neither the shared pool nor the other bulkhead is taken
+            r = await asyncio.wait_for(client.get('/local/call'), 2)
+            assert r.json() == 'cheap' and shared.borrowed_tokens == 0
+        finally:
+            unblock.set()
+            shared.total_tokens = default
+        assert (await blocked).json() == 'upstream'
+
+
+def test_bulkhead_names_are_unique():
+    Bulkhead('test-unique')
+    with pytest.raises(ValueError):
+        Bulkhead('test-unique', threads=8)
+    assert get_bulkheads()['test-unique'].threads == 4
+
+
+def test_config_resizes_bulkheads_defined_in_code():
+    bulkhead = Bulkhead('test-resized', threads=2)
+    configure_bulkheads(FastAPI(), {'test-resized': {'threads': 8, 'max_queue': 4}})
+    assert bulkhead.threads == 8 and bulkhead.max_queue == 4
+
+    with pytest.raises(TypeError):
+
+        @bulkhead
+        async def not_blocking():
+            pass
+
+
+@pytest.mark.parametrize(
+    'bulkheads',
+    [
+        ['reports'],
+        {'reports': {'threads': 0}},
+        {'reports': {'threads': True}},
+        {'reports': {'max_queue': -1}},
+        {'reports': {'routes': 'reports/*'}},
+        {'reports': {'pool': 4}},
+    ],
+)
+def test_invalid_bulkheads(bulkheads):
+    with pytest.raises(InvalidServerConfigError):
+        ServerConfig(bulkheads=bulkheads)
@@ -0,0 +1,193 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, Response
+
+from fastapi_serve import cache_response
+from fastapi_serve.cloud.config import ServerConfig
+from fastapi_serve.cloud.errors import InvalidServerConfigError
+from fastapi_serve.gateway.helper import register_healthz
+from fastapi_serve.utils.cache import ResponseCache, _Entry, configure_response_cache
+
+
+def _client(app: FastAPI) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url='http://test'
+    )
+
+
+@pytest.mark.asyncio
+async def test_decorated_route_is_cached_with_validators():
+    app = FastAPI()
+    calls = []
+
+    @app.get('/products/{id}')
+    @cache_response(ttl=60)
+    async def product(id: int, currency: str = 'EUR'):
+        calls.append(id)
+        return {'id': id, 'currency': currency}
+
+    @app.post('/products/{id}')
+    async def update(id: int):
+        calls.append(id)
+
+    register_healthz(app)
+    cache = configure_response_cache(app)
+    async with _client(app) as client:
+        first = await client.get('/products/1')
+        second = await client.get('/products/1')
+        assert second.json() == first.json() and calls == [1]
+        etag = second.headers['etag']
+        assert etag == first.headers['etag'] and 'last-modified' in second.headers
+
+        # path params & query tell the responses apart, other methods aren't cached
+        await client.get('/products/2')
+        await client.get('/products/1?currency=USD')
+        await client.post('/products/1')
+        await client.post('/products/1')
+        assert calls == [1, 2, 1, 1, 1]
+
+        r = await client.get('/products/1', headers={'if-none-match': f'W/{etag}'})
+        assert r.status_code == 304 and r.content == b''
+        r = await client.get(
+            '/products/1',
+            headers={'if-modified-since': first.headers['last-modified']},
+        )
+        assert r.status_code == 304
+        r = await client.get('/products/1', headers={'if-none-match': '"other"'})
+        assert r.status_code == 200 and r.json() == first.json()
+        assert len(calls) == 5
+
+        health = (await client.get('/healthz')).json()
+    assert health['response_cache']['hits'] == 4
+    assert cache.stats()['misses'] == 3 and cache.not_modified == 2
+
+
+@pytest.mark.asyncio
+async def test_stale_response_is_served_while_revalidating():
+    app = FastAPI()
+    version = {'value': 1}
+
+    @app.get('/config')
+    async def config():
+        await asyncio.sleep(0.05)
+        return version
+
+    configure_response_cache(
+        app, {'routes': {'/config': {'ttl': 0.1, 'stale_while_revalidate': 10}}}
+    )
+    async with _client(app) as client:
+        assert (await client.get('/config')).json() == {'value': 1}
+        version['value'] = 2
+        await asyncio.sleep(0.15)
+
+        # returns right away, the refresh runs in the background
+        assert (await client.get('/config')).json() == {'value': 1}
+        await asyncio.sleep(0.2)
+        assert (await client.get('/config')).json() == {'value': 2}
+
+
+@pytest.mark.asyncio
+async def test_uncacheable_requests_and_responses():
+    app = FastAPI()
+    calls = []
+
+    @app.get('/me')
+    @cache_response(vary=['user'])
+    async def me(response: Response):
+        calls.append('me')
+        return len(calls)
+
+    @app.get('/private')
+    @cache_response()
+    async def private(response: Response):
+        calls.append('private')
+        response.set_cookie('session', 'secret')
+        return len(calls)
+
+    @app.get('/missing')
+    @cache_response()
+    async def missing(response: Response):
+        calls.append('missing')
+        response.status_code = 404
+
+    configure_response_cache(app)
+    async with _client(app) as client:
+        for path in ('/private', '/private', '/missing', '/missing'):
+            await client.get(path)
+        assert calls == ['private', 'private', 'missing', 'missing']
+
+        calls.clear()
+        alice = {'authorization': 'Bearer alice'}
+        bob = {'authorization': 'Bearer bob'}
+        assert (await client.get('/me', headers=alice)).json() == 1
+        assert (await client.get('/me', headers=bob)).json() == 2
+        r = await client.get('/me', headers=alice)
+        assert r.json() == 1 and r.headers['vary'] == 'authorization'
+        r = await client.get(
+            '/me', headers={**alice, 'if-none-match': r.headers['etag']}
+        )
+        assert r.status_code == 304 and r.headers['vary'] == 'authorization'
+        assert (
+            await client.get('/me', headers={'cache-control': 'no-cache'})
+        ).json() == 3
+
+
+@pytest.mark.asyncio
+async def test_varied_responses_say_what_they_vary_on():
+    app = FastAPI()
+
+    @app.get('/greeting')
+    @cache_response(vary=['query', 'header:Accept-Language'])
+    async def greeting(response: Response):
+        response.headers['vary'] = 'Accept-Encoding'
+        return 'hello'
+
+    @app.get('/plain')
+    @cache_response()
+    async def plain():
+        return 'plain'
+
+    configure_response_cache(app)
+    async with _client(app) as client:
+        for _ in range(2):
+            r = await client.get('/greeting', headers={'accept-language': 'en'})
+            assert r.headers['vary'] == 'Accept-Encoding, accept-language'
+            assert 'vary' not in (await client.get('/plain')).headers
+
+
+def test_lru_is_bounded_by_memory():
+    cache = ResponseCache(max_bytes=1000)
+
+    def entry(size: int) -> _Entry:
+        return _Entry([], b'x' * size, '"etag"', 0, 60, 0)
+
+    for key in 'abcdefghij':
+        cache.put(key, entry(100))
+    assert cache.bytes == 1000 and cache.evictions == 0
+
+    cache.get('a')
+    cache.put('k', entry(100))
+    # the least recently used goes first
+    assert list(cache._entries) == list('cdefghijak') and cache.evictions == 1
+    # too large for a single entry
+    cache.put('l', entry(200))
+    assert cache.get('l') is None and cache.bytes == 1000
+
+
+@pytest.mark.parametrize(
+    'response_cache',
+    [
+        ['/products/*'],
+        {'max_memory': 0},
+        {'size': 10},
+        {'routes': {'products/*': {'ttl': 60}}},
+        {'routes': {'/products/*': {'ttl': 0}}},
+        {'routes': {'/products/*': {'ttl': 60, 'vary': ['cookie']}}},
+        {'routes': {'/products/*': {'stale': 60}}},
+    ],
+)
+def test_invalid_response_cache(response_cache):
+    with pytest.raises(InvalidServerConfigError):
+        ServerConfig(response_cache=response_cache)
@@ -0,0 +1,219 @@
+import asyncio
+import threading
+from collections import Counter
+
+import pytest
+from aiohttp import web
+
+from fastapi_serve.client import HTTPClient, HTTPRequestError, TTLCache
+
+USERS = {'token-alice': 'alice-id', 'token-bob': 'bob-id', 'token-anonymous': None}
+EXECUTORS = {'my-app': {'name': 'my-app', 'owner': 'alice'}}
+
+
+class FakeHubble:
+    """A local stand-in for the Hubble endpoints used by fastapi-serve"""
+
+    def __init__(self):
+        self.calls = Counter()
+        # number of upcoming requests per path that should fail with a 503
+        self.failures = Counter()
+        self.peers = set()
+        self.url = None
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+
+    def _fail(self, request: web.Request) -> bool:
+        self.calls[request.path] += 1
+        self.peers.add(request.transport.get_extra_info('peername'))
+        if self.failures[request.path] > 0:
+            self.failures[request.path] -= 1
+            return True
+        return False
+
+    async def get_user(self, request: web.Request) -> web.Response:
+        if self._fail(request):
+            return web.Response(status=503, headers={'Retry-After': '0'})
+
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        if token not in USERS:
+            return web.json_response({'message': 'unauthorized'}, status=401)
+        if USERS[token] is None:
+            return web.json_response({'data': {}})
+        return web.json_response({'data': {'_id': USERS[token]}})
+
+    async def get_meta(self, request: web.Request) -> web.Response:
+        if self._fail(request):
+            return web.Response(status=503)
+
+        executor = EXECUTORS.get(request.query.get('id'))
+        if executor is None:
+            return web.json_response(None, status=404)
+        return web.json_response(
+            {'data': {'name': executor['name']}, 'meta': {'owner': executor}}
+        )
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_post('/v2/rpc/user.session.getUser', self.get_user)
+        app.router.add_get('/v2/executor/getMeta', self.get_meta)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://127.0.0.1:{port}'
+
+    def start(self):
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+@pytest.fixture
+def hubble():
+    server = FakeHubble()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client():
+    c = HTTPClient(timeout=5, retries=2, backoff=0.01, max_backoff=0.05)
+    yield c
+    c.close()
+
+
+def test_connections_are_pooled(hubble, client):
+    for _ in range(5):
+        r = client.post_sync(
+            f'{hubble.url}/v2/rpc/user.session.getUser',
+            headers={'Authorization': 'Bearer token-alice'},
+        )
+        assert r.json() == {'data': {'_id': 'alice-id'}}
+    assert len(hubble.peers) == 1
+
+
+def test_retries_transient_failures(hubble, client):
+    hubble.failures['/v2/executor/getMeta'] = 2
+    r = client.get_sync(f'{hubble.url}/v2/executor/getMeta', params={'id': 'my-app'})
+    assert r.ok
+    assert hubble.calls['/v2/executor/getMeta'] == 3
+
+
+def test_gives_up_after_retries(hubble, client):
+    hubble.failures['/v2/executor/getMeta'] = 10
+    with pytest.raises(HTTPRequestError, match='status 503'):
+        client.get_sync(f'{hubble.url}/v2/executor/getMeta', params={'id': 'my-app'})
+    assert hubble.calls['/v2/executor/getMeta'] == 3
+
+
+def test_posts_are_retried_only_if_asked(hubble, client):
+    url = f'{hubble.url}/v2/rpc/user.session.getUser'
+    headers = {'Authorization': 'Bearer token-alice'}
+    hubble.failures['/v2/rpc/user.session.getUser'] = 1
+    with pytest.raises(HTTPRequestError, match='status 503'):
+        client.post_sync(url, headers=headers)
+    assert hubble.calls['/v2/rpc/user.session.getUser'] == 1
+
+    hubble.failures['/v2/rpc/user.session.getUser'] = 1
+    assert client.post_sync(url, headers=headers, retry=True).ok
+    assert hubble.calls['/v2/rpc/user.session.getUser'] == 3
+
+
+def test_client_errors_are_not_retried(hubble, client):
+    r = client.get_sync(f'{hubble.url}/v2/executor/getMeta', params={'id': 'nope'})
+    assert r.status == 404
+    assert hubble.calls['/v2/executor/getMeta'] == 1
+
+
+def test_connection_errors_raise_after_retries(client):
+    with pytest.raises(HTTPRequestError):
+        client.get_sync('http://127.0.0.1:1/unreachable')
+
+
+@pytest.mark.asyncio
+async def test_async_requests_share_the_pool(hubble, client):
+    responses = await asyncio.gather(
+        *(
+            client.post(
+                f'{hubble.url}/v2/rpc/user.session.getUser',
+                headers={'Authorization': 'Bearer token-bob'},
+            )
+            for _ in range(10)
+        )
+    )
+    assert all(r.json()['data']['_id'] == 'bob-id' for r in responses)
+
+
+def test_ttl_cache_expires(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('fastapi_serve.client.time.monotonic', lambda: now[0])
+    cache = TTLCache(ttl=10, maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    cache.set('c', 3)
+    assert cache.get('b') is None  # least recently used is evicted
+
+    now[0] = 11
+    assert cache.get('a') is None
+
+
+@pytest.fixture
+def hubble_helpers(hubble, client, monkeypatch):
+    pytest.importorskip('hubble')
+    from fastapi_serve.utils import helper
+
+    monkeypatch.setattr(
+        helper, 'HubbleGetUserAPI', f'{hubble.url}/v2/rpc/user.session.getUser'
+    )
+    monkeypatch.setattr(helper, 'get_http_client', lambda: client)
+    helper._userid_cache.clear()
+    yield helper
+    helper._userid_cache.clear()
+
+
+def test_userid_is_cached_per_token(hubble, hubble_helpers):
+    assert hubble_helpers.get_jina_userid('token-alice') == 'alice-id'
+    assert hubble_helpers.get_jina_userid('token-alice') == 'alice-id'
+    assert hubble_helpers.get_jina_userid('token-bob') == 'bob-id'
+    assert hubble.calls['/v2/rpc/user.session.getUser'] == 2
+
+
+@pytest.mark.asyncio
+async def test_authorize(hubble, hubble_helpers, monkeypatch):
+    monkeypatch.setenv(hubble_helpers.FlowUserEnvVar, 'alice-id')
+    assert await hubble_helpers.authorize_async('token-alice')
+    assert not await hubble_helpers.authorize_async('token-bob')
+    assert not await hubble_helpers.authorize_async('token-unknown')
+    # the sync variant, for callers outside of an event loop
+    assert hubble_helpers.authorize('token-alice')
+    assert not hubble_helpers.authorize('token-bob')
+
+
+@pytest.mark.asyncio
+async def test_authorize_denies_without_a_known_user(
+    hubble, hubble_helpers, monkeypatch
+):
+    monkeypatch.delenv(hubble_helpers.FlowUserEnvVar, raising=False)
+    assert not await hubble_helpers.authorize_async('token-alice')
+
+    # users Hubble doesn't return an id for never match each other
+    monkeypatch.setenv(hubble_helpers.FlowUserEnvVar, '')
+    assert not await hubble_helpers.authorize_async('token-anonymous')
+    assert hubble_helpers.get_jina_userid('token-anonymous') is None
+
+
+def test_hubble_exists(hubble, client, monkeypatch):
+    from fastapi_serve.cloud import build
+
+    monkeypatch.setattr(build, 'HUBBLE_API', hubble.url)
+    monkeypatch.setattr(build, 'get_http_client', lambda: client)
+    assert build.hubble_exists('my-app')
+    assert not build.hubble_exists('nope')
@@ -0,0 +1,145 @@
+import anyio
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from fastapi_serve.cloud.config import (
+    SERVER_PRESETS,
+    JCloudConfig,
+    ServerConfig,
+    get_jcloud_config,
+    resolve_jcloud_config,
+)
+from fastapi_serve.cloud.deploy import get_uvicorn_args
+from fastapi_serve.cloud.errors import InvalidServerConfigError
+from fastapi_serve.gateway.helper import set_thread_pool_size
+
+
+@pytest.mark.parametrize('preset', sorted(SERVER_PRESETS))
+def test_presets(preset):
+    config = ServerConfig(preset=preset)
+    for key, value in SERVER_PRESETS[preset].items():
+        assert getattr(config, key) == value
+    # the preset itself isn't passed on
+    assert 'preset' not in config.to_dict()['server']
+
+
+def test_explicit_values_take_precedence_over_the_preset():
+    config = ServerConfig.from_dict(
+        {'server': {'preset': 'low-latency', 'limit_concurrency': '512'}}
+    )
+    assert config.limit_concurrency == 512 and config.thread_pool_size == 16
+    assert config.to_uvicorn_kwargs() == {
+        'loop': 'uvloop',
+        'http': 'httptools',
+        'backlog': 1024,
+        'timeout_keep_alive': 5,
+        'limit_concurrency': 512,
+    }
+    assert ServerConfig.from_dict({}) == ServerConfig()
+
+
+@pytest.mark.parametrize(
+    'server',
+    [
+        {'preset': 'fastest'},
+        {'loop': 'trio'},
+        {'http': 'h2'},
+        {'backlog': 0},
+        {'timeout_keep_alive': 'forever'},
+        {'limit_concurrency': -1},
+        {'workers': 2},
+        {'thread_pool_size': 0},
+        {'drain_timeout': 0},
+    ],
+)
+def test_invalid_server_config(server):
+    with pytest.raises(InvalidServerConfigError):
+        ServerConfig.from_dict({'server': server})
+    with pytest.raises(InvalidServerConfigError):
+        JCloudConfig.from_dict({'server': server})
+
+
+def test_server_section_reaches_uvicorn_kwargs():
+    config = JCloudConfig.from_dict(
+        {'instance': 'C3', 'server': {'preset': 'throughput', 'backlog': 2048}}
+    )
+    kwargs = get_uvicorn_args(config.server)['uvicorn_kwargs']
+    assert kwargs == {
+        'ws_ping_interval': None,
+        'ws_ping_timeout': None,
+        'loop': 'uvloop',
+        'http': 'httptools',
+        'backlog': 2048,
+        'timeout_keep_alive': 75,
+    }
+    # not a uvicorn option, the gateway sizes its thread pool
+    assert 'thread_pool_size' not in kwargs
+    assert get_uvicorn_args()['uvicorn_kwargs'] == {
+        'ws_ping_interval': None,
+        'ws_ping_timeout': None,
+    }
+
+
+def test_flow_dict_gets_the_server_section(tmp_path):
+    pytest.importorskip('hubble')
+    from fastapi_serve.cloud.deploy import get_flow_dict
+
+    config = tmp_path / 'jcloud.yml'
+    config.write_text(
+        yaml.safe_dump({'server': {'preset': 'low-latency', 'loop': 'asyncio'}})
+    )
+    flow_dict = get_flow_dict(
+        app='main:app',
+        jcloud=True,
+        gateway_id='gateway-id',
+        jcloud_config_path=str(config),
+        user_id='user-id',
+    )
+    gateway = flow_dict['gateway']
+    assert gateway['uvicorn_kwargs']['loop'] == 'asyncio'
+    assert gateway['uvicorn_kwargs']['limit_concurrency'] == 256
+    assert gateway['uses_with']['thread_pool_size'] == 16
+    # jina would run the gateway on uvloop otherwise
+    assert gateway['env']['JINA_DISABLE_UVLOOP'] == '1'
+
+
+@pytest.mark.asyncio
+async def test_thread_pool_size():
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    default = limiter.total_tokens
+    set_thread_pool_size(None)
+    assert limiter.total_tokens == default
+    try:
+        set_thread_pool_size(64)
+        assert anyio.to_thread.current_default_thread_limiter().total_tokens == 64
+    finally:
+        limiter.total_tokens = default
+
+
+def test_export_picks_up_the_config(tmp_path, monkeypatch):
+    from fastapi_serve.__main__ import serve
+    from fastapi_serve.cloud import export
+
+    config = tmp_path / 'jcloud.yml'
+    config.write_text(yaml.safe_dump({'server': {'backlog': 64}}))
+    assert resolve_jcloud_config(None, app_dir=str(tmp_path)) == str(config)
+    assert get_jcloud_config(str(config)).server.backlog == 64
+    # given explicitly, it wins over the app dir's
+    assert resolve_jcloud_config('other.yml', app_dir=str(tmp_path)) == 'other.yml'
+
+    exported = {}
+
+    async def _export_app(**kwargs):
+        exported.update(kwargs)
+
+    monkeypatch.setattr(export, 'export_app', _export_app)
+    result = CliRunner().invoke(serve, ['export', 'main:app', '--config', str(config)])
+    assert result.exit_code == 0, result.output
+    assert exported['config'] == str(config)
+
+    config.write_text(yaml.safe_dump({'server': {'backlog': 0}}))
+    result = CliRunner().invoke(serve, ['export', 'main:app', '--config', str(config)])
+    assert result.exit_code == 2 and 'server.backlog' in result.output
+    # a malformed config in the app dir is ignored
+    assert resolve_jcloud_config(None, app_dir=str(tmp_path)) is None
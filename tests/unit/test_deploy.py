@@ -1,2 +1,136 @@
+import asyncio
+import time
+
+import pytest
+
+from fastapi_serve.cloud import deploy
+from fastapi_serve.cloud.helper import PhaseTimer
+
+
 def test_placeholder():
     assert True
+
+
+@pytest.mark.asyncio
+async def test_phase_timer_records_concurrent_phases(capsys):
+    timer = PhaseTimer()
+
+    async def _sleep(value, seconds=0.1):
+        await asyncio.sleep(seconds)
+        return value
+
+    assert await asyncio.gather(
+        timer.run('first', _sleep(1)), timer.run('second', _sleep(2))
+    ) == [1, 2]
+    with pytest.raises(ValueError):
+        with timer.phase('failed'):
+            raise ValueError
+
+    (start1, end1), (start2, end2) = timer.phases['first'], timer.phases['second']
+    assert end1 - start1 >= 0.1 and end2 - start2 >= 0.1
+    # they overlap
+    assert start2 < end1 and start1 < end2
+    assert 'failed' in timer.phases
+
+    timer.print()
+    output = capsys.readouterr().out
+    assert all(name in output for name in ('first', 'second', 'failed', 'Total'))
+
+
+@pytest.fixture
+def jcloud(monkeypatch):
+    """Record the calls to jcloud, looking up the app takes 0.1 s"""
+    pytest.importorskip('hubble')
+    calls = []
+
+    async def _existing_name(app_id):
+        calls.append('existing name')
+        await asyncio.sleep(0.1)
+        return 'existing'
+
+    async def _create_secret(app_id, secret, verbose=False):
+        calls.append('create secret')
+        return {'TOKEN': {'name': 'secret', 'key': 'TOKEN'}}
+
+    async def _deploy(flow_dict, app_id=None, verbose=False):
+        calls.append(('deploy', flow_dict))
+        return app_id or 'new-app', 'https://new-app.wolf.jina.ai'
+
+    async def _patch_secret(flow_dict, app_id, secret, verbose=False):
+        calls.append('patch secret')
+
+    monkeypatch.setattr(deploy, 'get_existing_name_async', _existing_name)
+    monkeypatch.setattr(deploy, 'create_secret_on_jcloud', _create_secret)
+    monkeypatch.setattr(deploy, 'deploy_app_on_jcloud', _deploy)
+    monkeypatch.setattr(deploy, 'patch_secret_on_jcloud', _patch_secret)
+    return calls
+
+
+async def _after(value, seconds=0.1):
+    await asyncio.sleep(seconds)
+    return value
+
+
+async def _failed_build():
+    await asyncio.sleep(0.1)
+    raise RuntimeError('build failed')
+
+
+@pytest.mark.asyncio
+async def test_existing_app_is_deployed_in_one_rollout(jcloud, tmp_path):
+    secret = tmp_path / 'secret.env'
+    secret.write_text('TOKEN=abc\n')
+    timer = PhaseTimer()
+    start = time.perf_counter()
+    app_id = await deploy.deploy_built_app_on_jcloud(
+        app='main:app',
+        gateway_id=_after('gateway-id'),
+        user_id=_after('user-id'),
+        timer=timer,
+        app_id='app-id',
+        secret=str(secret),
+    )
+    # the build & the lookups run concurrently
+    assert time.perf_counter() - start < 0.25
+    assert app_id == 'app-id'
+
+    # the secret is only created once the image is built
+    assert jcloud[:2] == ['existing name', 'create secret']
+    assert timer.phases['Create secret'][0] >= timer.phases['Build & push image'][1]
+    (_, flow_dict), *rest = jcloud[2:]
+    assert rest == []
+    assert flow_dict['jcloud']['name'] == 'existing'
+    assert flow_dict['with']['env_from_secret'] == {
+        'TOKEN': {'name': 'secret', 'key': 'TOKEN'}
+    }
+    assert flow_dict['gateway']['uses'] == deploy.get_gateway_uses('gateway-id')
+
+
+@pytest.mark.asyncio
+async def test_new_app_gets_its_secret_once_deployed(jcloud):
+    app_id = await deploy.deploy_built_app_on_jcloud(
+        app='main:app',
+        gateway_id=_after('gateway-id'),
+        user_id=_after('user-id'),
+        timer=PhaseTimer(),
+        secret='secret.env',
+    )
+    assert app_id == 'new-app'
+    assert [c if isinstance(c, str) else c[0] for c in jcloud] == [
+        'deploy',
+        'patch secret',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_failed_build_leaves_nothing_behind(jcloud):
+    with pytest.raises(RuntimeError, match='build failed'):
+        await deploy.deploy_built_app_on_jcloud(
+            app='main:app',
+            gateway_id=_failed_build(),
+            user_id=_after('user-id'),
+            timer=PhaseTimer(),
+            app_id='app-id',
+            secret='secret.env',
+        )
+    assert jcloud == ['existing name']
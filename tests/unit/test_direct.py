@@ -0,0 +1,97 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from contextlib import contextmanager
+
+import httpx
+import pytest
+
+from fastapi_serve.gateway.direct import build_direct_app, serve_direct
+from fastapi_serve.helper import get_free_port
+
+APP = '''
+import os
+
+from fastapi import FastAPI
+
+app = FastAPI()
+
+
+@app.get('/owner')
+def owner():
+    return os.environ.get('JINA_FLOW_USER_ID')
+'''
+
+
+@pytest.fixture
+def app_dir(tmp_path, monkeypatch):
+    (tmp_path / 'direct_app.py').write_text(APP)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_direct_app_gets_the_gateway_endpoints(app_dir):
+    app = build_direct_app(
+        'direct_app:app', logger=logging.getLogger(__name__), drain_delay=0
+    )
+    drainer = app.state.fastapi_serve_drainer
+    assert drainer.delay == 0
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        assert (await client.get('/healthz')).json()['status'] == 'ok'
+        assert (await client.get('/dry_run')).json() == {'status': 'ok'}
+        r = await client.get('/owner', headers={'origin': 'https://example.com'})
+        assert r.status_code == 200
+        assert r.headers['access-control-allow-origin'] == 'https://example.com'
+
+        drainer.begin()
+        assert (await client.get('/healthz')).status_code == 503
+
+
+@contextmanager
+def _serving(**kwargs):
+    port = get_free_port()
+    process = multiprocessing.get_context('spawn').Process(
+        target=serve_direct,
+        kwargs=dict(
+            app='direct_app:app', host='127.0.0.1', port=port, drain_delay=0, **kwargs
+        ),
+    )
+    process.start()
+    url = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f'{url}/healthz').raise_for_status()
+                break
+            except httpx.HTTPError:
+                assert process.is_alive() and time.monotonic() < deadline
+                time.sleep(0.1)
+        yield url, process
+    finally:
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGTERM)
+        process.join(10)
+
+
+def test_serve_direct_stops_gracefully(app_dir):
+    with _serving() as (url, process):
+        assert httpx.get(f'{url}/owner').status_code == 200
+        os.kill(process.pid, signal.SIGTERM)
+        process.join(10)
+    # uvicorn re-raises the signal once it has shut down gracefully
+    assert process.exitcode == -signal.SIGTERM
+
+
+def test_serve_direct_sets_the_flow_user(app_dir, monkeypatch):
+    pytest.importorskip('hubble')
+    monkeypatch.delenv('JINA_FLOW_USER_ID', raising=False)
+    with _serving(user_id='user-id') as (url, _):
+        # the only user `authorize` lets in
+        assert httpx.get(f'{url}/owner').json() == 'user-id'
@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+import aiohttp
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from uvicorn import Config
+
+from fastapi_serve.cloud.config import ServerConfig
+from fastapi_serve.cloud.errors import InvalidServerConfigError
+from fastapi_serve.gateway.drain import (
+    DRAIN_CLOSE_CODE,
+    DRAIN_CLOSE_REASON,
+    DrainingServer,
+)
+from fastapi_serve.gateway.helper import register_healthz, setup_drain_middleware
+from fastapi_serve.helper import get_free_port
+
+
+def _app(timeout: float, delay: float):
+    app = FastAPI()
+
+    @app.get('/slow')
+    async def slow(seconds: float = 0.5):
+        await asyncio.sleep(seconds)
+        return {'slept': seconds}
+
+    @app.websocket('/ws')
+    async def ws(websocket: WebSocket):
+        await websocket.accept()
+        try:
+            while True:
+                await websocket.send_text(await websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+
+    drainer = setup_drain_middleware(app, timeout=timeout, delay=delay)
+    register_healthz(app, drainer=drainer)
+    return app, drainer
+
+
+@pytest_asyncio.fixture
+async def serve():
+    servers = []
+
+    async def _serve(timeout: float = 5, delay: float = 0):
+        app, drainer = _app(timeout, delay)
+        port = get_free_port()
+        config = Config(app, host='127.0.0.1', port=port, log_level='error')
+        server = DrainingServer(config, drainer)
+        task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        servers.append((server, task))
+        return f'127.0.0.1:{port}', server, task
+
+    yield _serve
+    for server, task in servers:
+        server.should_exit = True
+        await task
+
+
+@pytest.mark.asyncio
+async def test_inflight_requests_finish(serve):
+    url, server, task = await serve()
+    async with aiohttp.ClientSession() as session:
+        request = asyncio.create_task(session.get(f'http://{url}/slow?seconds=0.5'))
+        await asyncio.sleep(0.1)
+        server.should_exit = True
+
+        r = await request
+        assert r.status == 200 and await r.json() == {'slept': 0.5}
+        # the keep-alive connection is handed off
+        assert r.headers['connection'] == 'close'
+        await task
+        assert server.drainer.finished == 1
+
+        with pytest.raises(aiohttp.ClientConnectorError):
+            await session.get(f'http://{url}/slow?seconds=0')
+
+
+@pytest.mark.asyncio
+async def test_readiness_fails_during_delay(serve):
+    url, server, task = await serve(delay=0.5)
+    async with aiohttp.ClientSession() as session:
+        server.should_exit = True
+        await asyncio.sleep(0.1)
+        async with session.get(f'http://{url}/healthz') as r:
+            assert r.status == 503 and await r.json() == {'status': 'draining'}
+        # still serving, until load balancers stop routing here
+        async with session.get(f'http://{url}/slow?seconds=0') as r:
+            assert r.status == 200
+    await task
+
+
+@pytest.mark.asyncio
+async def test_websockets_closed_with_reconnect_hint(serve):
+    pytest.importorskip('websockets')
+    url, server, task = await serve()
+    async with aiohttp.ClientSession() as session:
+        async with session.ws_connect(f'ws://{url}/ws') as ws:
+            await ws.send_str('ping')
+            assert (await ws.receive()).data == 'ping'
+
+            server.should_exit = True
+            msg = await ws.receive()
+            assert msg.type == aiohttp.WSMsgType.CLOSE
+            assert msg.data == DRAIN_CLOSE_CODE
+            assert msg.extra == DRAIN_CLOSE_REASON
+    await task
+    assert server.drainer.websockets_closed == 1
+
+
+@pytest.mark.asyncio
+async def test_drain_middleware_closes_websockets():
+    app, drainer = _app(timeout=5, delay=0)
+    incoming = asyncio.Queue()
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+        if message['type'] == 'websocket.close':
+            await incoming.put({'type': 'websocket.disconnect', 'code': 1012})
+
+    scope = {
+        'type': 'websocket',
+        'path': '/ws',
+        'raw_path': b'/ws',
+        'root_path': '',
+        'query_string': b'',
+        'headers': [],
+        'subprotocols': [],
+    }
+    await incoming.put({'type': 'websocket.connect'})
+    task = asyncio.create_task(app(scope, incoming.get, send))
+    while not drainer._websockets:
+        await asyncio.sleep(0.01)
+
+    report = await drainer.wait()
+    await task
+    assert [m['type'] for m in sent] == ['websocket.accept', 'websocket.close']
+    assert sent[-1]['code'] == DRAIN_CLOSE_CODE
+    assert report.websockets_closed == 1 and report.aborted == 0
+
+
+@pytest.mark.asyncio
+async def test_requests_past_the_timeout_are_aborted(serve):
+    url, server, task = await serve(timeout=0.3)
+    async with aiohttp.ClientSession() as session:
+        request = asyncio.create_task(session.get(f'http://{url}/slow?seconds=10'))
+        await asyncio.sleep(0.1)
+        start = time.monotonic()
+        server.should_exit = True
+        await task
+        assert time.monotonic() - start < 2
+        # cancelled by uvicorn, which answers with an error
+        r = await request
+        assert r.status == 500
+
+
+def test_termination_grace_period_covers_the_drain():
+    assert ServerConfig().termination_grace_period == 40
+    config = ServerConfig.from_dict({'server': {'drain_timeout': 10, 'drain_delay': 5}})
+    assert config.termination_grace_period == 20
+    assert config.to_uvicorn_kwargs() == {}
+
+    with pytest.raises(InvalidServerConfigError):
+        ServerConfig(drain_timeout=0)
+    with pytest.raises(InvalidServerConfigError):
+        ServerConfig(drain_delay=-1)
@@ -0,0 +1,157 @@
+import os
+
+import yaml
+
+from fastapi_serve.cloud.config import JCloudConfig
+from fastapi_serve.cloud.export import (
+    REQUEST_RATE_METRIC,
+    get_k8s_hpa,
+    get_k8s_resources,
+    get_nginx_conf,
+    patch_compose_replicas,
+    patch_k8s_gateway,
+)
+
+# trimmed down output of `Flow.to_kubernetes_yaml` for the gateway
+GATEWAY_YAML = [
+    {
+        'apiVersion': 'v1',
+        'kind': 'ConfigMap',
+        'metadata': {'name': 'gateway-configmap', 'namespace': 'default'},
+        'data': {'JINA_LOG_LEVEL': 'INFO'},
+    },
+    {
+        'apiVersion': 'apps/v1',
+        'kind': 'Deployment',
+        'metadata': {'name': 'gateway', 'namespace': 'default'},
+        'spec': {
+            'replicas': 1,
+            'selector': {'matchLabels': {'app': 'gateway'}},
+            'template': {
+                'metadata': {'labels': {'app': 'gateway'}},
+                'spec': {
+                    'containers': [
+                        {
+                            'name': 'gateway',
+                            'image': 'jinaai/jina',
+                            'ports': [{'containerPort': 8080}],
+                        }
+                    ]
+                },
+            },
+        },
+    },
+]
+
+
+def _export(tmp_path, config: dict) -> str:
+    os.makedirs(tmp_path / 'gateway')
+    with open(tmp_path / 'gateway' / 'gateway.yml', 'w') as fp:
+        yaml.safe_dump_all(GATEWAY_YAML, fp)
+    patch_k8s_gateway(str(tmp_path), JCloudConfig.from_dict(config))
+    return str(tmp_path / 'gateway')
+
+
+def _load(path: str):
+    with open(path) as fp:
+        return [d for d in yaml.safe_load_all(fp) if d]
+
+
+def test_gateway_is_patched_from_config(tmp_path):
+    gateway = _export(
+        tmp_path,
+        {'instance': 'C4', 'timeout': 300, 'autoscale': {'min': 2, 'max': 6}},
+    )
+
+    configmap, deployment = _load(os.path.join(gateway, 'gateway.yml'))
+    assert configmap == GATEWAY_YAML[0]
+    assert deployment['spec']['replicas'] == 2
+    container = deployment['spec']['template']['spec']['containers'][0]
+    assert container['resources']['requests'] == {'cpu': '2000m', 'memory': '4096Mi'}
+    assert container['resources']['limits'] == container['resources']['requests']
+    assert container['readinessProbe']['httpGet'] == {'path': '/healthz', 'port': 8080}
+    # the app gets the configured timeout to start
+    startup = container['startupProbe']
+    assert startup['periodSeconds'] * startup['failureThreshold'] == 300
+
+    (hpa,) = _load(os.path.join(gateway, 'hpa.yml'))
+    assert hpa['spec']['scaleTargetRef']['name'] == 'gateway'
+    assert (hpa['spec']['minReplicas'], hpa['spec']['maxReplicas']) == (2, 6)
+    assert hpa['spec']['metrics'][0]['resource'] == {
+        'name': 'cpu',
+        'target': {'type': 'Utilization', 'averageUtilization': 70},
+    }
+    assert hpa['spec']['behavior']['scaleDown']['stabilizationWindowSeconds'] == 300
+
+    (pdb,) = _load(os.path.join(gateway, 'pdb.yml'))
+    assert pdb['spec'] == {
+        'maxUnavailable': 1,
+        'selector': {'matchLabels': {'app': 'gateway'}},
+    }
+
+
+def test_unknown_instance_has_no_resources(tmp_path):
+    assert get_k8s_resources('G1') is None
+    gateway = _export(tmp_path, {'instance': 'G1'})
+    _, deployment = _load(os.path.join(gateway, 'gateway.yml'))
+    assert 'resources' not in deployment['spec']['template']['spec']['containers'][0]
+
+
+def test_rps_hpa():
+    config = JCloudConfig.from_dict(
+        {'autoscale': {'min': 0, 'metric': 'rps', 'target': 20}}
+    )
+    spec = get_k8s_hpa(config.autoscale)['spec']
+    assert spec['minReplicas'] == 1
+    assert spec['metrics'][0]['pods'] == {
+        'metric': {'name': REQUEST_RATE_METRIC},
+        'target': {'type': 'AverageValue', 'averageValue': '20'},
+    }
+
+
+# trimmed down output of `Flow.to_docker_compose_yaml`
+COMPOSE_YAML = {
+    'version': '3.3',
+    'networks': {'jina-network': {'driver': 'bridge'}},
+    'services': {
+        'gateway': {
+            'image': 'jinaai/jina',
+            'entrypoint': ['jina'],
+            'command': ['gateway', '--port', '8080'],
+            'expose': [8080],
+            'ports': ['8080:8080'],
+            'healthcheck': {'test': 'jina ping gateway http://127.0.0.1:8080'},
+            'networks': ['jina-network'],
+        }
+    },
+}
+
+
+def test_compose_replicas_behind_nginx(tmp_path):
+    compose_path = str(tmp_path / 'docker-compose.yml')
+    with open(compose_path, 'w') as fp:
+        yaml.safe_dump(COMPOSE_YAML, fp)
+
+    patch_compose_replicas(compose_path, replicas=4, timeout=300)
+
+    with open(compose_path) as fp:
+        services = yaml.safe_load(fp)['services']
+    assert services['gateway']['deploy'] == {'replicas': 4}
+    assert 'ports' not in services['gateway']
+    nginx = services['nginx']
+    assert nginx['ports'] == ['8080:80']
+    assert nginx['networks'] == ['jina-network']
+    assert nginx['depends_on'] == {'gateway': {'condition': 'service_healthy'}}
+
+    conf = (tmp_path / 'nginx.conf').read_text()
+    assert 'server gateway:8080 resolve;' in conf
+    assert 'proxy_read_timeout 300s;' in conf
+    assert conf.count('{') == conf.count('}')
+
+
+def test_nginx_caches_static_paths_only():
+    conf = get_nginx_conf(static_paths=['static', '/assets/'])
+    locations = conf.split('location ')[1:]
+    assert [loc.split(' ')[0] for loc in locations] == ['/static/', '/assets/', '/']
+    assert ['proxy_cache static;' in loc for loc in locations] == [True, True, False]
+    assert all('proxy_set_header Upgrade $http_upgrade;' in loc for loc in locations)
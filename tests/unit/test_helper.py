@@ -0,0 +1,38 @@
+import asyncio
+import threading
+
+import pytest
+
+from fastapi_serve.helper import asyncio_run, asyncio_run_property
+
+
+async def _where(value):
+    await asyncio.sleep(0)
+    return value, threading.current_thread(), asyncio.get_running_loop()
+
+
+async def _fail():
+    raise ValueError('failed')
+
+
+def test_run_outside_a_loop():
+    value, thread, loop = asyncio_run(_where, 1)
+    assert value == 1 and thread is threading.current_thread()
+    assert loop.is_closed()
+    assert asyncio_run_property(_where(2))[0] == 2
+
+    with pytest.raises(ValueError, match='failed'):
+        asyncio_run(_fail)
+
+
+@pytest.mark.asyncio
+async def test_run_inside_a_running_loop():
+    # e.g. sync helpers called from the CLI's `syncify` commands
+    running = asyncio.get_running_loop()
+    value, thread, loop = asyncio_run(_where, 1)
+    assert value == 1 and thread is not threading.current_thread()
+    assert loop is not running and not running.is_closed()
+    assert asyncio_run_property(_where(2))[0] == 2
+
+    with pytest.raises(ValueError, match='failed'):
+        asyncio_run(_fail)
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Generous enough for slow CI machines, the CLI entry point takes ~0.1s locally
+CLI_IMPORT_BUDGET_US = int(
+    os.environ.get('FASTAPI_SERVE_CLI_IMPORT_BUDGET_US', 500_000)
+)
+
+HEAVY_MODULES = [
+    'aiohttp',
+    'dotenv',
+    'fastapi',
+    'hubble',
+    'jcloud',
+    'jina',
+    'opentelemetry',
+    'requests',
+    'rich',
+    'starlette',
+    'uvicorn',
+]
+
+
+def _run_python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def _importtime(statement: str) -> int:
+    """Cumulative import time (in us) of the `fastapi_serve` modules imported by `statement`"""
+    total = 0
+    for line in _run_python('-X', 'importtime', '-c', statement).stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line.split('|')
+        # only top-level imports, nested ones are included in their parent's cumulative time
+        if name.startswith(' ' * 2) or not name.strip().startswith('fastapi_serve'):
+            continue
+        total += int(cumulative)
+    return total
+
+
+def test_cli_import_time_within_budget():
+    import_time = _importtime('import fastapi_serve.__main__')
+    assert import_time < CLI_IMPORT_BUDGET_US, (
+        f'Importing the CLI took {import_time / 1000:.0f} ms, '
+        f'budget is {CLI_IMPORT_BUDGET_US / 1000:.0f} ms'
+    )
+
+
+@pytest.mark.parametrize(
+    'statement', ['import fastapi_serve.__main__', 'import fastapi_serve']
+)
+def test_no_heavy_imports(statement):
+    out = _run_python(
+        '-c',
+        f'{statement}; import sys; print(" ".join(sys.modules))',
+    ).stdout
+    loaded = {m.split('.')[0] for m in out.split()}
+    assert not loaded & set(HEAVY_MODULES)
+
+
+def test_sdk_exports_are_lazy():
+    import fastapi_serve
+
+    assert 'JinaAuthMiddleware' in dir(fastapi_serve)
+    with pytest.raises(AttributeError):
+        fastapi_serve.DoesNotExist
@@ -0,0 +1,162 @@
+import asyncio
+import math
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from fastapi_serve.cloud.config import ServerConfig
+from fastapi_serve.cloud.errors import InvalidServerConfigError
+from fastapi_serve.gateway.helper import (
+    register_healthz,
+    setup_adaptive_concurrency_middleware,
+)
+from fastapi_serve.gateway.limiter import AdaptiveLimiter
+
+
+def _saturate(limiter: AdaptiveLimiter, rtt, n: int):
+    """`n` requests with the limiter full, `rtt` maps the concurrency to latency"""
+    for _ in range(n):
+        inflight = limiter.current
+        limiter.inflight = inflight
+        limiter.release(rtt(inflight))
+
+
+def test_limit_grows_while_latency_is_flat():
+    limiter = AdaptiveLimiter(initial=10, max_limit=100)
+    _saturate(limiter, lambda c: 0.01, 200)
+    assert limiter.current == 100
+
+
+def test_limit_converges_on_the_capacity():
+    # 40 requests are served in parallel, past that they queue
+    capacity = 40
+    limiter = AdaptiveLimiter(initial=10)
+    _saturate(limiter, lambda c: 0.01 * max(c / capacity, 1), 900)
+    assert capacity <= limiter.current <= capacity * 2
+
+    # the app got slower, a probe re-measures the latency without queuing
+    _saturate(limiter, lambda c: 0.03 * max(c / capacity, 1), 1000)
+    assert limiter.min_rtt == pytest.approx(0.03)
+    assert capacity <= limiter.current <= capacity * 2
+
+
+def test_limit_holds_when_app_limited_and_shrinks_when_overloaded():
+    limiter = AdaptiveLimiter(initial=20)
+    for _ in range(100):
+        limiter.inflight = 1
+        limiter.release(0.01)
+    assert limiter.current == 20
+
+    limiter.inflight = 1
+    limiter.release(None, overloaded=True)
+    assert limiter.current == 18
+    # no response, but not the server's fault
+    limiter.inflight = 1
+    limiter.release(None)
+    assert limiter.current == 18
+
+    # a burst of overloaded requests shrinks it once per recent latency
+    limiter.short_rtt, limiter._shrunk = 60, -math.inf
+    for _ in range(10):
+        limiter.inflight = 1
+        limiter.release(0.001, overloaded=True)
+    assert limiter.current == 16
+
+
+def test_healthy_load_isnt_shed_across_a_probe():
+    limiter = AdaptiveLimiter(initial=60, max_limit=60, probe_interval=100)
+    # a steady 40 requests in flight, with flat latency
+    for _ in range(40):
+        assert limiter.try_acquire()
+    for i in range(300):
+        limiter.release(0.01 + i % 3 * 0.001)
+        assert limiter.try_acquire()
+    assert limiter.rejected == 0 and limiter.current == 60
+    assert limiter.min_rtt == 0.01
+
+
+@pytest.mark.asyncio
+async def test_only_overload_shrinks_the_limit():
+    app = FastAPI()
+    started = asyncio.Event()
+
+    @app.get('/broken')
+    async def broken():
+        raise RuntimeError('broken')
+
+    @app.get('/unavailable', status_code=503)
+    async def unavailable():
+        return {}
+
+    @app.get('/timeout')
+    async def timeout():
+        await asyncio.wait_for(asyncio.sleep(10), 0.01)
+
+    @app.get('/slow')
+    async def slow():
+        started.set()
+        await asyncio.sleep(10)
+
+    limiter = setup_adaptive_concurrency_middleware(app)
+    limiter.limit = 100
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        # a bug, not overload
+        for _ in range(50):
+            assert (await client.get('/broken')).status_code == 500
+        assert limiter.current == 100
+        assert (await client.get('/unavailable')).status_code == 503
+        assert limiter.current == 90
+        limiter._shrunk = -math.inf
+        assert (await client.get('/timeout')).status_code == 500
+        assert limiter.current == 81
+
+        # the client going away cancels the request
+        disconnected = asyncio.create_task(client.get('/slow'))
+        await started.wait()
+        disconnected.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await disconnected
+    assert limiter.current == 81 and limiter.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_requests_past_the_limit_are_shed():
+    app = FastAPI()
+    release = asyncio.Event()
+
+    @app.get('/work')
+    async def work():
+        await release.wait()
+        return {}
+
+    register_healthz(app)
+    limiter = setup_adaptive_concurrency_middleware(app)
+    limiter.limit = 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        blocked = asyncio.create_task(client.get('/work'))
+        while not limiter.inflight:
+            await asyncio.sleep(0.01)
+
+        r = await client.get('/work')
+        assert r.status_code == 503 and r.headers['retry-after'] == '1'
+        # probes have their own lane
+        assert (await client.get('/healthz')).status_code == 200
+
+        release.set()
+        assert (await blocked).status_code == 200
+    assert limiter.inflight == 0 and limiter.rejected == 1
+
+
+def test_server_config_validation():
+    config = ServerConfig.from_dict(
+        {'server': {'adaptive_concurrency': True, 'max_concurrency': 64}}
+    )
+    assert config.max_concurrency == 64 and config.to_uvicorn_kwargs() == {}
+    with pytest.raises(InvalidServerConfigError):
+        ServerConfig(adaptive_concurrency='yes')
+    with pytest.raises(InvalidServerConfigError):
+        ServerConfig(max_concurrency=0)
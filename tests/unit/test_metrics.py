@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from fastapi_serve.cloud.config import JCloudConfig
+from fastapi_serve.cloud.export import INFLIGHT_METRIC, get_k8s_hpa
+from fastapi_serve.cloud.simulate import AutoscaleSimulator, synthetic_trace
+from fastapi_serve.gateway.helper import MetricsMiddleware
+
+
+class _Histogram:
+    def __init__(self):
+        self.records = []
+
+    def record(self, amount, attributes=None):
+        self.records.append((amount, attributes))
+
+
+class _UpDownCounter:
+    def __init__(self):
+        self.value = 0
+        self.peak = 0
+
+    def add(self, amount, attributes=None):
+        self.value += amount
+        self.peak = max(self.peak, self.value)
+
+
+def test_inflight_requests_are_counted():
+    inflight = _UpDownCounter()
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, inflight_counter=inflight)
+    seen = []
+
+    @app.get('/work')
+    async def work():
+        seen.append(inflight.value)
+        await asyncio.sleep(0)
+        return {}
+
+    @app.get('/fail')
+    async def fail():
+        raise RuntimeError
+
+    @app.get('/healthz')
+    async def healthz():
+        seen.append(inflight.value)
+        return {}
+
+    with TestClient(app, raise_server_exceptions=False) as client:
+        assert client.get('/work').status_code == 200
+        assert client.get('/healthz').status_code == 200
+        assert client.get('/fail').status_code == 500
+
+    # health checks aren't load, and failed requests leave the count
+    assert seen == [1, 0]
+    assert inflight.value == 0 and inflight.peak == 1
+
+
+def test_concurrency_metric():
+    config = JCloudConfig.from_dict({'autoscale': {'min': 0, 'metric': 'concurrency'}})
+    assert config.autoscale.min == 0
+    assert config.autoscale.target == 10
+
+    # 100 rps at 500ms per request keep ~50 requests in flight, i.e. 5 replicas
+    result = AutoscaleSimulator(
+        config, capacity=100, service_time=0.5, cold_start=0
+    ).run(synthetic_trace('constant', rps=100, base_rps=0, duration=600))
+    assert result.timeline[-1]['ready'] == 5
+
+
+def test_concurrency_hpa():
+    config = JCloudConfig.from_dict(
+        {'autoscale': {'min': 0, 'max': 4, 'metric': 'concurrency', 'target': 8}}
+    )
+    spec = get_k8s_hpa(config.autoscale)['spec']
+    assert spec['scaleTargetRef']['name'] == 'gateway'
+    assert (spec['minReplicas'], spec['maxReplicas']) == (1, 4)
+    assert spec['metrics'][0]['pods'] == {
+        'metric': {'name': INFLIGHT_METRIC},
+        'target': {'type': 'AverageValue', 'averageValue': '8'},
+    }
+
+
+@pytest.mark.parametrize('metric', ['cpu', 'rps'])
+def test_default_targets_are_unchanged(metric):
+    config = JCloudConfig.from_dict({'autoscale': {'metric': metric}})
+    assert config.autoscale.target == 70
+
+
+def test_latency_is_recorded_with_status_code():
+    latency = _Histogram()
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, latency_histogram=latency)
+
+    @app.get('/ok')
+    async def ok():
+        return {}
+
+    @app.get('/fail')
+    async def fail():
+        raise RuntimeError
+
+    with TestClient(app, raise_server_exceptions=False) as client:
+        client.get('/ok')
+        client.get('/missing')
+        client.get('/fail')
+
+    assert [(a['route'], a['status_code']) for _, a in latency.records] == [
+        ('/ok', '200'),
+        ('/missing', '404'),
+        ('/fail', '500'),
+    ]
+    assert all(ms > 0 and a['replica'] for ms, a in latency.records)
@@ -0,0 +1,75 @@
+import copy
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCRIPT = os.path.join(ROOT, 'benchmarks', 'middleware.py')
+
+# Both are relative to the bare app in the same run, so they hold on any machine, Python
+# & starlette. Each layer's time is the median of its ratios to the bare app timed right
+# before it, within ~15% across runs. Allocations are exact.
+TIME_TOLERANCE = os.environ.get('FASTAPI_SERVE_MIDDLEWARE_TIME_TOLERANCE', '0.3')
+
+
+def _load_benchmark():
+    spec = importlib.util.spec_from_file_location('middleware_benchmark', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_middleware_overhead_against_baselines():
+    result = subprocess.run(
+        [
+            sys.executable,
+            SCRIPT,
+            '--check',
+            '--requests',
+            '200',
+            '--repeat',
+            '5',
+            '--time-tolerance',
+            TIME_TOLERANCE,
+        ],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+def test_regressions_are_reported():
+    benchmark = _load_benchmark()
+    with open(benchmark.BASELINES) as f:
+        baselines = json.load(f)
+
+    results = copy.deepcopy(baselines['results'])
+    assert not benchmark.check(results, baselines, 0.5, 0.1)
+
+    results['http']['logging']['ratio'] *= 1.5
+    results['websocket']['metrics']['extra_bytes'] += 4096
+    regressions = benchmark.check(results, baselines, 0.3, 0.1)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('http/logging:')
+    assert regressions[1].startswith('websocket/metrics:')
+
+    # the bare app allocating more elsewhere isn't a layer's regression
+    for layer in results['stream'].values():
+        layer['peak_bytes'] += 4096
+    # nor are baselines from another Python & starlette ignored
+    baselines['environment'] = {'python': '3.9', 'starlette': '0.27.0'}
+    assert len(benchmark.check(results, baselines, 0.3, 0.1)) == 2
+
+
+@pytest.mark.parametrize('kind', ['http', 'stream', 'websocket'])
+def test_requests_are_driven_in_process(kind):
+    benchmark = _load_benchmark()
+    results = benchmark.measure(['none', 'stack'], kind, requests=5, repeat=1)
+    assert set(results) == {'none', 'stack'}
+    assert all(r['ns'] > 0 and r['peak_bytes'] > 0 for r in results.values())
+    assert results['none']['ratio'] == 1.0 and results['stack']['ratio'] > 0
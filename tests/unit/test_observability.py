@@ -0,0 +1,77 @@
+import json
+import os
+
+import yaml
+
+from fastapi_serve.cloud.observability import (
+    add_compose_observability,
+    add_k8s_observability,
+    get_collector_config,
+    get_grafana_dashboard,
+)
+
+
+def test_compose_observability(tmp_path):
+    compose_path = str(tmp_path / 'docker-compose.yml')
+    with open(compose_path, 'w') as fp:
+        yaml.safe_dump(
+            {'services': {'gateway': {'image': 'app', 'networks': ['jina-network']}}},
+            fp,
+        )
+
+    add_compose_observability(compose_path)
+
+    with open(compose_path) as fp:
+        services = yaml.safe_load(fp)['services']
+    assert set(services) == {'gateway', 'otel-collector', 'prometheus', 'grafana'}
+    assert services['gateway']['depends_on'] == {
+        'otel-collector': {'condition': 'service_started'}
+    }
+    assert all(s['networks'] == ['jina-network'] for s in services.values())
+
+    # every mounted config exists next to the compose file
+    for service in services.values():
+        for volume in service.get('volumes', []):
+            assert os.path.exists(tmp_path / volume.split(':')[0])
+
+    with open(tmp_path / 'observability' / 'dashboards' / 'fastapi-serve.json') as fp:
+        assert json.load(fp)['uid'] == 'fastapi-serve'
+
+
+def test_k8s_observability(tmp_path):
+    add_k8s_observability(str(tmp_path), namespace='apps')
+
+    kinds = {}
+    for name in ('otel-collector', 'prometheus', 'grafana'):
+        with open(tmp_path / 'observability' / f'{name}.yml') as fp:
+            for doc in yaml.safe_load_all(fp):
+                kinds.setdefault(doc['kind'], []).append(doc['metadata']['name'])
+                if doc['kind'] == 'ConfigMap':
+                    # embedded configs are valid yaml/json
+                    for content in doc['data'].values():
+                        assert yaml.safe_load(content)
+
+    assert kinds['Deployment'] == ['otel-collector', 'prometheus', 'grafana']
+    assert kinds['Service'] == ['otel-collector', 'prometheus', 'grafana']
+    assert kinds['ClusterRoleBinding'] == ['otel-collector']
+
+
+def test_collector_labels_pods_on_kubernetes():
+    pipeline = get_collector_config(kubernetes=True)['service']['pipelines']
+    assert pipeline['metrics']['processors'] == ['k8sattributes', 'batch']
+    pipeline = get_collector_config()['service']['pipelines']
+    assert pipeline['metrics']['processors'] == ['batch']
+
+
+def test_dashboard_queries_gateway_metrics():
+    exprs = [
+        target['expr']
+        for panel in get_grafana_dashboard()['panels']
+        for target in panel['targets']
+    ]
+    for metric in (
+        'fastapi_serve_request_latency_milliseconds_bucket',
+        'fastapi_serve_request_count_total',
+        'fastapi_serve_inflight_requests',
+    ):
+        assert any(metric in expr for expr in exprs)
@@ -0,0 +1,95 @@
+import hashlib
+import os
+
+import pytest
+
+from fastapi_serve import ProcessPool
+from fastapi_serve.utils.offload import _share, _Shared, available_cpus
+
+pool = ProcessPool('test', max_workers=2, shared_memory_threshold=1024)
+
+
+@pool
+def pid():
+    return os.getpid()
+
+
+@pool
+def digest(data: bytes, salt: bytes = b''):
+    return len(data), hashlib.sha256(salt + data).hexdigest()
+
+
+@pool
+def echo(data):
+    return data
+
+
+@pool
+def fail():
+    raise ValueError('failed in the pool')
+
+
+def square(x: int) -> int:
+    return x * x
+
+
+@pytest.fixture(scope='module', autouse=True)
+def _shutdown():
+    yield
+    pool.shutdown()
+
+
+def _shared_memory() -> set:
+    return set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+
+
+@pytest.mark.asyncio
+async def test_runs_in_the_pool():
+    assert await pid() != os.getpid()
+    assert await pool.run(square, 7) == 49
+
+    with pytest.raises(ValueError, match='failed in the pool'):
+        await fail()
+    assert pool.stats()['failed'] == 1 and pool.stats()['inflight'] == 0
+
+
+@pytest.mark.asyncio
+async def test_large_bytes_are_shared_both_ways():
+    before = _shared_memory()
+    data = os.urandom(1 << 20)
+    assert await digest(data, salt=b'x' * 2048) == (
+        len(data),
+        hashlib.sha256(b'x' * 2048 + data).hexdigest(),
+    )
+    assert await echo(data) == data
+    assert await echo(b'small') == b'small'
+    # nothing left behind
+    assert _shared_memory() == before
+
+
+def test_only_large_values_are_shared():
+    names = []
+    assert _share(b'x' * 1023, 1024, names) == b'x' * 1023
+    shared = _share(bytearray(2048), 1024, names)
+    assert isinstance(shared, _Shared) and shared.size == 2048
+    assert names == [shared.name]
+
+    from fastapi_serve.utils.offload import _unlink
+
+    _unlink(names)
+
+
+def test_only_module_level_sync_functions():
+    with pytest.raises(TypeError):
+
+        @pool
+        async def not_cpu_bound():
+            pass
+
+    with pytest.raises(TypeError):
+
+        @pool
+        def nested():
+            pass
+
+    assert available_cpus() >= 1
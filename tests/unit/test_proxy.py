@@ -0,0 +1,197 @@
+import asyncio
+import logging
+
+import aiohttp
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from fastapi_serve.gateway.proxy import (
+    LeastConnectionsBalancer,
+    ReverseProxy,
+    Upstream,
+)
+from fastapi_serve.helper import get_free_port
+
+
+def _replica(name: str) -> web.Application:
+    async def healthz(request):
+        return web.json_response({})
+
+    async def who(request):
+        await asyncio.sleep(float(request.query.get('sleep', 0)))
+        return web.json_response(
+            {'replica': name, 'forwarded_for': request.headers['X-Forwarded-For']}
+        )
+
+    async def echo(request):
+        return web.Response(body=await request.read(), headers={'X-Replica': name})
+
+    async def ws(request):
+        ws = web.WebSocketResponse(protocols=['chat'])
+        await ws.prepare(request)
+        async for msg in ws:
+            await ws.send_str(f'{name}:{msg.data}')
+        return ws
+
+    app = web.Application()
+    app.router.add_get('/healthz', healthz)
+    app.router.add_get('/who', who)
+    app.router.add_post('/echo', echo)
+    app.router.add_get('/ws', ws)
+    return app
+
+
+@pytest_asyncio.fixture
+async def replicas():
+    runners, urls = [], []
+    for name in ('a', 'b'):
+        runner = web.AppRunner(_replica(name))
+        await runner.setup()
+        port = get_free_port()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        runners.append(runner)
+        urls.append(f'http://127.0.0.1:{port}')
+    yield runners, urls
+    for runner in runners:
+        await runner.cleanup()
+
+
+@pytest_asyncio.fixture
+async def proxy(replicas):
+    _, urls = replicas
+    port = get_free_port()
+    p = ReverseProxy(urls, logger=logging.getLogger(__name__), health_interval=0.1)
+    await p.start(host='127.0.0.1', port=port)
+    await p.wait_until_healthy(timeout=5)
+    p.url = f'http://127.0.0.1:{port}'
+    yield p
+    await p.stop()
+
+
+def test_least_connections_breaks_ties_round_robin():
+    upstreams = [Upstream('http://a'), Upstream('http://b'), Upstream('http://c')]
+    for u in upstreams:
+        u.healthy = True
+    balancer = LeastConnectionsBalancer(upstreams)
+    assert [balancer.pick().url for _ in range(3)] == [
+        'http://a',
+        'http://b',
+        'http://c',
+    ]
+
+    upstreams[0].inflight = upstreams[1].inflight = 2
+    assert {balancer.pick().url for _ in range(3)} == {'http://c'}
+
+    upstreams[2].healthy = False
+    assert balancer.pick().url in ('http://a', 'http://b')
+
+
+@pytest.mark.asyncio
+async def test_busy_replica_is_skipped(proxy):
+    async with aiohttp.ClientSession() as session:
+
+        async def _who(sleep=0):
+            async with session.get(f'{proxy.url}/who?sleep={sleep}') as r:
+                return (await r.json())['replica']
+
+        slow = asyncio.create_task(_who(sleep=0.5))
+        await asyncio.sleep(0.1)
+        busy = next(u for u in proxy.upstreams if u.inflight)
+        fast = [await _who() for _ in range(4)]
+        assert busy.url not in fast and len(set(fast)) == 1
+        await slow
+
+
+@pytest.mark.asyncio
+async def test_bodies_and_headers_are_forwarded(proxy):
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f'{proxy.url}/echo', data=b'x' * 100_000) as r:
+            assert r.status == 200
+            assert await r.read() == b'x' * 100_000
+            assert r.headers['X-Replica'] in ('a', 'b')
+
+        async with session.get(f'{proxy.url}/who') as r:
+            assert (await r.json())['forwarded_for'] == '127.0.0.1'
+
+
+@pytest.mark.asyncio
+async def test_websocket_pass_through(proxy):
+    async with aiohttp.ClientSession() as session:
+        async with session.ws_connect(f'{proxy.url}/ws', protocols=['chat']) as ws:
+            assert ws.protocol == 'chat'
+            await ws.send_str('hello')
+            assert (await ws.receive_str()).endswith(':hello')
+
+
+@pytest.mark.asyncio
+async def test_dead_replica_is_taken_out_of_rotation(proxy, replicas):
+    runners, urls = replicas
+    await runners[0].cleanup()
+
+    async with aiohttp.ClientSession() as session:
+        statuses = []
+        for _ in range(4):
+            async with session.get(f'{proxy.url}/who') as r:
+                statuses.append(r.status)
+        # at most the request that found the replica dead fails
+        assert statuses.count(502) <= 1 and statuses[-1] == 200
+        assert not proxy.upstreams[0].healthy
+
+        await runners[1].cleanup()
+        await asyncio.sleep(0.3)
+        async with session.get(f'{proxy.url}/who') as r:
+            assert r.status == 503
+
+
+@pytest.mark.asyncio
+async def test_upstream_is_drained_before_removal(proxy, replicas):
+    async with aiohttp.ClientSession() as session:
+
+        async def _who(sleep=0):
+            async with session.get(f'{proxy.url}/who?sleep={sleep}') as r:
+                assert r.status == 200
+                return (await r.json())['replica']
+
+        slow = asyncio.create_task(_who(sleep=0.3))
+        await asyncio.sleep(0.1)
+        busy = next(u for u in proxy.upstreams if u.inflight)
+        draining = asyncio.create_task(proxy.drain(busy, timeout=5))
+        await asyncio.sleep(0.05)
+        # no new requests while its in-flight one finishes
+        assert busy in proxy.upstreams
+        assert {await _who() for _ in range(4)} == {await _who()}
+        assert await draining and busy not in proxy.upstreams
+        await slow
+
+        upstream = proxy.add_upstream(busy.url)
+        assert not upstream.healthy
+        await proxy.wait_until_healthy(timeout=5)
+        assert len({await _who() for _ in range(4)}) == 2
+
+
+@pytest.mark.asyncio
+async def test_each_upstream_gets_its_own_pool(proxy):
+    connector = proxy._session.connector
+    # not capped at aiohttp's default of 100 connections overall
+    assert connector.limit == 0 and connector.limit_per_host == proxy.pool_size
+
+
+def test_replicas_listen_on_loopback(monkeypatch):
+    from fastapi_serve.cloud.deploy import LocalReplicas
+
+    started = []
+
+    class _Process:
+        pid = 1
+
+        def __init__(self, target, kwargs, name):
+            started.append(kwargs)
+
+        def start(self):
+            pass
+
+    replicas = LocalReplicas('main:app', replicas=2, logger=logging.getLogger())
+    monkeypatch.setattr(replicas._ctx, 'Process', _Process)
+    replicas.start()
+    assert [kwargs['host'] for kwargs in started] == ['127.0.0.1', '127.0.0.1']
@@ -0,0 +1,101 @@
+import pytest
+import pytest_asyncio
+import yaml
+from aiohttp import web
+
+from fastapi_serve.cloud.config import JCloudConfig
+from fastapi_serve.cloud.recommend import (
+    SweepStep,
+    cheapest_tier,
+    estimate_tiers,
+    find_knee,
+    get_recommended_config,
+    sweep,
+)
+from fastapi_serve.helper import get_free_port
+
+STEPS = [
+    SweepStep(1, throughput=100, latency_ms=15, p50_ms=10, error_rate=0),
+    SweepStep(2, throughput=190, latency_ms=25, p50_ms=11, error_rate=0),
+    SweepStep(4, throughput=200, latency_ms=60, p50_ms=20, error_rate=0),
+    SweepStep(8, throughput=205, latency_ms=150, p50_ms=40, error_rate=0.05),
+]
+
+
+def _estimates(slo_ms=50, rss_gb=0.1):
+    knee = find_knee(STEPS, slo_ms)
+    return {e.instance: e for e in estimate_tiers(STEPS, knee, rss_gb, slo_ms)}
+
+
+def test_knee_is_the_best_step_within_the_slo():
+    assert find_knee(STEPS, 50).concurrency == 2
+    assert find_knee(STEPS, 100).concurrency == 4
+    # errors break the SLO, whatever the latency
+    assert find_knee(STEPS, 1000).concurrency == 4
+    assert find_knee(STEPS, 10) is None
+
+
+def test_tiers_scale_with_vcpus():
+    estimates = _estimates()
+    assert estimates['C3'].throughput == 190
+    assert (estimates['C5'].workers, estimates['C5'].throughput) == (4, 760)
+    assert estimates['C5'].memory_gb == pytest.approx(0.4)
+    assert estimates['C2'].throughput == 95 and estimates['C2'].workers == 1
+    # throttled at 0.1 vCPU
+    assert estimates['C1'].latency_ms == pytest.approx(100)
+    assert not estimates['C1'].meets_slo and estimates['C2'].meets_slo
+
+
+def test_cheapest_tier():
+    # same cost per request from C2 up, the smallest tier wins
+    assert cheapest_tier(list(_estimates().values()), 0.7).instance == 'C2'
+    # a worker needs more than 0.8 GB
+    assert cheapest_tier(list(_estimates(rss_gb=1).values()), 0.7).instance == 'C3'
+    # every worker needs more than 80% of the instance memory
+    assert cheapest_tier(list(_estimates(rss_gb=2).values()), 0.7) is None
+
+
+def test_recommended_config_merges_the_existing_one():
+    base = {'instance': 'C5', 'timeout': 300, 'autoscale': {'min': 2, 'max': 3}}
+    estimate = _estimates()['C3']
+
+    config = get_recommended_config(estimate, 'rps', 0.7, base=base)
+    assert config['instance'] == 'C3' and config['timeout'] == 300
+    assert config['autoscale'] == {'min': 2, 'max': 3, 'metric': 'rps', 'target': 133}
+
+    config = get_recommended_config(estimate, 'concurrency', 0.5, peak_rps=1000)
+    # 1000 rps at 95 rps per replica
+    assert config['autoscale'] == {
+        'metric': 'concurrency',
+        'target': 1,
+        'max': 11,
+        'min': 1,
+    }
+    assert JCloudConfig.from_dict(yaml.safe_load(yaml.safe_dump(config))).workers == 1
+
+
+@pytest_asyncio.fixture
+async def server():
+    async def work(request):
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_get('/work', work)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = get_free_port()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    yield f'http://127.0.0.1:{port}'
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_sweep_doubles_concurrency(server):
+    steps = await sweep(
+        f'{server}/work', slo_ms=1000, max_concurrency=4, step_duration=0.2
+    )
+    assert [s.concurrency for s in steps][:1] == [1]
+    assert all(s.concurrency <= 4 and s.throughput > 0 for s in steps)
+
+    steps = await sweep(f'{server}/missing', slo_ms=1000, step_duration=0.2)
+    assert len(steps) == 1 and steps[0].error_rate == 1
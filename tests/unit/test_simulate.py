@@ -0,0 +1,94 @@
+import pytest
+
+from fastapi_serve.cloud.config import JCloudConfig
+from fastapi_serve.cloud.simulate import (
+    AutoscaleSimulator,
+    TracePoint,
+    load_trace,
+    synthetic_trace,
+    weighted_percentile,
+)
+
+
+def _config(**autoscale) -> JCloudConfig:
+    return JCloudConfig.from_dict({'instance': 'C3', 'autoscale': autoscale})
+
+
+def _run(config, trace, **kwargs):
+    kwargs.setdefault('capacity', 50)
+    kwargs.setdefault('service_time', 0.05)
+    kwargs.setdefault('cold_start', 30)
+    return AutoscaleSimulator(config=config, **kwargs).run(trace)
+
+
+def test_autoscale_windows_are_kept():
+    config = JCloudConfig.from_dict(
+        {'timeout': 300, 'autoscale': {'min': 1, 'stable_window': 60}}
+    )
+    assert config.autoscale.stable_window == 60
+    assert config.autoscale.revision_timeout == 300
+    assert config.to_dict()['jcloud']['autoscale']['stable_window'] == 60
+
+
+def test_steady_load_within_capacity():
+    result = _run(
+        _config(min=1, max=5, metric='rps', target=40),
+        synthetic_trace('constant', rps=30, base_rps=0, duration=600),
+    )
+    assert result.timed_out == 0
+    assert result.peak_replicas == 1 and result.cold_starts == 0
+    assert 50 <= result.latency_ms(99) < 100
+
+
+def test_scales_out_and_back_to_zero():
+    trace = [TracePoint(0, 200), TracePoint(600, 0), TracePoint(1200, 0)]
+    result = _run(_config(min=0, max=10, metric='rps', target=40), trace)
+    assert result.cold_starts >= 5
+    assert result.peak_replicas == 5
+    assert result.timeline[-1]['ready'] + result.timeline[-1]['starting'] == 0
+    # requests queued during the first cold start
+    assert result.latency_ms(99) >= 25_000
+
+
+def test_requests_time_out_after_revision_timeout():
+    result = _run(
+        _config(min=1, max=1, metric='rps', target=40, revision_timeout=10),
+        synthetic_trace('constant', rps=100, base_rps=0, duration=120),
+    )
+    assert result.timed_out == pytest.approx(result.requests - result.served)
+    assert result.timed_out > 0
+    # queueing is capped by the timeout, the rest is the saturated service time
+    assert 10_000 <= result.latency_ms(100) < 15_000
+
+
+def test_credits_follow_the_documented_pricing():
+    # docs/CONFIG.MD, example 1: a C4 app with min 0 and a 2G disk serving
+    # requests for 10 minutes of an hour
+    config = JCloudConfig.from_dict(
+        {'instance': 'C4', 'disk_size': '2G', 'autoscale': {'min': 0, 'metric': 'rps'}}
+    )
+    trace = [TracePoint(0, 10), TracePoint(600, 0), TracePoint(3600, 0)]
+    result = _run(config, trace, cold_start=0)
+    assert result.credits == pytest.approx(0.208 + 20 * 10 / 60, rel=0.05)
+
+
+def test_unknown_instance_has_no_cost():
+    config = JCloudConfig.from_dict({'instance': 'G1'})
+    result = _run(config, synthetic_trace('constant', 1, 0, 60))
+    assert result.credits is None and result.summary()['Credits'] == 'n/a'
+
+
+def test_load_trace(tmp_path):
+    trace = tmp_path / 'trace.csv'
+    trace.write_text('time,rps,latency_ms\n10,5,\n0,1,20\n')
+    points = load_trace(str(trace))
+    assert [(p.time, p.rps, p.latency_ms) for p in points] == [
+        (0, 1, 20),
+        (10, 5, None),
+    ]
+
+
+def test_weighted_percentile():
+    samples = [(1, 98), (100, 2)]
+    assert weighted_percentile(samples, 50) == 1
+    assert weighted_percentile(samples, 99) == 100
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from fastapi_serve.cloud import deploy
+from fastapi_serve.cloud.helper import next_poll_interval, row_digest, watch_rows
+
+
+def test_poll_interval_backs_off_once_stable():
+    delay = 2
+    for _ in range(20):
+        delay = next_poll_interval(delay, False, True, interval=2, max_interval=30)
+    assert delay == 30
+    assert next_poll_interval(delay, True, True, interval=2, max_interval=30) == 2
+
+
+def test_poll_interval_stays_low_during_transitions():
+    delay = 2
+    for _ in range(20):
+        delay = next_poll_interval(delay, False, False, interval=2, max_interval=30)
+    assert delay == 8
+
+
+def test_row_digest():
+    assert row_digest(('id', 'Serving')) == row_digest(['id', 'Serving'])
+    assert row_digest(('id', 'Serving')) != row_digest(('id', 'Starting'))
+
+
+@pytest.mark.asyncio
+async def test_status_of_many_apps_is_fetched_concurrently(monkeypatch):
+    running, peak = [0], [0]
+
+    async def _get_status_row(app_id, semaphore):
+        async with semaphore:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.01)
+            running[0] -= 1
+        return (app_id, 'name', 'Serving', '', 0)
+
+    monkeypatch.setattr(deploy, '_get_status_row', _get_status_row)
+    monkeypatch.setattr(deploy, 'STATUS_CONCURRENCY', 4)
+    rows = await deploy.get_apps_status([f'app-{i}' for i in range(10)])
+    assert list(rows) == [f'app-{i}' for i in range(10)]
+    assert peak[0] == 4
+
+
+@pytest.mark.asyncio
+async def test_watch_redraws_only_on_change(monkeypatch):
+    polls = [
+        {'a': ('a', 'Starting'), 'b': ('b', 'Serving')},
+        {'a': ('a', 'Starting'), 'b': ('b', 'Serving')},
+        {'a': ('a', 'Serving'), 'b': ('b', 'Serving')},
+        {'a': ('a', 'Serving')},
+    ]
+    renders = []
+
+    async def _fetch():
+        if not polls:
+            raise asyncio.CancelledError
+        return polls.pop(0)
+
+    from rich.live import Live
+
+    original = Live.update
+
+    def _update(self, renderable, refresh=False):
+        renders.append(list(renderable.columns[1].cells))
+        return original(self, renderable, refresh=refresh)
+
+    monkeypatch.setattr(Live, 'update', _update)
+    with pytest.raises(asyncio.CancelledError):
+        await watch_rows(('AppID', 'Phase'), _fetch, 1, interval=0, max_interval=0)
+    assert renders == [['Starting', 'Serving'], ['Serving', 'Serving'], ['Serving']]
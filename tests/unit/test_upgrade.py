@@ -0,0 +1,123 @@
+import asyncio
+import sys
+
+import aiohttp
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from fastapi_serve.helper import get_free_port
+from fastapi_serve.upgrade import Probe, UpgradeReport, run_verify_upgrade
+
+
+@pytest_asyncio.fixture
+async def server():
+    state = {'version': '1', 'failing': False}
+
+    async def health(request):
+        if state['failing']:
+            return web.json_response({}, status=503)
+        return web.json_response({'app': {'version': state['version']}})
+
+    async def upgrade(request):
+        # a short outage, then the new version
+        state['failing'] = True
+        await asyncio.sleep(0.2)
+        state.update(version='2', failing=False)
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_get('/health', health)
+    app.router.add_get('/upgrade', upgrade)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = get_free_port()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    yield f'http://127.0.0.1:{port}'
+    await runner.cleanup()
+
+
+def _report(*probes):
+    report = UpgradeReport(url='http://app/health', started_at=0, slow_ms=100)
+    report.probes = [Probe(*p) for p in probes]
+    return report
+
+
+def test_report_from_probes():
+    report = _report(
+        # stream, sent, latency, status, version, error
+        (0, 0.0, 0.01, 200, '1'),
+        (1, 0.0, 0.01, 200, '1'),
+        (0, 1.0, 0.5, 503, None, 'HTTP 503'),
+        (1, 1.2, 0.5, None, None, 'ClientConnectorError'),
+        (0, 1.6, 0.2, 200, '2'),
+        (1, 1.8, 0.01, 200, '1'),
+        (1, 2.0, 0.01, 200, '2'),
+        (0, 3.0, 0.01, 200, '2'),
+    )
+    # failing from 1.0 s to the next successful probe, sent at 1.6 s
+    assert report.failed_seconds == pytest.approx(0.6)
+    assert [p.sent for p in report.slow] == [1.6]
+    assert [(s, a, b) for _, s, a, b in report.transitions()] == [
+        (0, '1', '2'),
+        (1, '1', '2'),
+    ]
+    assert report.versions()['1'] == {'first_seen': 0, 'last_seen': 1.8, 'probes': 3}
+    assert not report.rollbacks()
+
+    report.infer_upgrade_window()
+    assert (report.upgrade_start, report.upgrade_end) == (1.0, pytest.approx(1.81))
+    phases = report.to_dict()['phases']
+    assert [phases[p]['probes'] for p in ('before', 'during', 'after')] == [2, 4, 2]
+    assert phases['during']['failed'] == 2
+
+
+def test_rollbacks():
+    report = _report(
+        (0, 0.0, 0.01, 200, '1'),
+        (0, 1.0, 0.01, 200, '2'),
+        (0, 2.0, 0.01, 200, '1'),
+    )
+    assert [(a, b) for _, _, a, b in report.rollbacks()] == [('2', '1')]
+
+
+@pytest.mark.asyncio
+async def test_upgrade_with_command(server):
+    command = f'{sys.executable} -c "import urllib.request; urllib.request.urlopen(\'{server}/upgrade\')"'
+    report = await run_verify_upgrade(
+        url=server,
+        path='/health',
+        version_field='app.version',
+        streams=4,
+        interval=0.01,
+        warmup=0.3,
+        settle=0.3,
+        command=command,
+    )
+    assert list(report.versions()) == ['1', '2']
+    assert report.failures and all(report.phase(p) == 'during' for p in report.failures)
+    assert {f['error'] for f in report.to_dict()['failures']} == {'HTTP 503'}
+    assert report.failed_seconds == pytest.approx(0.2, abs=0.1)
+
+
+@pytest.mark.asyncio
+async def test_upgrade_by_hand_stops_once_settled(server):
+    async def _upgrade():
+        await asyncio.sleep(0.3)
+        async with aiohttp.ClientSession() as session:
+            await session.get(f'{server}/upgrade')
+
+    upgrade = asyncio.create_task(_upgrade())
+    report = await run_verify_upgrade(
+        url=server,
+        path='/health',
+        version_field='app.version',
+        streams=2,
+        interval=0.01,
+        warmup=0,
+        settle=0.3,
+        duration=5,
+    )
+    await upgrade
+    assert report.upgrade_start is not None and report.failures
+    assert report.probes[-1].sent < 2
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import os
+import signal
+import time
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from fastapi_serve.gateway.direct import build_direct_app
+from fastapi_serve.gateway.workers import WorkerSupervisor, count_alive
+from fastapi_serve.helper import get_free_port
+
+APP = '''
+import asyncio
+import os
+import time
+
+from fastapi import FastAPI
+
+app = FastAPI()
+
+
+@app.get('/pid')
+async def pid():
+    return os.getpid()
+
+
+@app.get('/slow')
+async def slow():
+    await asyncio.sleep(1)
+    return os.getpid()
+
+
+@app.get('/block')
+async def block():
+    # blocks the worker's event loop
+    time.sleep(2)
+'''
+
+METRICS_APP = '''
+from fastapi import FastAPI
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+from fastapi_serve.gateway import direct
+
+# stands for the OTLP collector
+reader = InMemoryMetricReader()
+direct._otlp_metric_reader = lambda host, port: reader
+
+app = FastAPI()
+
+
+@app.get('/recorded')
+def recorded():
+    (resource_metrics,) = reader.get_metrics_data().resource_metrics
+    return {
+        'resource': dict(resource_metrics.resource.attributes),
+        'metrics': {
+            metric.name: [dict(point.attributes) for point in metric.data.data_points]
+            for scope_metrics in resource_metrics.scope_metrics
+            for metric in scope_metrics.metrics
+        },
+    }
+'''
+
+
+async def _until(condition, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.05)
+
+
+@pytest_asyncio.fixture
+async def supervisor(tmp_path, monkeypatch):
+    (tmp_path / 'workers_app.py').write_text(APP)
+    monkeypatch.chdir(tmp_path)
+    port = get_free_port()
+    supervisor = WorkerSupervisor(
+        app_factory=build_direct_app,
+        app_kwargs=dict(app='workers_app:app', drain_delay=0, drain_timeout=5),
+        config_kwargs=dict(host='127.0.0.1', port=port, log_level='error'),
+        workers=2,
+        logger=logging.getLogger(__name__),
+        restart_interval=0.1,
+        heartbeat_interval=0.1,
+    )
+    supervisor.url = f'http://127.0.0.1:{port}'
+    supervisor.setup()
+    task = asyncio.ensure_future(supervisor.supervise())
+    await _until(lambda: supervisor.alive == 2)
+    yield supervisor
+    await supervisor.shutdown()
+    await task
+
+
+def test_only_recent_heartbeats_are_alive():
+    now = time.time()
+    assert count_alive([now, now - 1, now - 5, 0], interval=1) == 2
+
+
+@pytest.mark.asyncio
+async def test_workers_share_the_socket(supervisor):
+    async with httpx.AsyncClient(base_url=supervisor.url) as client:
+        pids = {(await client.get('/pid')).json() for _ in range(20)}
+        assert pids <= set(supervisor.pids.values()) and os.getpid() not in pids
+        health = (await client.get('/healthz')).json()
+    assert health['workers'] == {'alive': 2, 'total': 2}
+
+
+@pytest.mark.asyncio
+async def test_dead_workers_are_respawned(supervisor):
+    pids = supervisor.pids
+    os.kill(pids[0], signal.SIGKILL)
+    await _until(lambda: supervisor.pids[0] != pids[0] and supervisor.alive == 2)
+    assert supervisor.pids[1] == pids[1]
+
+
+@pytest.mark.asyncio
+async def test_blocked_worker_isnt_alive(supervisor):
+    async with httpx.AsyncClient(base_url=supervisor.url) as client:
+        blocked = asyncio.ensure_future(client.get('/block'))
+        await _until(lambda: supervisor.alive == 1, timeout=2)
+        # still running, but not serving
+        assert len(supervisor.pids) == 2
+        await blocked
+    await _until(lambda: supervisor.alive == 2)
+
+
+@pytest.mark.asyncio
+async def test_graceful_stop(supervisor):
+    processes = list(supervisor._processes.values())
+    async with httpx.AsyncClient(base_url=supervisor.url) as client:
+        slow = asyncio.ensure_future(client.get('/slow'))
+        await asyncio.sleep(0.3)
+        await supervisor.shutdown()
+        # in-flight requests finish before the workers exit
+        assert (await slow).status_code == 200
+    assert [p.exitcode for p in processes] == [0, 0]
+    assert supervisor.alive == 0 and supervisor.pids == {}
+    with pytest.raises(httpx.ConnectError):
+        httpx.get(f'{supervisor.url}/pid')
+
+
+@pytest.mark.asyncio
+async def test_workers_export_metrics(tmp_path, monkeypatch):
+    pytest.importorskip('opentelemetry.sdk')
+    (tmp_path / 'metrics_app.py').write_text(METRICS_APP)
+    monkeypatch.chdir(tmp_path)
+    port = get_free_port()
+    supervisor = WorkerSupervisor(
+        app_factory=build_direct_app,
+        app_kwargs=dict(
+            app='metrics_app:app',
+            drain_delay=0,
+            telemetry=dict(
+                metrics_exporter_host='collector',
+                metrics_exporter_port=4317,
+                service_name='gateway',
+            ),
+        ),
+        config_kwargs=dict(host='127.0.0.1', port=port, log_level='error'),
+        workers=2,
+        logger=logging.getLogger(__name__),
+        heartbeat_interval=0.1,
+    )
+    supervisor.setup()
+    task = asyncio.ensure_future(supervisor.supervise())
+    try:
+        await _until(lambda: supervisor.alive == 2)
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}') as client:
+            workers = set()
+            while len(workers) < 2:
+                # on a new connection, to reach both workers
+                r = await client.get('/recorded', headers={'connection': 'close'})
+                recorded = r.json()
+                if 'fastapi_serve_request_count' not in recorded['metrics']:
+                    continue
+                worker = recorded['resource']['worker']
+                assert recorded['resource']['service.name'] == 'gateway'
+                points = recorded['metrics']['fastapi_serve_request_count']
+                assert {p['worker'] for p in points} == {worker}
+                workers.add(worker)
+        assert workers == {'0', '1'}
+    finally:
+        await supervisor.shutdown()
+        await task